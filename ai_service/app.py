@@ -6,23 +6,38 @@ from torch import tensor
 from torchvision import transforms
 from PIL import Image
 import io
+import math
 import logging
 import base64
 import urllib.request
 import sys
-import unicodedata
-import json 
+import threading
+import time
+import copy
 import timm
 
 from model_config import MODEL_CONFIGS
-from calc_nutrients import NutritionRecommender
+from calc_nutrients import NutritionRecommender, PLAN_TIME_BUDGET_MS
+from batching import MicroBatcher, BatcherClosed, run_topk
+from menu_index import MenuIndex, DEFAULT_MATCH_THRESHOLD
+from menu_store import MenuStore
+from menu_reload import MenuReloader
+from menu_snapshot import default_snapshot_path, load_fresh_snapshot
+from serving_artifact import load_artifact
+from quantization import build_quantized_model, QuantizationAgreementError, model_bytes
+from model_registry import ModelRegistry, UnknownModel
+from upload import read_body, UploadTooLarge
+from fast_preprocess import FastPreprocessor
+from prediction_cache import PredictionCache, image_digest, file_version, menu_version
+from near_duplicate import NearDuplicateIndex, dhash
+from concurrent.futures import ThreadPoolExecutor
 
 # Import kiến trúc mạng
 try:
-    from model.lsnet import lsnet_b
+    from model.lsnet import lsnet_b, fuse_model
 except ImportError:
     try:
-        from model.lsnet import lsnet_b
+        from model.lsnet import lsnet_b, fuse_model
     except ImportError:
          print("Critical: Không tìm thấy kiến trúc lsnet")
 
@@ -33,7 +48,75 @@ app = Flask(__name__)
 CORS(app)
 
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-LOADED_MODELS = {}
+BATCHERS = {}
+_batchers_lock = threading.Lock()
+
+# Registry các model đang nạp: LRU theo tổng bộ nhớ trọng số (MODEL_MEMORY_BUDGET_MB, 0 = không giới hạn)
+MODEL_MEMORY_BUDGET_MB = float(os.environ.get('MODEL_MEMORY_BUDGET_MB', 0))
+MODEL_REGISTRY = ModelRegistry(
+    loader=lambda model_id: load_model_entry(model_id),
+    memory_budget=MODEL_MEMORY_BUDGET_MB * 2**20,
+    size_fn=lambda entry: model_bytes(entry['model']),
+    on_evict=lambda model_id, entry: close_batcher(model_id),
+)
+LOADED_MODELS = MODEL_REGISTRY.models
+
+# Micro-batching: gom request đồng thời thành 1 batch (tối đa N ảnh hoặc chờ tối đa X ms)
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 16))
+BATCH_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', 10))
+
+# /predict/batch: số ảnh tối đa mỗi request và pool decode song song
+PREDICT_BATCH_LIMIT = int(os.environ.get('PREDICT_BATCH_LIMIT', 64))
+DECODE_POOL = ThreadPoolExecutor(max_workers=int(os.environ.get('DECODE_WORKERS', os.cpu_count() or 4)))
+
+# Body nhị phân (application/octet-stream, image/*) của /predict: giới hạn kích thước
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 32 * 2**20))
+
+# Preprocess nhanh (JPEG draft mode + resize vùng crop + normalize gộp), tắt để dùng pipeline torchvision
+FAST_PREPROCESS = os.environ.get('FAST_PREPROCESS', '1') == '1'
+
+# Cache kết quả /predict theo hash bytes ảnh (LRU trong RAM, tuỳ chọn thêm tầng SQLite qua các lần restart)
+PREDICTION_CACHE = PredictionCache(
+    max_bytes=int(os.environ.get('PREDICTION_CACHE_MAX_BYTES', 64 * 2**20)),
+    db_path=os.environ.get('PREDICTION_CACHE_DB') or None,
+    db_max_bytes=int(os.environ.get('PREDICTION_CACHE_DB_MAX_BYTES', 512 * 2**20)),
+)
+
+# Ảnh gần trùng (dHash cách nhau <= NEAR_DUP_RADIUS bit) dùng lại kết quả cũ thay vì forward; -1 để tắt
+NEAR_DUPLICATES = NearDuplicateIndex(
+    radius=int(os.environ.get('NEAR_DUP_RADIUS', 3)),
+    max_entries=int(os.environ.get('NEAR_DUP_MAX_ENTRIES', 50000)),
+)
+
+# Ngưỡng so khớp gần đúng nhãn class -> tên món trong menu
+FUZZY_MATCH_THRESHOLD = float(os.environ.get('FUZZY_MATCH_THRESHOLD', DEFAULT_MATCH_THRESHOLD))
+
+# Menu: file JSON, chu kỳ kiểm tra file đổi để nạp lại (giây, 0 = tắt), token cho admin API (trống = tắt)
+MENU_PATH = os.environ.get('MENU_PATH', 'food_data.json')
+MENU_WATCH_INTERVAL_S = float(os.environ.get('MENU_WATCH_INTERVAL_S', 5))
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+# Snapshot nhị phân của menu (export_menu.py), map khi khởi động nếu còn khớp MENU_PATH; trống = luôn nạp JSON
+MENU_SNAPSHOT_PATH = os.environ.get('MENU_SNAPSHOT_PATH', default_snapshot_path(MENU_PATH))
+
+# Thực đơn cả ngày (/recommend/plan): thời gian tìm kiếm tối đa (ms) và số món tối đa client được yêu cầu
+MEAL_PLAN_TIME_BUDGET_MS = float(os.environ.get('MEAL_PLAN_TIME_BUDGET_MS', PLAN_TIME_BUDGET_MS))
+MEAL_PLAN_MAX_MEALS = int(os.environ.get('MEAL_PLAN_MAX_MEALS', 6))
+
+# Gộp BN / RepVGG trước khi serve, kiểm tra logits lệch (tương đối) không quá FUSE_TOLERANCE
+FUSE_MODEL = os.environ.get('FUSE_MODEL', '1') == '1'
+FUSE_TOLERANCE = float(os.environ.get('FUSE_TOLERANCE', 1e-3))
+
+# Nạp artifact serving (export_model.py) thay cho checkpoint huấn luyện nếu có
+USE_SERVING_ARTIFACT = os.environ.get('USE_SERVING_ARTIFACT', '1') == '1'
+
+# Warm-up: nạp sẵn mọi model trong MODEL_CONFIGS khi khởi động và chạy vài batch giả
+WARMUP_ON_START = os.environ.get('WARMUP_ON_START', '1') == '1'
+WARMUP_BATCH_SIZES = [int(x) for x in os.environ.get('WARMUP_BATCH_SIZES', '1,4').split(',') if x.strip()]
+# WARMUP_ON_START=0: nạp lười ở request đầu tiên, /ready báo sẵn sàng ngay ('lazy') trừ khi run_warmup() được gọi
+WARMUP_STATE = {'status': 'pending' if WARMUP_ON_START else 'lazy', 'models': {}}
+
+# Các thành phần bên ngoài app (vd. asgi_server) đăng ký thêm mục cho /metrics: tên -> hàm trả về dict
+METRICS_PROVIDERS = {}
 
 def extract_args_from_checkpoint(checkpoint, default_fallback=None):
     if default_fallback:
@@ -64,54 +147,133 @@ def load_model(path: str):
         return None
 
 
-def get_food_data_local():
-    logger.info("Đang tải Menu món ăn từ file JSON local...")
-    try:
-        # Đọc file food_data.json
-        if not os.path.exists("food_data.json"):
-            logger.error("Không tìm thấy file 'food_data.json'. Hãy chạy export_data.py trước!")
-            return []
-            
-        with open("food_data.json", "r", encoding="utf-8") as f:
-            food_list = json.load(f)
-            
-        # Thêm trường search_norm để tìm kiếm
-        for item in food_list:
-            item["search_norm"] = str(item.get('name', '')).lower()
-            
-        logger.info(f"Đã tải {len(food_list)} món ăn.")
-        return food_list
-    except Exception as e:
-        logger.error(f"Lỗi đọc file JSON: {e}")
-        return []
+def _measure_latency_ms(model, dummy, runs=5):
+    with torch.no_grad():
+        model(dummy)
+        start = time.perf_counter()
+        for _ in range(runs):
+            model(dummy)
+    return (time.perf_counter() - start) * 1000.0 / runs
+
+def fuse_for_serving(model):
+    """Gộp BN/nhánh của LSNet cho inference; giữ model gốc nếu logits lệch quá ngưỡng."""
+    device = next(model.parameters()).device
+    dummy = torch.randn(2, 3, 224, 224, generator=torch.Generator().manual_seed(0)).to(device)
+    with torch.no_grad():
+        reference = model(dummy)
+    base_ms = _measure_latency_ms(model, dummy)
+    base_params = sum(p.numel() for p in model.parameters())
+
+    fused = fuse_model(copy.deepcopy(model))
+    fused.eval()
+    with torch.no_grad():
+        max_diff = (fused(dummy) - reference).abs().max().item()
+    # So sánh tương đối theo độ lớn logits (float32 nên sai số tuyệt đối tăng theo scale)
+    rel_diff = max_diff / max(reference.abs().max().item(), 1e-6)
+    if rel_diff > FUSE_TOLERANCE:
+        logger.error(f"Fused model mismatch (relative max |Δlogit| = {rel_diff:.2e} > {FUSE_TOLERANCE:.0e}), serving unfused model.")
+        return model
+
+    fused_ms = _measure_latency_ms(fused, dummy)
+    fused_params = sum(p.numel() for p in fused.parameters())
+    logger.info(
+        f"Fused model: max |Δlogit| = {max_diff:.2e}, "
+        f"latency {base_ms:.1f} -> {fused_ms:.1f} ms/batch2, "
+        f"params {base_params:,} -> {fused_params:,}"
+    )
+    return fused
 
 # Khởi tạo dữ liệu
-dynamic_food_data = get_food_data_local()
-recommender = NutritionRecommender(dynamic_food_data)
+menu_store = MenuStore([])
+menu_index = MenuIndex(menu_store)
+recommender = None
 
-def find_nutrition_by_name(pred_name):
-    if not dynamic_food_data: return None
-    pred_lower = pred_name.lower().strip()
-    
-    def remove_accents(input_str):
-        nfkd_form = unicodedata.normalize('NFKD', input_str)
-        return "".join([c for c in nfkd_form if not unicodedata.combining(c)])
+def set_menu(food_list, version=None, incremental=False):
+    """
+    Dựng MenuStore + index + recommender cho menu mới rồi mới gán đè, để request đang chạy không thấy
+    trạng thái dở dang. Index tên món và recommender dùng chung một MenuStore; `food_list` không được giữ lại.
+    `incremental`: dùng lại dữ liệu đã mã hoá / key tên đã chuẩn hoá của các món không đổi (theo 'id'),
+    trả về diff (unchanged/changed/added/removed); ngược lại dựng lại toàn bộ và trả về None.
+    """
+    diff = None
+    if incremental and len(menu_store):
+        new_store, source, diff = menu_store.updated(food_list)
+        new_index = MenuIndex(new_store, previous=menu_index, source=source)
+    else:
+        new_store = MenuStore(food_list)
+        new_index = MenuIndex(new_store)
+    install_menu(new_store, new_index, NutritionRecommender(new_store), version or menu_version(food_list))
+    return diff
+
+def install_menu(new_store, new_index, new_recommender, new_version):
+    global menu_store, menu_index, recommender, MENU_VERSION
+    previous = globals().get('MENU_VERSION')
+    menu_store, menu_index, recommender, MENU_VERSION = new_store, new_index, new_recommender, new_version
+    if previous is not None and previous != new_version:
+        # Predictions trong cache chứa dinh dưỡng của menu cũ
+        PREDICTION_CACHE.invalidate()
+        NEAR_DUPLICATES.invalidate()
+
+MENU_RELOADER = MenuReloader(
+    MENU_PATH,
+    apply=lambda food_list, version, full: set_menu(food_list, version, incremental=not full),
+    interval_s=MENU_WATCH_INTERVAL_S,
+)
 
-    pred_no_accent = remove_accents(pred_lower)
+def load_menu_on_start():
+    """Map snapshot nếu còn khớp MENU_PATH, ngược lại nạp từ JSON. Trả về nguồn + thời gian nạp (cho /metrics)."""
+    start = time.perf_counter()
+    snapshot = load_fresh_snapshot(MENU_SNAPSHOT_PATH, MENU_PATH)
+    if snapshot is not None:
+        install_menu(snapshot['store'], snapshot['index'], snapshot['recommender'], snapshot['version'])
+        MENU_RELOADER.mark_loaded(snapshot['version'], snapshot['signature'])
+        source = 'snapshot'
+    elif MENU_RELOADER.load()['status'] == 'reloaded':
+        source = 'json'
+    else:
+        logger.error(f"Không đọc được '{MENU_PATH}'. Hãy chạy export_data.py trước!")
+        set_menu([])
+        source = 'empty'
+    load_ms = (time.perf_counter() - start) * 1000.0
+    logger.info(f"Đã tải {len(menu_store)} món ăn (nguồn: {source}) trong {load_ms:.0f} ms.")
+    return {'source': source, 'ms': load_ms}
 
-    for food in dynamic_food_data:
-        food_name_lower = food['name'].lower()
-        if food_name_lower == pred_lower: return food
-        if remove_accents(food_name_lower) == pred_no_accent: return food
-    return None
+logger.info(f"Đang tải Menu món ăn từ {MENU_PATH}...")
+MENU_LOAD = load_menu_on_start()
+MENU_RELOADER.start()
 
+def find_nutrition_by_name(pred_name, threshold=None):
+    # Khớp chính xác (có/không dấu) trước, sau đó so khớp gần đúng theo trigram
+    if threshold is None: threshold = FUZZY_MATCH_THRESHOLD
+    return menu_index.find(pred_name, threshold)
+
+def get_match_threshold():
+    # Cho phép client tự đặt ngưỡng so khớp tên món qua 'matchThreshold' (query, form hoặc JSON)
+    value = request.args.get('matchThreshold', request.form.get('matchThreshold'))
+    if value is None:
+        value = (request.get_json(silent=True) or {}).get('matchThreshold')
+    try:
+        return FUZZY_MATCH_THRESHOLD if value is None else float(value)
+    except (TypeError, ValueError):
+        return FUZZY_MATCH_THRESHOLD
+
+
+# Mô tả pipeline preprocess (được ghi kèm serving artifact)
+PREPROCESS_CFG = {
+    'resize': 248,
+    'crop': 224,
+    'interpolation': 'bicubic',
+    'mean': [0.4850, 0.4560, 0.4060],
+    'std': [0.2290, 0.2240, 0.2250],
+}
 
 preprocess = transforms.Compose([
-    transforms.Resize(size=248, interpolation=transforms.functional.InterpolationMode.BICUBIC, max_size=None, antialias='warn'),
-    transforms.CenterCrop(size=(224, 224)),
+    transforms.Resize(size=PREPROCESS_CFG['resize'], interpolation=transforms.functional.InterpolationMode.BICUBIC, max_size=None, antialias='warn'),
+    transforms.CenterCrop(size=(PREPROCESS_CFG['crop'], PREPROCESS_CFG['crop'])),
     transforms.ToTensor(),
-    transforms.Normalize(mean=tensor([0.4850, 0.4560, 0.4060]), std=tensor([0.2290, 0.2240, 0.2250]))
+    transforms.Normalize(mean=tensor(PREPROCESS_CFG['mean']), std=tensor(PREPROCESS_CFG['std']))
 ])
+fast_preprocess = FastPreprocessor(PREPROCESS_CFG)
 
 def download_file_if_missing(url, path):
     if not os.path.exists(path):
@@ -122,91 +284,409 @@ def download_file_if_missing(url, path):
         except Exception as e:
             logger.error(f"Download failed: {e}")
 
+def maybe_quantize(model, config):
+    # INT8 chỉ bật khi model có 'quantize' trong MODEL_CONFIGS và đang chạy trên CPU
+    quant_cfg = config.get('quantize')
+    if not quant_cfg or DEVICE.type != 'cpu':
+        return model
+    qmodel, report = build_quantized_model(model, quant_cfg, preprocess)
+    config['quantization_report'] = report
+    return qmodel
+
+def artifact_is_fresh(config):
+    # Dùng artifact khi có và không cũ hơn checkpoint gốc
+    artifact_path = config.get('artifact_path')
+    if not USE_SERVING_ARTIFACT or not artifact_path or not os.path.exists(artifact_path):
+        return False
+    weights_path = config.get('weights_path')
+    if weights_path and os.path.exists(weights_path):
+        return os.path.getmtime(artifact_path) >= os.path.getmtime(weights_path)
+    return True
+
+def find_model_config(model_id):
+    return next((item for item in MODEL_CONFIGS if item["id"] == model_id), None)
+
+def load_model_entry(model_id):
+    config = find_model_config(model_id)
+    logger.info(f"Loading model: {config['name']}...")
+    if artifact_is_fresh(config):
+        # Artifact đã fuse: không cần timm init + copy state_dict, trọng số được mmap
+        model, artifact = load_artifact(config['artifact_path'], DEVICE)
+        return {'model': maybe_quantize(model, config), 'classes': artifact['classes'], 'preprocess': artifact['preprocess'],
+                'version': file_version(config['artifact_path'], config.get('quantize'))}
+
+    download_file_if_missing(config.get('weights_url'), config['weights_path'])
+    download_file_if_missing(config.get('classes_url'), config['classes_path'])
+    
+    classes = ["Unknown"]
+    if os.path.exists(config['classes_path']):
+        with open(config['classes_path'], "r", encoding="utf-8") as f:
+            classes = [line.strip() for line in f.readlines()]
+
+    model = load_model(config['weights_path'])
+    if model is None:
+        raise RuntimeError(f"Could not load weights for model {model_id}")
+    
+    model.to(DEVICE)
+    model.eval()
+    if FUSE_MODEL:
+        model = fuse_for_serving(model)
+    model = maybe_quantize(model, config)
+    return {'model': model, 'classes': classes, 'preprocess': PREPROCESS_CFG,
+            'version': file_version(config['weights_path'], {'fuse': FUSE_MODEL, 'quantize': config.get('quantize')})}
+
+def model_version(model_id):
+    """
+    Phiên bản model (như 'version' trong entry) mà không nạp model: lấy từ entry nếu đang nạp sẵn, ngược lại
+    tính từ stat file artifact/trọng số. None nếu chưa có file (chưa tải về).
+    """
+    entry = MODEL_REGISTRY.peek(model_id)
+    if entry is not None:
+        return entry.get('version')
+    config = find_model_config(model_id)
+    try:
+        if artifact_is_fresh(config):
+            return file_version(config['artifact_path'], config.get('quantize'))
+        return file_version(config['weights_path'], {'fuse': FUSE_MODEL, 'quantize': config.get('quantize')})
+    except OSError:
+        return None
+
 def get_model(model_id):
-    config = next((item for item in MODEL_CONFIGS if item["id"] == model_id), None)
-    if not config: raise ValueError(f"Unknown model ID: {model_id}")
+    if not find_model_config(model_id): raise ValueError(f"Unknown model ID: {model_id}")
+    # Nạp nền trong registry: chỉ request của model này phải chờ, các model khác vẫn phục vụ bình thường
+    return MODEL_REGISTRY.get(model_id)
 
-    if model_id not in LOADED_MODELS:
-        logger.info(f"Loading model: {config['name']}...")
-        download_file_if_missing(config.get('weights_url'), config['weights_path'])
-        download_file_if_missing(config.get('classes_url'), config['classes_path'])
-        
-        classes = ["Unknown"]
-        if os.path.exists(config['classes_path']):
-            with open(config['classes_path'], "r", encoding="utf-8") as f:
-                classes = [line.strip() for line in f.readlines()]
+def get_requested_model_id():
+    # Client chọn model qua ?model=, header X-Model, form hoặc JSON 'model'; mặc định là model đầu tiên
+    model_id = request.args.get('model') or request.headers.get('X-Model') or request.form.get('model')
+    if not model_id:
+        model_id = (request.get_json(silent=True) or {}).get('model') if request.is_json else None
+    model_id = model_id or MODEL_CONFIGS[0]['id']
+    if not find_model_config(model_id):
+        raise UnknownModel(f"Unknown model ID: {model_id}")
+    return model_id
+
+def get_batcher(model_id):
+    batcher = BATCHERS.get(model_id)
+    while batcher is None:
+        model_data = get_model(model_id)
+        with _batchers_lock:
+            batcher = BATCHERS.get(model_id)
+            # Chỉ tạo khi entry vẫn còn trong registry: registry bỏ entry trước rồi mới gọi on_evict -> close_batcher
+            # (cần _batchers_lock), nên model bị evict sau bước kiểm tra này thì batcher vừa tạo vẫn được đóng.
+            # Model đã bị evict thì nạp lại thay vì giữ model cũ sống ngoài memory budget.
+            if batcher is None and MODEL_REGISTRY.peek(model_id) is model_data:
+                batcher = BATCHERS[model_id] = MicroBatcher(
+                    model_data['model'], DEVICE,
+                    max_batch_size=BATCH_MAX_SIZE,
+                    max_wait_ms=BATCH_MAX_WAIT_MS,
+                    top_k=3,
+                    name=model_id,
+                )
+    return batcher
+
+def submit_to_batcher(model_id, tensor):
+    # Batcher bị đóng (model bị evict) giữa get_batcher và submit: thử lại một lần với batcher mới
+    try:
+        return get_batcher(model_id).submit(tensor)
+    except BatcherClosed:
+        return get_batcher(model_id).submit(tensor)
+
+def close_batcher(model_id):
+    with _batchers_lock:
+        batcher = BATCHERS.pop(model_id, None)
+    if batcher is not None:
+        batcher.close()
+
+def decode_base64_image(image_data):
+    if "," in image_data: image_data = image_data.split(",")[1]
+    return base64.b64decode(image_data)
+
+def is_binary_upload():
+    mimetype = request.mimetype
+    return mimetype == 'application/octet-stream' or mimetype.startswith('image/')
+
+def decode_image(image_source):
+    # image_source: bytes hoặc file-like (stream của multipart / body nhị phân) để PIL đọc trực tiếp.
+    # Trả về (ảnh RGB toàn khung, kích thước gốc).
+    if isinstance(image_source, (bytes, bytearray)):
+        image_source = io.BytesIO(image_source)
+    if FAST_PREPROCESS:
+        return fast_preprocess.decode(image_source)
+    image = Image.open(image_source).convert('RGB')
+    return image, image.size
+
+def image_to_tensor(decoded, out=None):
+    image, orig_size = decoded
+    if FAST_PREPROCESS:
+        return fast_preprocess.to_tensor(fast_preprocess.crop_resize(image, orig_size), out)
+    tensor = preprocess(image)
+    return tensor if out is None else out.copy_(tensor)
+
+def load_input_tensor(image_source, out=None):
+    return image_to_tensor(decode_image(image_source), out)
 
-        model = load_model(config['weights_path'])
+def open_predict_image():
+    """File-like chứa bytes ảnh của /predict từ body nhị phân, multipart 'file' hoặc JSON 'image' (base64); None nếu không có."""
+    if is_binary_upload():
+        # Body là chính file ảnh: đọc vào buffer dùng lại, không qua base64/JSON
+        return read_body(request.stream, request.content_length, MAX_UPLOAD_BYTES)
+    if 'file' in request.files:
+        return request.files['file'].stream
+    data = request.get_json(silent=True) or {}
+    if 'image' not in data:
+        return None
+    return io.BytesIO(decode_base64_image(data['image']))
+
+def read_predict_input():
+    source = open_predict_image()
+    if source is None:
+        return None
+    with source:
+        return load_input_tensor(source)
+
+def warm_up_model(model_id):
+    state = WARMUP_STATE['models'][model_id]
+    try:
+        state['status'] = 'loading'
+        start = time.perf_counter()
+        model_data = get_model(model_id)
+        state['load_ms'] = (time.perf_counter() - start) * 1000.0
+
+        # Chạy vài batch giả để khởi tạo kernel / allocator trước khi nhận traffic
+        state['status'] = 'warming'
+        start = time.perf_counter()
+        for batch_size in WARMUP_BATCH_SIZES:
+            run_topk(model_data['model'], torch.zeros(batch_size, 3, 224, 224, device=DEVICE), 3)
+        submit_to_batcher(model_id, torch.zeros(3, 224, 224)).result()
+        state['warmup_ms'] = (time.perf_counter() - start) * 1000.0
+        config = next((item for item in MODEL_CONFIGS if item["id"] == model_id), {})
+        if 'quantization_report' in config:
+            state['quantization'] = config['quantization_report']
+        state['status'] = 'ready'
+    except QuantizationAgreementError as e:
+        logger.critical(f"Refusing to serve {model_id}: {e}")
+        state['status'] = 'failed'
+        state['error'] = str(e)
+        state['fatal'] = True
+    except Exception as e:
+        logger.error(f"Warm-up failed for {model_id}: {e}")
+        state['status'] = 'failed'
+        state['error'] = str(e)
+
+def run_warmup():
+    """Nạp song song các model trong MODEL_CONFIGS (trừ 'preload': False) rồi warm-up; cập nhật WARMUP_STATE cho /ready."""
+    WARMUP_STATE['status'] = 'running'
+    model_ids = [cfg['id'] for cfg in MODEL_CONFIGS if cfg.get('preload', True)]
+    WARMUP_STATE['models'] = {model_id: {'status': 'pending'} for model_id in model_ids}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, len(model_ids)), thread_name_prefix='warmup') as pool:
+        list(pool.map(warm_up_model, model_ids))
+    failed = [m for m, st in WARMUP_STATE['models'].items() if st['status'] != 'ready']
+    WARMUP_STATE['status'] = 'failed' if failed else 'ready'
+    WARMUP_STATE['total_ms'] = (time.perf_counter() - start) * 1000.0
+    logger.info(f"Warm-up {WARMUP_STATE['status']} in {WARMUP_STATE['total_ms']:.0f} ms")
+    if any(st.get('fatal') for st in WARMUP_STATE['models'].values()):
+        # Model INT8 không đạt ngưỡng khớp với fp32: không khởi động service
+        os._exit(1)
+
+def after_fork(torch_threads=1):
+    """
+    Khởi tạo lại trạng thái theo process cho worker vừa fork (serve.py): thread không sống sót qua fork nên
+    micro-batcher và pool decode phải tạo mới; model, menu và index được giữ nguyên (chia sẻ copy-on-write).
+    """
+    global DECODE_POOL, _batchers_lock
+    torch.set_num_threads(max(1, int(torch_threads)))
+    BATCHERS.clear()
+    _batchers_lock = threading.Lock()
+    MODEL_REGISTRY.after_fork()
+    DECODE_POOL = ThreadPoolExecutor(max_workers=int(os.environ.get('DECODE_WORKERS', torch_threads)))
+    PREDICTION_CACHE.after_fork()
+    NEAR_DUPLICATES.after_fork()
+    MENU_RELOADER.after_fork()
+    for model_id, model_data in LOADED_MODELS.items():
+        # Khởi tạo thread pool intra-op của worker trước khi nhận request
+        run_topk(model_data['model'], torch.zeros(1, 3, 224, 224, device=DEVICE), 3)
+
+def start_warmup():
+    thread = threading.Thread(target=run_warmup, name='warmup', daemon=True)
+    thread.start()
+    return thread
+
+def build_predictions(single_probs, single_ids, classes, threshold=None):
+    if threshold is None: threshold = FUZZY_MATCH_THRESHOLD
+    # Ngưỡng của server: bảng tra cho mọi class (cache). Ngưỡng client tự đặt (matchThreshold): chỉ so khớp
+    # các class top-k của request, không cache
+    label_records = menu_index.records_for_labels(classes, threshold) if threshold == FUZZY_MATCH_THRESHOLD else None
+    predictions = []
+    for i in range(len(single_probs)):
+        idx = single_ids[i].item()
+        score = single_probs[i].item()
+        label = classes[idx] if idx < len(classes) else f"Class {idx}"
+        
+        if idx >= len(classes):
+            food_info, match_score = None, 0.0
+        elif label_records is not None:
+            food_info, match_score = label_records[idx]
+        else:
+            food_info, match_score = menu_index.match(label, threshold)
         
-        model.to(DEVICE)
-        model.eval()
-        LOADED_MODELS[model_id] = {'model': model, 'classes': classes}
+        pred_obj = {
+            'name': label,
+            'confidence': float(score),
+            'calories': 0, 'protein': 0, 'fat': 0, 'carbs': 0, 'image': '',
+            'matchScore': float(match_score)
+        }
         
-    return LOADED_MODELS[model_id]
+        if food_info:
+            pred_obj['name'] = food_info['name']
+            pred_obj['calories'] = food_info.get('Energy', 0)
+            pred_obj['protein'] = food_info.get('Protein', 0)
+            pred_obj['fat'] = food_info.get('Fat', 0)
+            pred_obj['carbs'] = food_info.get('Carbohydrate', 0)
+            pred_obj['image'] = food_info.get('image', '')
+        
+        predictions.append(pred_obj)
+    return predictions
 
 @app.route('/predict', methods=['POST'])
 def predict():
     try:
-        default_model_id = MODEL_CONFIGS[0]['id'] 
-        if 'file' not in request.files and 'image' not in request.json:
-             return jsonify({'success': False, 'message': 'No image provided'}), 400
+        start = time.perf_counter()
+        model_id = get_requested_model_id()
+        source = open_predict_image()
+        if source is None:
+            return jsonify({'success': False, 'message': 'No image provided'}), 400
 
-        if 'file' in request.files:
-            file = request.files['file']
-            image_bytes = file.read()
-        else:
-            image_data = request.json['image']
-            if "," in image_data: image_data = image_data.split(",")[1]
-            image_bytes = base64.b64decode(image_data)
-
-        image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-        input_tensor = preprocess(image).unsqueeze(0).to(DEVICE)
-        model_data = get_model(default_model_id)
-        model = model_data['model']
-        classes = model_data['classes']
-
-        with torch.no_grad():
-            outputs = model(input_tensor)
-            probabilities = torch.nn.functional.softmax(outputs, dim=1)
-            
-        top_prob, top_id = torch.topk(probabilities, 3)
-        single_probs = top_prob[0]
-        single_ids = top_id[0]
-        
-        predictions = []
-        for i in range(len(single_probs)):
-            idx = single_ids[i].item()
-            score = single_probs[i].item()
-            label = classes[idx] if idx < len(classes) else f"Class {idx}"
-            
-            food_info = find_nutrition_by_name(label)
-            
-            pred_obj = {
-                'name': label,
-                'confidence': float(score),
-                'calories': 0, 'protein': 0, 'fat': 0, 'carbs': 0, 'image': ''
-            }
-            
-            if food_info:
-                pred_obj['name'] = food_info['name']
-                pred_obj['calories'] = food_info.get('Energy', 0)
-                pred_obj['protein'] = food_info.get('Protein', 0)
-                pred_obj['fat'] = food_info.get('Fat', 0)
-                pred_obj['carbs'] = food_info.get('Carbohydrate', 0)
-                pred_obj['image'] = food_info.get('image', '')
-            
-            predictions.append(pred_obj)
+        with source:
+            threshold = get_match_threshold()
+
+            # Cùng bytes ảnh + model + menu + ngưỡng -> trả kết quả cũ, bỏ qua decode và forward.
+            # Version lấy từ file, không nạp model: cache hit không phải chờ nạp lại model đã bị evict
+            cache_key = digest = None
+            version = model_version(model_id)
+            if PREDICTION_CACHE.enabled and version is not None:
+                digest = image_digest(source)
+                cache_key = PredictionCache.make_key(model_id, version, MENU_VERSION, threshold, digest)
+                predictions = PREDICTION_CACHE.get(cache_key)
+                if predictions is not None:
+                    MODEL_REGISTRY.record(model_id, (time.perf_counter() - start) * 1000.0, cached=True)
+                    return jsonify({'success': True, 'predictions': predictions, 'bestMatch': predictions[0],
+                                    'model': model_id, 'cached': True})
+
+            model_data = get_model(model_id)
+            classes = model_data['classes']
+            # File đổi giữa lúc tính key và lúc nạp: ghi cache theo version của model thực sự dùng
+            namespace = (model_id, model_data.get('version'), MENU_VERSION, threshold)
+            if cache_key is not None and namespace[1] != version:
+                cache_key = PredictionCache.make_key(*namespace, digest)
+            decoded = decode_image(source)
+
+        # Ảnh gần trùng với ảnh đã dự đoán (chụp lại, nén lại, crop nhẹ): dùng lại kết quả, không forward
+        image_hash = None
+        if NEAR_DUPLICATES.enabled:
+            image_hash = dhash(decoded[0])
+            found = NEAR_DUPLICATES.lookup(namespace, image_hash)
+            if found is not None:
+                predictions, distance = found
+                if cache_key is not None:
+                    PREDICTION_CACHE.put(cache_key, predictions)
+                MODEL_REGISTRY.record(model_id, (time.perf_counter() - start) * 1000.0, cached=True)
+                return jsonify({'success': True, 'predictions': predictions, 'bestMatch': predictions[0],
+                                'model': model_id, 'nearDuplicate': True, 'hashDistance': distance})
+
+        # Forward được gom batch cùng các request đồng thời khác
+        input_tensor = image_to_tensor(decoded)
+        single_probs, single_ids = submit_to_batcher(model_id, input_tensor).result()
+        predictions = build_predictions(single_probs, single_ids, classes, threshold)
+        if cache_key is not None:
+            PREDICTION_CACHE.put(cache_key, predictions)
+        if image_hash is not None:
+            NEAR_DUPLICATES.add(namespace, image_hash, predictions)
+        MODEL_REGISTRY.record(model_id, (time.perf_counter() - start) * 1000.0)
 
         return jsonify({
             'success': True,
             'predictions': predictions,
-            'bestMatch': predictions[0]
+            'bestMatch': predictions[0],
+            'model': model_id,
         })
 
+    except UnknownModel as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except UploadTooLarge as e:
+        return jsonify({'success': False, 'message': str(e)}), 413
     except Exception as e:
         logger.error(f"Prediction Error: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    try:
+        start_time = time.perf_counter()
+        model_id = get_requested_model_id()
+        files = request.files.getlist('files') + request.files.getlist('file')
+        if files:
+            raw_items = [('bytes', f.read()) for f in files]
+        else:
+            data = request.get_json(silent=True) or {}
+            images = data.get('images')
+            if not isinstance(images, list):
+                return jsonify({'success': False, 'message': 'No images provided'}), 400
+            raw_items = [('base64', img) for img in images]
+
+        if not raw_items:
+            return jsonify({'success': False, 'message': 'No images provided'}), 400
+        if len(raw_items) > PREDICT_BATCH_LIMIT:
+            return jsonify({'success': False, 'message': f'Too many images (max {PREDICT_BATCH_LIMIT})'}), 400
+
+        crop = PREPROCESS_CFG['crop']
+        batch = torch.empty(len(raw_items), 3, crop, crop)
+
+        def decode_item(i):
+            # Mỗi ảnh được ghi thẳng vào hàng của batch cấp sẵn
+            kind, payload = raw_items[i]
+            image_bytes = payload if kind == 'bytes' else decode_base64_image(payload)
+            load_input_tensor(image_bytes, out=batch[i])
+
+        # Decode song song; lỗi của từng ảnh không làm hỏng cả batch
+        futures = [DECODE_POOL.submit(decode_item, i) for i in range(len(raw_items))]
+        results = [None] * len(raw_items)
+        threshold = get_match_threshold()
+        model_data = None
+
+        # Forward từng đoạn BATCH_MAX_SIZE ảnh ngay khi đoạn đó decode xong, trong lúc pool decode tiếp phần sau
+        for start in range(0, len(raw_items), BATCH_MAX_SIZE):
+            end = min(start + BATCH_MAX_SIZE, len(raw_items))
+            ok = []
+            for i in range(start, end):
+                try:
+                    futures[i].result()
+                    ok.append(i)
+                except Exception as e:
+                    batch[i].zero_()
+                    results[i] = {'success': False, 'message': f'Invalid image: {e}'}
+            if not ok:
+                continue
+            if model_data is None:
+                model_data = get_model(model_id)
+            classes = model_data['classes']
+            top_prob, top_id = run_topk(model_data['model'], batch[start:end].to(DEVICE), 3)
+            top_prob, top_id = top_prob.cpu(), top_id.cpu()
+            for i in ok:
+                predictions = build_predictions(top_prob[i - start], top_id[i - start], classes, threshold)
+                results[i] = {'success': True, 'predictions': predictions, 'bestMatch': predictions[0]}
+
+        if model_data is not None:
+            MODEL_REGISTRY.record(model_id, (time.perf_counter() - start_time) * 1000.0)
+        return jsonify({'success': True, 'results': results, 'model': model_id})
+
+    except UnknownModel as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Batch Prediction Error: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
 @app.route('/recommend', methods=['POST'])
 def recommend():
     try:
@@ -219,9 +699,91 @@ def recommend():
         logger.error(f"Recommendation Error: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@app.route('/recommend/batch', methods=['POST'])
+def recommend_batch():
+    try:
+        data = request.get_json(silent=True) or {}
+        requests_list = data.get('requests')
+        if not isinstance(requests_list, list):
+            return jsonify({'success': False, 'message': 'No requests provided'}), 400
+        top_n = data.get('topN', 5)
+        if not isinstance(top_n, int) or isinstance(top_n, bool) or top_n < 1:
+            return jsonify({'success': False, 'message': 'topN must be a positive integer'}), 400
+        results = recommender.get_recommendations_batch(requests_list, top_n=top_n)
+        return jsonify({'success': True, 'results': results})
+    except Exception as e:
+        logger.error(f"Batch Recommendation Error: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/recommend/plan', methods=['POST'])
+def recommend_plan():
+    try:
+        data = request.get_json(silent=True) or {}
+        try:
+            meals = int(data.get('meals', 3))
+        except (TypeError, ValueError):
+            meals = None
+        if meals is None or not 1 <= meals <= MEAL_PLAN_MAX_MEALS:
+            return jsonify({'success': False, 'message': f"meals must be between 1 and {MEAL_PLAN_MAX_MEALS}"}), 400
+        # Client có thể yêu cầu ít thời gian hơn, không được nhiều hơn cấu hình server
+        try:
+            budget_ms = float(data.get('timeBudgetMs', MEAL_PLAN_TIME_BUDGET_MS))
+        except (TypeError, ValueError):
+            budget_ms = math.nan
+        if not math.isfinite(budget_ms) or budget_ms <= 0:
+            return jsonify({'success': False, 'message': "timeBudgetMs must be a positive number"}), 400
+        budget_ms = min(budget_ms, MEAL_PLAN_TIME_BUDGET_MS)
+        plan = recommender.get_meal_plan(data.get('userProfile') or {}, data.get('eatenToday'), meals, budget_ms)
+        return jsonify({'success': True, 'plan': plan})
+    except Exception as e:
+        logger.error(f"Meal Plan Error: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify({
+        'batching': {model_id: b.stats() for model_id, b in BATCHERS.items()},
+        'predictionCache': PREDICTION_CACHE.stats(),
+        'nearDuplicates': NEAR_DUPLICATES.stats(),
+        'models': MODEL_REGISTRY.stats(),
+        'menu': {'size': len(menu_store), 'version': MENU_VERSION, 'load': MENU_LOAD, 'reload': MENU_RELOADER.stats()},
+        **{name: provider() for name, provider in METRICS_PROVIDERS.items()},
+    })
+
+@app.route('/admin/reload-menu', methods=['POST'])
+def admin_reload_menu():
+    # Nạp lại menu từ MENU_PATH trên thread nền; ?full=1 dựng lại toàn bộ, ?wait=1 chờ xong mới trả kết quả
+    if not ADMIN_TOKEN or request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({'success': False, 'message': 'Forbidden'}), 403
+    full = request.args.get('full') == '1'
+    future = MENU_RELOADER.reload(full=full)
+    if request.args.get('wait') != '1':
+        return jsonify({'success': True, 'status': 'scheduled'}), 202
+    result = future.result()
+    return jsonify({'success': result['status'] != 'error', **result}), (500 if result['status'] == 'error' else 200)
+
+@app.route('/models', methods=['GET'])
+def list_models():
+    # Danh sách model client có thể chọn (?model=...) và trạng thái nạp hiện tại
+    registry = MODEL_REGISTRY.stats()['models']
+    return jsonify({'default': MODEL_CONFIGS[0]['id'], 'models': [
+        {'id': cfg['id'], 'name': cfg['name'], 'tier': cfg.get('tier'),
+         'status': registry.get(cfg['id'], {}).get('status', 'unloaded')}
+        for cfg in MODEL_CONFIGS
+    ]})
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    # Readiness cho load balancer: 200 khi mọi model đã nạp và warm-up xong, hoặc khi chạy chế độ nạp lười
+    is_ready = WARMUP_STATE['status'] in ('ready', 'lazy')
+    return jsonify({'ready': is_ready, **WARMUP_STATE}), (200 if is_ready else 503)
+
 @app.route('/', methods=['GET'])
 def health():
-    return jsonify({'status': 'online', 'data_source': 'local_json', 'menu_size': len(dynamic_food_data)})
+    return jsonify({'status': 'online', 'data_source': 'local_json', 'menu_size': len(menu_store)})
+
+if WARMUP_ON_START:
+    start_warmup()
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
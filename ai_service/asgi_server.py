@@ -0,0 +1,309 @@
+"""
+Chế độ serving ASGI/asyncio cho cùng các route của app.py.
+
+    python asgi_server.py --port 5000
+    uvicorn asgi_server:application --port 5000
+
+Body request được đọc bất đồng bộ trên event loop, nên client upload chậm (mạng di động) không giữ thread
+nào. Khi đã có đủ body, request được chạy trong một thread pool giới hạn (ASGI_MAX_CONCURRENCY thread)
+bằng chính Flask app (WSGI). Nếu số request đang chờ pool vượt ASGI_MAX_QUEUE thì trả 503 ngay kèm
+Retry-After thay vì để thread/request dồn ứ không giới hạn. Hàng đợi được kiểm tra trước khi đọc body, và
+tổng số byte body đang giữ trong bộ nhớ (đang đọc, đang chờ, đang chạy) bị giới hạn bởi ASGI_MAX_BUFFERED_BYTES,
+nên nhiều upload chậm cùng lúc cũng bị trả 503 thay vì dồn body vào RAM.
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import math
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import app as service
+
+logger = logging.getLogger(__name__)
+
+ASGI_MAX_CONCURRENCY = int(os.environ.get('ASGI_MAX_CONCURRENCY', max(4, os.cpu_count() or 1)))
+ASGI_MAX_QUEUE = int(os.environ.get('ASGI_MAX_QUEUE', 64))
+# Tổng dung lượng body được giữ đồng thời (mặc định 8 upload tối đa); không nhỏ hơn MAX_UPLOAD_BYTES
+ASGI_MAX_BUFFERED_BYTES = int(os.environ.get('ASGI_MAX_BUFFERED_BYTES', 8 * service.MAX_UPLOAD_BYTES))
+# Thời gian tối đa để nhận xong body (client quá chậm bị trả 408)
+ASGI_BODY_TIMEOUT_S = float(os.environ.get('ASGI_BODY_TIMEOUT_S', 60))
+# Các route nhẹ (health/ready/metrics) chạy trên pool riêng, không qua hàng đợi
+LIGHT_ROUTES = {('GET', '/'), ('GET', '/ready'), ('GET', '/metrics')}
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Server overloaded, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionQueue:
+    """
+    Giới hạn số request chạy đồng thời (`max_concurrency`), số request được phép chờ (`max_queue`) và tổng
+    số byte body đang giữ (`max_buffered_bytes`, xem BodyReservation).
+    Request vượt quá bị từ chối ngay với Retry-After ước lượng từ thời gian xử lý trung bình.
+    """
+
+    def __init__(self, max_concurrency, max_queue, max_buffered_bytes=None):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self.max_buffered_bytes = max_buffered_bytes
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._running = 0
+        self._waiting = 0
+        self._buffered_bytes = 0
+        self._admitted = self._rejected = 0
+        self._service_ms = None  # EWMA
+
+    def retry_after(self):
+        per_request = (self._service_ms or 1000.0) / 1000.0
+        return max(1, math.ceil((self._waiting + 1) * per_request / self.max_concurrency))
+
+    def check(self):
+        """Từ chối sớm (trước khi đọc body) khi hàng đợi đã đầy."""
+        if self._semaphore.locked() and self._waiting >= self.max_queue:
+            self._rejected += 1
+            raise Overloaded(self.retry_after())
+
+    def reserve_body(self, n):
+        if self.max_buffered_bytes is not None and self._buffered_bytes + n > self.max_buffered_bytes:
+            self._rejected += 1
+            raise Overloaded(self.retry_after())
+        self._buffered_bytes += n
+
+    def release_body(self, n):
+        self._buffered_bytes -= n
+
+    async def run(self, executor, fn, *args):
+        self.check()
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        self._running += 1
+        self._admitted += 1
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000.0
+            self._service_ms = elapsed if self._service_ms is None else 0.9 * self._service_ms + 0.1 * elapsed
+            self._running -= 1
+            self._semaphore.release()
+
+    def stats(self):
+        return {
+            'max_concurrency': self.max_concurrency,
+            'max_queue': self.max_queue,
+            'running': self._running,
+            'waiting': self._waiting,
+            'buffered_bytes': self._buffered_bytes,
+            'max_buffered_bytes': self.max_buffered_bytes,
+            'admitted': self._admitted,
+            'rejected': self._rejected,
+            'avg_service_ms': self._service_ms or 0.0,
+        }
+
+
+class BodyReservation:
+    """Phần ngân sách byte body của một request; tăng dần theo body đã nhận, trả lại khi request xong."""
+
+    def __init__(self, admission):
+        self.admission = admission
+        self.bytes = 0
+
+    def ensure(self, n):
+        if n > self.bytes:
+            self.admission.reserve_body(n - self.bytes)
+            self.bytes = n
+
+    def release(self):
+        self.admission.release_body(self.bytes)
+        self.bytes = 0
+
+
+def _content_length(scope):
+    for name, value in scope.get('headers', []):
+        if name.lower() == b'content-length':
+            try:
+                return max(0, int(value))
+            except ValueError:
+                return None
+    return None
+
+
+def _environ(scope, body):
+    headers = [(k.decode('latin-1'), v.decode('latin-1')) for k, v in scope.get('headers', [])]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in headers:
+        key = name.upper().replace('-', '_')
+        if key == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif key != 'CONTENT_LENGTH':
+            key = f"HTTP_{key}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _call_wsgi(wsgi_app, environ):
+    """Chạy WSGI app trong thread của pool; trả về (status, headers, body)."""
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = headers
+
+    chunks = wsgi_app(environ, start_response)
+    try:
+        body = b''.join(chunks)
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+    return response['status'], response['headers'], body
+
+
+class AsgiServer:
+    def __init__(self, wsgi_app, max_concurrency=ASGI_MAX_CONCURRENCY, max_queue=ASGI_MAX_QUEUE,
+                 max_body_bytes=service.MAX_UPLOAD_BYTES, body_timeout=ASGI_BODY_TIMEOUT_S,
+                 max_buffered_bytes=ASGI_MAX_BUFFERED_BYTES):
+        self.wsgi_app = wsgi_app
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_body_bytes = max_body_bytes
+        self.max_buffered_bytes = max(max_buffered_bytes, max_body_bytes)
+        self.body_timeout = body_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_concurrency)), thread_name_prefix='asgi')
+        self._light_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='asgi-light')
+        self._admission = None
+
+    @property
+    def admission(self):
+        # asyncio.Semaphore phải được tạo trong event loop đang chạy
+        if self._admission is None:
+            self._admission = AdmissionQueue(self.max_concurrency, self.max_queue, self.max_buffered_bytes)
+        return self._admission
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        light = (scope['method'], scope['path']) in LIGHT_ROUTES
+        reservation = BodyReservation(self.admission)
+        try:
+            # Kiểm tra hàng đợi và giữ chỗ theo Content-Length trước khi nhận body vào bộ nhớ
+            declared = _content_length(scope)
+            if declared is not None and declared > self.max_body_bytes:
+                raise service.UploadTooLarge(f"Upload too large (max {self.max_body_bytes} bytes)")
+            if not light:
+                self.admission.check()
+            reservation.ensure(declared or 0)
+            body = await asyncio.wait_for(self._read_body(receive, reservation), timeout=self.body_timeout)
+            if body is None:  # client ngắt kết nối
+                return
+
+            environ = _environ(scope, body)
+            if light:
+                loop = asyncio.get_running_loop()
+                status, headers, payload = await loop.run_in_executor(self._light_executor, _call_wsgi, self.wsgi_app, environ)
+            else:
+                status, headers, payload = await self.admission.run(self._executor, _call_wsgi, self.wsgi_app, environ)
+        except asyncio.TimeoutError:
+            await self._send_json(send, 408, 'Request body timeout')
+            return
+        except service.UploadTooLarge as e:
+            await self._send_json(send, 413, str(e))
+            return
+        except Overloaded as e:
+            await self._send_json(send, 503, str(e), [(b'retry-after', str(e.retry_after).encode('ascii'))])
+            return
+        finally:
+            reservation.release()
+
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers],
+        })
+        await send({'type': 'http.response.body', 'body': payload})
+
+    async def _read_body(self, receive, reservation):
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunk = message.get('body', b'')
+            if chunk:
+                size += len(chunk)
+                if size > self.max_body_bytes:
+                    raise service.UploadTooLarge(f"Upload too large (max {self.max_body_bytes} bytes)")
+                reservation.ensure(size)
+                chunks.append(chunk)
+            if not message.get('more_body', False):
+                return b''.join(chunks)
+
+    async def _send_json(self, send, status, message, extra_headers=()):
+        body = json.dumps({'success': False, 'message': message}).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode('ascii')),
+                        *extra_headers],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                service.METRICS_PROVIDERS['admission'] = lambda: self.admission.stats()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self._executor.shutdown(wait=False)
+                self._light_executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+application = AsgiServer(service.app)
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="NutriScan AI server (ASGI mode)")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    args = parser.parse_args()
+    uvicorn.run(application, host=args.host, port=args.port, log_level='info')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+import threading
+import queue
+import time
+import logging
+from collections import Counter, deque
+from concurrent.futures import Future
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+@torch.no_grad()
+def run_topk(model, batch: torch.Tensor, k: int = 3):
+    """Một lần forward cho cả batch, trả về (top_prob, top_id) shape [B, k]."""
+    outputs = model(batch)
+    probabilities = torch.nn.functional.softmax(outputs, dim=1)
+    k = min(k, probabilities.shape[1])
+    return torch.topk(probabilities, k)
+
+
+class BatcherClosed(RuntimeError):
+    pass
+
+
+class MicroBatcher:
+    """
+    Gom các tensor đã preprocess từ nhiều request đồng thời thành một batch,
+    chạy một lần forward rồi trả phần top-k tương ứng cho từng caller.
+
+    Batch được đóng khi đủ `max_batch_size` ảnh hoặc khi request đầu tiên
+    trong batch đã chờ quá `max_wait_ms`.
+    """
+
+    def __init__(self, model, device, max_batch_size=16, max_wait_ms=10.0, top_k=3, name="batcher"):
+        self.model = model
+        self.device = device
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.top_k = top_k
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._waits_ms = deque(maxlen=4096)
+        self._requests = 0
+        self._batches = 0
+        self._errors = 0
+        self._forward_ms = deque(maxlen=4096)
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._loop, name=f"{name}-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, tensor: torch.Tensor) -> Future:
+        """`tensor` có shape [C, H, W] hoặc [1, C, H, W]. Kết quả là (top_prob, top_id) shape [k]."""
+        if tensor.dim() == 4:
+            tensor = tensor.squeeze(0)
+        fut = Future()
+        with self._lock:
+            if self._closed:
+                raise BatcherClosed(f"[{self.name}] Batcher is closed")
+            self._queue.put((tensor, fut, time.perf_counter()))
+        return fut
+
+    def close(self):
+        """Dừng worker sau khi chạy hết các request đã nhận (vd. khi model bị gỡ khỏi registry)."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+
+    def _collect(self):
+        # Trả về (batch, stop): None trong queue là tín hiệu dừng của close()
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    # Hết thời gian chờ: chỉ lấy thêm những gì đã sẵn trong queue
+                    item = self._queue.get_nowait()
+                else:
+                    item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _loop(self):
+        while True:
+            batch, stop = self._collect()
+            if batch:
+                self._run(batch)
+            if stop:
+                self.model = None
+                return
+
+    def _run(self, batch):
+        start = time.perf_counter()
+        try:
+            inputs = torch.stack([item[0] for item in batch]).to(self.device)
+            top_prob, top_id = run_topk(self.model, inputs, self.top_k)
+            top_prob, top_id = top_prob.cpu(), top_id.cpu()
+            forward_ms = (time.perf_counter() - start) * 1000.0
+        except Exception as e:
+            logger.error(f"[{self.name}] Batch forward failed: {e}")
+            with self._lock:
+                self._errors += 1
+            for _, fut, _ in batch:
+                fut.set_exception(e)
+            return
+
+        with self._lock:
+            self._batches += 1
+            self._requests += len(batch)
+            self._batch_sizes[len(batch)] += 1
+            self._forward_ms.append(forward_ms)
+            for _, _, enqueued in batch:
+                self._waits_ms.append((start - enqueued) * 1000.0)
+
+        for i, (_, fut, _) in enumerate(batch):
+            fut.set_result((top_prob[i], top_id[i]))
+
+    def stats(self):
+        with self._lock:
+            waits = sorted(self._waits_ms)
+            forwards = sorted(self._forward_ms)
+            histogram = dict(sorted(self._batch_sizes.items()))
+            requests, batches, errors = self._requests, self._batches, self._errors
+
+        def pct(p, values=waits):
+            if not values: return 0.0
+            return values[min(len(values) - 1, int(p / 100.0 * len(values)))]
+
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'queue_depth': self._queue.qsize(),
+            'requests': requests,
+            'batches': batches,
+            'errors': errors,
+            'avg_batch_size': (requests / batches) if batches else 0.0,
+            'batch_size_histogram': histogram,
+            'wait_ms': {
+                'avg': (sum(waits) / len(waits)) if waits else 0.0,
+                'p50': pct(50),
+                'p99': pct(99),
+                'max': waits[-1] if waits else 0.0,
+            },
+            'forward_ms': {
+                'avg': (sum(forwards) / len(forwards)) if forwards else 0.0,
+                'p50': pct(50, forwards),
+                'p99': pct(99, forwards),
+            },
+        }
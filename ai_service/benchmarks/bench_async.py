@@ -0,0 +1,111 @@
+"""
+Latency của client nhanh (/recommend) khi có client upload chậm (/predict, body gửi nhỏ giọt như mạng di động),
+so sánh serve.py (gunicorn gthread, thread bị giữ suốt lúc đọc body) với asgi_server.py (body đọc trên event loop,
+xử lý trong pool giới hạn, admission queue trả 503 + Retry-After khi đầy).
+
+    python benchmarks/bench_async.py --slow-clients 8 --fast-clients 4 --duration 15
+"""
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from benchmarks.bench_workers import RECOMMEND_BODY, phone_photo, wait_ready  # noqa: E402
+
+THREADS = 4
+
+
+def slow_upload(port, body, seconds, stop):
+    # Gửi body thành nhiều mẩu nhỏ trong `seconds` giây, lặp lại tới khi dừng
+    chunk = max(1, len(body) // 50)
+    while not stop.is_set():
+        try:
+            sock = socket.create_connection(('127.0.0.1', port), timeout=60)
+            sock.sendall(
+                f"POST /predict HTTP/1.1\r\nHost: localhost\r\nContent-Type: image/jpeg\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('ascii')
+            )
+            for i in range(0, len(body), chunk):
+                if stop.is_set():
+                    break
+                sock.sendall(body[i:i + chunk])
+                time.sleep(seconds / 50)
+            sock.recv(65536)
+            sock.close()
+        except OSError:
+            time.sleep(0.1)
+
+
+def fast_client(port, stop, latencies, statuses):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            conn.request('POST', '/recommend', body=RECOMMEND_BODY, headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            response.read()
+            statuses.append(response.status)
+            if response.status == 200:
+                latencies.append((time.perf_counter() - start) * 1000.0)
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+
+
+def run_mode(name, cmd, env, port, args, body):
+    server = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_ready(port):
+            print(f"{name}: server did not become ready")
+            return
+        for slow in (0, args.slow_clients):
+            stop = threading.Event()
+            latencies, statuses = [], []
+            threads = [threading.Thread(target=slow_upload, args=(port, body, args.upload_seconds, stop)) for _ in range(slow)]
+            threads += [threading.Thread(target=fast_client, args=(port, stop, latencies, statuses)) for _ in range(args.fast_clients)]
+            for t in threads:
+                t.start()
+            time.sleep(args.duration)
+            stop.set()
+            for t in threads:
+                t.join()
+            latencies.sort()
+            p99 = latencies[int(0.99 * (len(latencies) - 1))] if latencies else 0.0
+            rejected = sum(1 for s in statuses if s == 503)
+            print(f"{name:<8} {slow:>5} {len(latencies) / args.duration:>8.1f} "
+                  f"{statistics.median(latencies) if latencies else 0.0:>8.1f} {p99:>8.1f} {rejected:>6}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--slow-clients', type=int, default=8)
+    parser.add_argument('--fast-clients', type=int, default=4)
+    parser.add_argument('--upload-seconds', type=float, default=5.0)
+    parser.add_argument('--duration', type=float, default=15.0)
+    parser.add_argument('--port', type=int, default=5098)
+    args = parser.parse_args()
+
+    body = phone_photo(4000, 3000)
+    env = dict(os.environ, PREDICTION_CACHE_MAX_BYTES='0', PREDICTION_CACHE_DB='', NEAR_DUP_RADIUS='-1',
+               ASGI_MAX_CONCURRENCY=str(THREADS))
+    modes = [
+        ('gthread', [sys.executable, 'serve.py', '--workers', '1', '--threads', str(THREADS), '--port', str(args.port)]),
+        ('asgi', [sys.executable, 'asgi_server.py', '--port', str(args.port)]),
+    ]
+    print(f"{'mode':<8} {'slow':>5} {'fast r/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'503s':>6}")
+    for name, cmd in modes:
+        run_mode(name, cmd, env, args.port, args, body)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+So sánh MacroIndex (KD-tree trên macro) với chấm điểm toàn bộ menu (score_all) trên menu tổng hợp:
+recall@5 và latency theo số leaf tối đa được duyệt (`max_leaves`; "exact" = duyệt tới khi chứng minh
+được top-k, kết quả phải trùng brute-force).
+
+    python benchmarks/bench_macro_index.py --sizes 100000,1000000 --queries 200
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from calc_nutrients import NutritionRecommender  # noqa: E402
+from macro_index import MacroIndex  # noqa: E402
+from bench_recommend import load_menu, synthetic_menu  # noqa: E402
+
+WEIGHTS = {'Energy': 3.0, 'Protein': 1.5, 'Fat': 0.5, 'Carbohydrate': 0.5}
+MAX_LEAVES = [1, 4, 16, 64, None]
+
+
+def random_targets(n, seed=1):
+    rng = np.random.default_rng(seed)
+    energy = rng.uniform(300, 1200, n)
+    protein = energy * rng.uniform(0.03, 0.08, n)
+    fat = energy * rng.uniform(0.02, 0.05, n)
+    carbs = energy * rng.uniform(0.10, 0.16, n)
+    return [dict(zip(('Energy', 'Protein', 'Fat', 'Carbohydrate'), map(float, row)))
+            for row in zip(energy, protein, fat, carbs)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='100000,1000000')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-n', type=int, default=5)
+    args = parser.parse_args()
+
+    base = load_menu()
+    targets = random_targets(args.queries)
+    k = args.top_n
+    print(f"{'dishes':>8} {'max_leaves':>10} {'recall@k':>9} {'exact':>6} {'leaves':>7} {'us/query':>9}")
+    for n in [int(x) for x in args.sizes.split(',')]:
+        rec = NutritionRecommender(synthetic_menu(base, n), index_min_dishes=0)
+        start = time.perf_counter()
+        index = MacroIndex(rec.macros)
+        build_ms = (time.perf_counter() - start) * 1000.0
+        print(f"{n:>8} build {build_ms:.0f} ms, {index.n_leaves} leaves")
+
+        truth = []
+        start = time.perf_counter()
+        for target in targets:
+            truth.append(rec.top_indices(target, k, WEIGHTS))
+        brute_us = (time.perf_counter() - start) * 1e6 / len(targets)
+        print(f"{n:>8} {'brute':>10} {1.0:>9.3f} {'-':>6} {index.n_leaves:>7} {brute_us:>9.0f}")
+
+        for max_leaves in MAX_LEAVES:
+            hits = exact = leaves = 0
+            start = time.perf_counter()
+            results = []
+            for target in targets:
+                t, coef = rec.query_params(target, WEIGHTS)
+                results.append(index.query(t, coef, k, rec.energy_window(target), max_leaves=max_leaves))
+            us = (time.perf_counter() - start) * 1e6 / len(targets)
+            for (idx, scores, visited), (ref_idx, ref_scores) in zip(results, truth):
+                hits += len(set(idx.tolist()) & set(ref_idx.tolist()))
+                exact += np.array_equal(idx, ref_idx) and np.array_equal(scores, ref_scores)
+                leaves += visited
+            label = 'exact' if max_leaves is None else str(max_leaves)
+            print(f"{n:>8} {label:>10} {hits / (k * len(targets)):>9.3f} {exact / len(targets):>6.2f} "
+                  f"{leaves / len(targets):>7.1f} {us:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Chất lượng và latency của thực đơn cả ngày (NutritionRecommender.plan_meals) theo time budget:
+điểm chênh so với lời giải tối ưu trên pool (beam giữ mọi tổ hợp, không giới hạn thời gian).
+
+    python benchmarks/bench_meal_plan.py --dishes 674 --budgets 5,20,50 --targets 20
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from calc_nutrients import NutritionRecommender  # noqa: E402
+from bench_recommend import load_menu, synthetic_menu  # noqa: E402
+
+
+def daily_targets(n, seed=0):
+    rng = np.random.default_rng(seed)
+    out = []
+    for _ in range(n):
+        energy = rng.uniform(1200, 3000)
+        out.append({'Energy': energy, 'Protein': energy * rng.uniform(0.03, 0.06),
+                    'Fat': energy * rng.uniform(0.02, 0.04), 'Carbohydrate': energy * rng.uniform(0.10, 0.15)})
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dishes', type=int, default=674)
+    parser.add_argument('--meals', type=int, default=3)
+    parser.add_argument('--budgets', default='5,20,50,100')
+    parser.add_argument('--targets', type=int, default=20)
+    args = parser.parse_args()
+
+    rec = NutritionRecommender(synthetic_menu(load_menu(), args.dishes))
+    targets = daily_targets(args.targets)
+    optimum = [rec.plan_meals(t, args.meals, time_budget_ms=None)[1] for t in targets]
+
+    print(f"{'budget ms':>9} {'optimal':>8} {'mean gap':>9} {'max gap':>8} {'avg ms':>7} {'max ms':>7}")
+    for budget in [float(x) for x in args.budgets.split(',')]:
+        gaps, times = [], []
+        for target, best in zip(targets, optimum):
+            start = time.perf_counter()
+            _, score, _ = rec.plan_meals(target, args.meals, time_budget_ms=budget)
+            times.append((time.perf_counter() - start) * 1000.0)
+            gaps.append(score - best)
+        optimal = sum(g < 1e-9 for g in gaps) / len(gaps)
+        print(f"{budget:>9.0f} {optimal:>8.2f} {np.mean(gaps):>9.4f} {max(gaps):>8.4f} "
+              f"{np.mean(times):>7.1f} {max(times):>7.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Thời gian khởi động menu: nạp từ JSON (json.loads + MenuStore + MenuIndex + NutritionRecommender, như
+app.set_menu) so với map snapshot nhị phân (export_menu.py). Mỗi đường đo trong một process mới (page cache
+của file đã nóng, như khi restart service). Kèm lần nạp lại tăng dần đầu tiên sau khi khởi động từ snapshot
+(store không có fingerprint -> so theo nội dung) so với sau khi khởi động từ JSON.
+
+    python benchmarks/bench_menu_load.py --dishes 1000000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def measure(mode, json_path, snapshot_path, edited_path):
+    from calc_nutrients import NutritionRecommender
+    from menu_index import MenuIndex
+    from menu_reload import MenuReloader
+    from menu_snapshot import load_fresh_snapshot
+    from menu_store import MenuStore
+
+    state = {}
+
+    def apply(food_list, version, full):
+        diff = None
+        if not full and 'store' in state:
+            store, source, diff = state['store'].updated(food_list)
+            index = MenuIndex(store, previous=state['index'], source=source)
+        else:
+            store = MenuStore(food_list)
+            index = MenuIndex(store)
+        state.update(store=store, index=index, recommender=NutritionRecommender(store))
+        return diff
+
+    reloader = MenuReloader(json_path, apply=apply)
+    start = time.perf_counter()
+    if mode == 'snapshot':
+        snapshot = load_fresh_snapshot(snapshot_path, json_path)
+        state.update(store=snapshot['store'], index=snapshot['index'], recommender=snapshot['recommender'])
+        reloader.mark_loaded(snapshot['version'], snapshot['signature'])
+    else:
+        reloader.load(full=True)
+    load_s = time.perf_counter() - start
+
+    # Lần nạp lại tăng dần đầu tiên: file JSON đổi 1% số món
+    reloader.path = edited_path
+    reload_s = reloader.load(full=False)['total_ms'] / 1000.0
+    print(json.dumps({'mode': mode, 'load_s': load_s, 'reload_s': reload_s}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dishes', type=int, default=1_000_000)
+    parser.add_argument('--mode', choices=['json', 'snapshot'])
+    parser.add_argument('--paths', nargs=3)
+    args = parser.parse_args()
+    if args.mode:
+        measure(args.mode, *args.paths)
+        return
+
+    from bench_menu_reload import edit
+    from bench_recommend import load_menu, synthetic_menu
+    from menu_snapshot import build_snapshot
+
+    menu = synthetic_menu(load_menu(), args.dishes)
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path, snapshot_path, edited_path = (os.path.join(tmp, name) for name in
+                                                 ('food_data.json', 'food_data.snapshot', 'edited.json'))
+        for path, food_list in ((json_path, menu), (edited_path, edit(menu, 0.01))):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(food_list, f, ensure_ascii=False)
+        del menu
+        start = time.perf_counter()
+        build_snapshot(json_path, snapshot_path)
+        print(f"snapshot build {time.perf_counter() - start:.1f} s, "
+              f"JSON {os.path.getsize(json_path) / 2**20:.0f} MiB, snapshot {os.path.getsize(snapshot_path) / 2**20:.0f} MiB")
+
+        print(f"{'startup':<9} {'dishes':>9} {'load s':>8} {'1st incremental reload s':>25}")
+        for mode in ('json', 'snapshot'):
+            out = subprocess.run([sys.executable, __file__, '--mode', mode, '--paths', json_path, snapshot_path, edited_path],
+                                 cwd=ROOT, capture_output=True, text=True, check=True).stdout
+            r = json.loads(out.strip().splitlines()[-1])
+            print(f"{mode:<9} {args.dishes:>9} {r['load_s']:>8.2f} {r['reload_s']:>25.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Bộ nhớ thường trú (RSS) của menu ở 1M món: cách lưu cũ (list dict `dynamic_food_data` có search_norm +
+DataFrame object-dtype + to_dict('records') của recommender) so với MenuStore dùng chung.
+Mỗi cách đo trong một process riêng: RSS sau khi dựng xong (đã bỏ list nguồn nếu không còn giữ) trừ RSS
+trước khi đọc menu.
+
+    python benchmarks/bench_menu_memory.py --dishes 1000000
+"""
+import argparse
+import ctypes
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def rss_bytes():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def settle():
+    gc.collect()
+    try:
+        ctypes.CDLL('libc.so.6').malloc_trim(0)
+    except OSError:
+        pass
+
+
+def build_legacy(food_list):
+    # Cách lưu trước MenuStore (app.py + NutritionRecommender.__init__)
+    import numpy as np
+    import pandas as pd
+    for item in food_list:
+        item['search_norm'] = str(item.get('name', '')).lower()
+    df = pd.DataFrame(food_list)
+    df['name'] = df['name'].astype(str).str.strip()
+    df = df.drop_duplicates(subset=['name'], keep='first')
+    for col in ['Energy', 'Protein', 'Fat', 'Carbohydrate', 'Fiber']:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    df = df.reset_index(drop=True)
+    macros = np.stack([df[c].to_numpy(dtype=np.float32) for c in ['Energy', 'Protein', 'Fat', 'Carbohydrate']])
+    return food_list, df, macros, df.to_dict('records')
+
+
+def build_store(food_list):
+    from calc_nutrients import NutritionRecommender
+    from menu_store import MenuStore
+    store = MenuStore(food_list)
+    # index_min_dishes=0: chỉ so phần dữ liệu menu, không tính KD-tree
+    return store, NutritionRecommender(store, index_min_dishes=0)
+
+
+def measure(mode, n):
+    import numpy as np  # noqa: F401  (nạp thư viện trước khi đo)
+    import pandas  # noqa: F401
+    import calc_nutrients  # noqa: F401
+    from bench_recommend import load_menu, synthetic_menu
+
+    base = load_menu()
+    settle()
+    before = rss_bytes()
+    food_list = synthetic_menu(base, n)
+    start = time.perf_counter()
+    kept = build_legacy(food_list) if mode == 'legacy' else build_store(food_list)
+    build_s = time.perf_counter() - start
+    del food_list
+    settle()
+    extra = {'store_nbytes': kept[0].nbytes} if mode == 'store' else {}
+    print(json.dumps({'mode': mode, 'rss_bytes': rss_bytes() - before, 'build_s': build_s, **extra}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dishes', type=int, default=1_000_000)
+    parser.add_argument('--mode', choices=['legacy', 'store'])
+    args = parser.parse_args()
+    if args.mode:
+        measure(args.mode, args.dishes)
+        return
+
+    print(f"{'layout':<8} {'dishes':>9} {'RSS MiB':>9} {'build s':>8}")
+    for mode in ('legacy', 'store'):
+        out = subprocess.run([sys.executable, __file__, '--mode', mode, '--dishes', str(args.dishes)],
+                             cwd=ROOT, capture_output=True, text=True, check=True).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        note = f"  (MenuStore arrays {r['store_nbytes'] / 2**20:.1f} MiB)" if 'store_nbytes' in r else ''
+        print(f"{mode:<8} {args.dishes:>9} {r['rss_bytes'] / 2**20:>9.1f} {r['build_s']:>8.1f}{note}")
+
+
+if __name__ == '__main__':
+    main()
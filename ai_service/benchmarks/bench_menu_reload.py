@@ -0,0 +1,100 @@
+"""
+Thời gian nạp lại menu (MenuReloader) khi file JSON đổi một phần nhỏ: dựng lại toàn bộ so với nạp tăng
+dần theo 'id' (chỉ món thêm/đổi được parse và chuẩn hoá tên lại). Cùng các bước như app.set_menu.
+
+    python benchmarks/bench_menu_reload.py --dishes 1000000 --changed 0.01
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from calc_nutrients import NutritionRecommender  # noqa: E402
+from menu_index import MenuIndex  # noqa: E402
+from menu_reload import MenuReloader  # noqa: E402
+from menu_store import MenuStore  # noqa: E402
+from bench_recommend import load_menu, synthetic_menu  # noqa: E402
+
+
+class Menu:
+    """Bản rút gọn của app.set_menu, đo thời gian từng bước."""
+
+    def __init__(self):
+        self.store, self.index, self.timings = MenuStore([]), None, {}
+
+    def apply(self, food_list, version, full):
+        start = time.perf_counter()
+        diff = None
+        if not full and len(self.store):
+            store, source, diff = self.store.updated(food_list)
+            t_store = time.perf_counter()
+            index = MenuIndex(store, previous=self.index, source=source)
+        else:
+            store = MenuStore(food_list)
+            t_store = time.perf_counter()
+            index = MenuIndex(store)
+        t_index = time.perf_counter()
+        NutritionRecommender(store)
+        self.timings = {'store_ms': (t_store - start) * 1000.0, 'index_ms': (t_index - t_store) * 1000.0,
+                        'recommender_ms': (time.perf_counter() - t_index) * 1000.0}
+        self.store, self.index = store, index
+        return diff
+
+
+def edit(menu, fraction, seed=0):
+    # Đổi dinh dưỡng + tên của `fraction` món, xoá `fraction` món và thêm `fraction` món mới
+    rng = np.random.default_rng(seed)
+    out = [dict(x) for x in menu]
+    k = max(1, int(len(out) * fraction))
+    for i in rng.choice(len(out), k, replace=False):
+        out[i]['Energy'] = float(out[i]['Energy']) + 10
+        out[i]['name'] = f"{out[i]['name']} (công thức mới)"
+    removed = set(rng.choice(len(out), k, replace=False).tolist())
+    out = [x for i, x in enumerate(out) if i not in removed]
+    for j in range(k):
+        item = dict(menu[j % len(menu)])
+        item['id'], item['name'] = f"NEW-{j}", f"Món mới số {j}"
+        out.append(item)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dishes', type=int, default=1_000_000)
+    parser.add_argument('--changed', type=float, default=0.01)
+    args = parser.parse_args()
+
+    menu_v1 = synthetic_menu(load_menu(), args.dishes)
+    menu_v2 = edit(menu_v1, args.changed)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'food_data.json')
+        menu = Menu()
+        reloader = MenuReloader(path, apply=menu.apply)
+
+        def write(food_list):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(food_list, f, ensure_ascii=False)
+
+        def report(label, r):
+            t = menu.timings
+            print(f"{label:<12} {r['dishes']:>9} {r['total_ms']:>9.0f} {r['parse_ms']:>9.0f} {t['store_ms']:>9.0f} "
+                  f"{t['index_ms']:>9.0f} {t['recommender_ms']:>9.0f}  {r['diff'] or ''}")
+
+        print(f"{'reload':<12} {'dishes':>9} {'total ms':>9} {'parse ms':>9} {'store ms':>9} {'index ms':>9} {'recomm ms':>9}  diff")
+        write(menu_v1)
+        report('initial', reloader.load(full=True))
+        write(menu_v2)
+        report('full', reloader.load(full=True))
+        write(menu_v1)
+        reloader.load(full=True)
+        write(menu_v2)
+        report('incremental', reloader.load(full=False))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+So sánh FastPreprocessor (JPEG draft mode + resize vùng crop + normalize gộp) với pipeline torchvision
+`preprocess` của app: kiểm tra sai khác nằm trong PREPROCESS_MAX_ABS_DIFF / PREPROCESS_MEAN_ABS_DIFF
+và đo latency mỗi ảnh cùng throughput khi decode trên thread pool.
+
+    python benchmarks/bench_preprocess.py
+"""
+import io
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+from PIL import Image, ImageDraw
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('WARMUP_ON_START', '0')
+import app as service  # noqa: E402
+from benchmarks.bench_upload import phone_photo  # noqa: E402
+from fast_preprocess import FastPreprocessor, PREPROCESS_MAX_ABS_DIFF, PREPROCESS_MEAN_ABS_DIFF  # noqa: E402
+
+RUNS = 5
+
+
+def sharp_edges(width=4000, height=3000, fmt='JPEG', seed=1):
+    # Trường hợp xấu cho draft mode: nhiều cạnh sắc và sọc tần số cao
+    rng = np.random.default_rng(seed)
+    image = Image.new('RGB', (width, height), (200, 180, 150))
+    draw = ImageDraw.Draw(image)
+    for _ in range(400):
+        x, y, r = rng.integers(0, width), rng.integers(0, height), rng.integers(5, 200)
+        draw.ellipse([x, y, x + r, y + r], fill=tuple(int(v) for v in rng.integers(0, 255, 3)))
+    for x in range(0, width, 7):
+        draw.line([x, 0, x, height], fill=(0, 0, 0), width=1)
+    out = io.BytesIO()
+    image.save(out, format=fmt, quality=92) if fmt == 'JPEG' else image.save(out, format=fmt)
+    return out.getvalue()
+
+
+def cases():
+    return {
+        'photo 4000x3000': phone_photo(4000, 3000),
+        'photo 3000x4000': phone_photo(3000, 4000),
+        'edges 4000x3000': sharp_edges(),
+        'photo 1280x720': phone_photo(1280, 720),
+        'edges 1024x768 png': sharp_edges(1024, 768, fmt='PNG'),
+    }
+
+
+def reference(data):
+    return service.preprocess(Image.open(io.BytesIO(data)).convert('RGB'))
+
+
+def timed(fn, data):
+    fn(data)
+    samples = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        fn(data)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return statistics.median(samples)
+
+
+def main():
+    fast = FastPreprocessor(service.PREPROCESS_CFG)
+    fast_fn = lambda data: fast(io.BytesIO(data))  # noqa: E731
+    print(f"{'image':<20} {'ref ms':>8} {'fast ms':>8} {'max diff':>9} {'mean diff':>10}")
+    failures = []
+    images = cases()
+    for name, data in images.items():
+        diff = (fast_fn(data) - reference(data)).abs()
+        max_diff, mean_diff = diff.max().item(), diff.mean().item()
+        print(f"{name:<20} {timed(reference, data):>8.1f} {timed(fast_fn, data):>8.1f} {max_diff:>9.4f} {mean_diff:>10.5f}")
+        if max_diff > PREPROCESS_MAX_ABS_DIFF or mean_diff > PREPROCESS_MEAN_ABS_DIFF:
+            failures.append(name)
+
+    # Throughput khi decode 16 ảnh 12MP trên pool, ghi thẳng vào batch cấp sẵn
+    photos = [images['photo 4000x3000']] * 16
+    batch = torch.empty(len(photos), 3, fast.crop, fast.crop)
+    workers = os.cpu_count() or 4
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for label, fn in (('ref', lambda i: batch[i].copy_(reference(photos[i]))),
+                          ('fast', lambda i: fast(io.BytesIO(photos[i]), out=batch[i]))):
+            list(pool.map(fn, range(len(photos))))
+            start = time.perf_counter()
+            list(pool.map(fn, range(len(photos))))
+            elapsed = time.perf_counter() - start
+            print(f"{label:<5} pool x{workers}: {len(photos) / elapsed:.1f} img/s (12MP)")
+
+    assert not failures, f"Fast preprocess outside tolerance for: {failures}"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark NutritionRecommender.recommend khi menu tăng từ kích thước hiện tại (~674 món)
+lên hàng trăm nghìn món (menu tổng hợp bằng cách nhân bản + nhiễu food_data.json).
+
+    python benchmarks/bench_recommend.py
+"""
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from calc_nutrients import NutritionRecommender  # noqa: E402
+
+SIZES = [674, 10_000, 100_000, 500_000]
+TARGET = {'Energy': 820.0, 'Protein': 36.0, 'Fat': 22.0, 'Carbohydrate': 110.0}
+WEIGHTS = {'Energy': 3.0, 'Protein': 1.5, 'Fat': 0.5, 'Carbohydrate': 0.5}
+
+
+def load_menu():
+    with open(os.path.join(ROOT, "food_data.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def synthetic_menu(base, n, seed=0):
+    rng = np.random.default_rng(seed)
+    out = []
+    for i in range(n):
+        item = dict(base[i % len(base)])
+        if i >= len(base):
+            jitter = rng.uniform(0.8, 1.2)
+            for col in ('Energy', 'Protein', 'Fat', 'Carbohydrate'):
+                item[col] = float(item.get(col) or 0) * jitter
+            item['id'] = f"SYN-{i}"
+            item['name'] = f"{item['name']} #{i}"
+        out.append(item)
+    return out
+
+
+def reference_recommend(rec, target, top_n, weights):
+    # Bản cũ: DataFrame.apply(axis=1) + lọc + sort toàn bộ
+    work_df = pd.DataFrame([rec.record(i) for i in range(rec.size)])
+    work_df['match_score'] = work_df.apply(lambda row: rec.calculate_match_score(row, target, weights), axis=1)
+    if target.get('Energy', 0) > 100:
+        work_df = work_df[(work_df['Energy'] >= target['Energy'] * 0.3) & (work_df['Energy'] <= target['Energy'] * 1.7)]
+    return work_df.sort_values('match_score').head(top_n)
+
+
+def timeit(fn, runs):
+    fn()
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) * 1e6 / runs
+
+
+def main():
+    base = load_menu()
+    print(f"{'dishes':>8} | {'vectorized us':>13} | {'apply us':>12}")
+    for n in SIZES:
+        rec = NutritionRecommender(synthetic_menu(base, n))
+        fast = timeit(lambda: rec.recommend_records(TARGET, 5, WEIGHTS), runs=50)
+        slow = '-'
+        if n <= 10_000:
+            ref = reference_recommend(rec, TARGET, 5, WEIGHTS)
+            got = rec.recommend(TARGET, 5, WEIGHTS)
+            assert np.allclose(sorted(ref['match_score']), sorted(got['match_score'])), "top-n mismatch"
+            slow = f"{timeit(lambda: reference_recommend(rec, TARGET, 5, WEIGHTS), runs=3):12.0f}"
+        print(f"{n:>8} | {fast:13.1f} | {slow:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""
+Micro-benchmark + kiểm tra tương đương số học giữa ska_unfold (bản cũ) và ska_shift.
+
+    python benchmarks/bench_ska.py
+"""
+import os
+import sys
+import time
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model.ska import ska_unfold, ska_shift  # noqa: E402
+
+# (C, H, W) của các stage LSConv trong LSNet-B với ảnh 224x224 (groups=8, sks=3)
+SHAPES = [(128, 28, 28), (256, 14, 14), (384, 7, 7)]
+
+
+def bench(fn, x, w, runs=20):
+    with torch.no_grad():
+        fn(x, w)
+        start = time.perf_counter()
+        for _ in range(runs):
+            fn(x, w)
+    return (time.perf_counter() - start) * 1000.0 / runs
+
+
+def main(batch=8):
+    torch.manual_seed(0)
+    print(f"{'shape':>18} | {'unfold ms':>9} | {'shift ms':>9} | {'speedup':>7} | max |diff|")
+    for C, H, W in SHAPES:
+        x = torch.randn(batch, C, H, W)
+        w = torch.randn(batch, C // 8, 9, H, W)
+        ref, out = ska_unfold(x, w), ska_shift(x, w)
+        max_diff = (ref - out).abs().max().item()
+        assert torch.allclose(ref, out, rtol=1e-5, atol=1e-5), f"mismatch {max_diff}"
+        t_unfold, t_shift = bench(ska_unfold, x, w), bench(ska_shift, x, w)
+        print(f"{str((batch, C, H, W)):>18} | {t_unfold:9.2f} | {t_shift:9.2f} | {t_unfold / t_shift:6.2f}x | {max_diff:.1e}")
+
+
+if __name__ == '__main__':
+    main()
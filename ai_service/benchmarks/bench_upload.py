@@ -0,0 +1,91 @@
+"""
+So sánh hai cách gửi ảnh lên /predict với ảnh điện thoại 12MP (4000x3000 JPEG):
+  - JSON {"image": "data:image/jpeg;base64,..."} (cách cũ của frontend)
+  - body nhị phân (Content-Type: image/jpeg), đọc thẳng từ stream vào buffer dùng lại
+
+Đo số byte request, bộ nhớ Python cấp phát đỉnh (tracemalloc) và latency của bước nhận + decode +
+preprocess (read_predict_input), không tính forward của model.
+
+    python benchmarks/bench_upload.py
+"""
+import base64
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('WARMUP_ON_START', '0')
+import app as service  # noqa: E402
+
+RUNS = 10
+
+
+def phone_photo(width=4000, height=3000, quality=92, seed=0):
+    # Gradient + nhiễu để kích thước JPEG gần với ảnh chụp thật (vài MB)
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([xx / width * 255, yy / height * 255, (xx + yy) / (width + height) * 255], axis=-1)
+    noise = rng.normal(0, 18, size=(height, width, 3)).astype(np.float32)
+    pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+    out = io.BytesIO()
+    Image.fromarray(pixels).save(out, format='JPEG', quality=quality)
+    return out.getvalue()
+
+
+def request_variants(jpeg):
+    data_url = 'data:image/jpeg;base64,' + base64.b64encode(jpeg).decode('ascii')
+    return {
+        'json_base64': (json.dumps({'image': data_url}).encode('utf-8'), 'application/json'),
+        'binary': (jpeg, 'image/jpeg'),
+    }
+
+
+def measure(body, content_type):
+    def once():
+        with service.app.test_request_context('/predict', method='POST', data=body, content_type=content_type):
+            return service.read_predict_input()
+
+    once()  # warm-up (buffer của thread, import plugin PIL)
+    latencies = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        once()
+        latencies.append((time.perf_counter() - start) * 1000.0)
+
+    tracemalloc.start()
+    once()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(latencies), peak
+
+
+def main():
+    jpeg = phone_photo()
+    print(f"12MP JPEG: {len(jpeg) / 2**20:.2f} MiB")
+    print(f"{'path':<12} {'request MiB':>12} {'peak alloc MiB':>15} {'median ms':>10}")
+    results = {}
+    for name, (body, content_type) in request_variants(jpeg).items():
+        ms, peak = measure(body, content_type)
+        results[name] = ms
+        print(f"{name:<12} {len(body) / 2**20:>12.2f} {peak / 2**20:>15.2f} {ms:>10.1f}")
+
+    a = service.app.test_request_context('/predict', method='POST', data=jpeg, content_type='image/jpeg')
+    b = service.app.test_request_context('/predict', method='POST',
+                                         data=request_variants(jpeg)['json_base64'][0], content_type='application/json')
+    with a:
+        t_bin = service.read_predict_input()
+    with b:
+        t_json = service.read_predict_input()
+    assert (t_bin - t_json).abs().max().item() == 0.0, "binary and base64 paths must produce the same tensor"
+
+
+if __name__ == '__main__':
+    main()
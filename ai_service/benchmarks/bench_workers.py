@@ -0,0 +1,116 @@
+"""
+Đo requests/sec của serve.py khi tăng số worker process từ 1 tới N (mặc định số core) trên /predict
+(ảnh nhị phân) và /recommend. Server được chạy lại cho mỗi số worker; cache kết quả và lớp ảnh gần trùng
+bị tắt để mọi request /predict đều decode + forward.
+
+    python benchmarks/bench_workers.py --workers 1,2,4 --duration 15 --clients 16
+"""
+import argparse
+import http.client
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RECOMMEND_BODY = json.dumps({
+    'userProfile': {'age': 30, 'weight': 60, 'height': 165, 'gender': 'male', 'activityLevel': 'moderate'},
+    'eatenToday': {'calories': 600, 'protein': 20, 'fat': 15, 'carbs': 90},
+}).encode('utf-8')
+
+
+def phone_photo(width=1600, height=1200, seed=0):
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 255, size=(height // 8, width // 8, 3), dtype=np.uint8)
+    out = io.BytesIO()
+    Image.fromarray(pixels).resize((width, height), Image.BICUBIC).save(out, format='JPEG', quality=90)
+    return out.getvalue()
+
+
+def wait_ready(port, timeout=300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/ready')
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(1)
+    return False
+
+
+def client(args):
+    port, endpoint, duration, seed = args
+    if endpoint == '/predict':
+        body, headers = phone_photo(seed=seed), {'Content-Type': 'image/jpeg'}
+    else:
+        body, headers = RECOMMEND_BODY, {'Content-Type': 'application/json'}
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    latencies, errors = [], 0
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        conn.request('POST', endpoint, body=body, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        if response.status != 200:
+            errors += 1
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    conn.close()
+    return latencies, errors
+
+
+def run_load(port, endpoint, clients, duration):
+    with ProcessPoolExecutor(max_workers=clients) as pool:
+        results = list(pool.map(client, [(port, endpoint, duration, i) for i in range(clients)]))
+    latencies = sorted(x for lat, _ in results for x in lat)
+    errors = sum(e for _, e in results)
+    return {
+        'rps': len(latencies) / duration,
+        'p50_ms': statistics.median(latencies) if latencies else 0.0,
+        'p99_ms': latencies[int(0.99 * (len(latencies) - 1))] if latencies else 0.0,
+        'errors': errors,
+    }
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', default=','.join(str(n) for n in sorted({1, 2, 4, cpus}) if n <= cpus))
+    parser.add_argument('--clients', type=int, default=max(4, 2 * cpus))
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--port', type=int, default=5099)
+    args = parser.parse_args()
+
+    env = dict(os.environ, PREDICTION_CACHE_MAX_BYTES='0', PREDICTION_CACHE_DB='', NEAR_DUP_RADIUS='-1')
+    print(f"{'workers':>7} {'endpoint':<10} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    for workers in [int(x) for x in args.workers.split(',')]:
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, 'serve.py'), '--workers', str(workers), '--port', str(args.port)],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            if not wait_ready(args.port):
+                print(f"server with {workers} workers did not become ready")
+                continue
+            for endpoint in ('/predict', '/recommend'):
+                run_load(args.port, endpoint, args.clients, min(2.0, args.duration))  # warm-up
+                r = run_load(args.port, endpoint, args.clients, args.duration)
+                print(f"{workers:>7} {endpoint:<10} {r['rps']:>8.1f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['errors']:>6}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
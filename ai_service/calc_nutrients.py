@@ -1,8 +1,117 @@
 from typing import Literal
+import bisect
+import time
 import pandas as pd
 import numpy as np
 
+from macro_index import MacroIndex, score_block
+from meal_plan import plan_meals
+from menu_store import MenuStore
+
 # --- 1. CLASS TÍNH TOÁN NHU CẦU DINH DƯỠNG ---
+# Data derived from uploaded CSVs (Reference data)
+REFERENCE_DATA = {
+    'Protein': {'Male': [1.86, 2.22, 2.22, 1.63, 1.55, 1.43, 1.43, 1.43, 1.37, 1.25, 1.13, 1.13, 1.13, 1.13], 'Female': [1.86, 2.22, 2.22, 1.63, 1.55, 1.43, 1.43, 1.39, 1.3, 1.17, 1.13, 1.13, 1.13, 1.13]},
+    'Lipid': {'Male': [(24.0, 37.0), (22.0, 29.0), (23.0, 31.0), (33.0, 44.0), (36.0, 51.0), (35.0, 52.0), (40.0, 61.0), (48.0, 72.0), (56.0, 83.0), (63.0, 94.0), (57.0, 71.0), (52.0, 65.0), (52.0, 65.0), (49.0, 61.0)], 'Female': [(22.0, 33.0), (20.0, 27.0), (22.0, 29.0), (31.0, 41.0), (34.0, 48.0), (32.0, 49.0), (38.0, 58.0), (44.0, 66.0), (51.0, 77.0), (53.0, 79.0), (46.0, 57.0), (45.0, 56.0), (44.0, 55.0), (40.0, 51.0)]},
+    'MUFA_PUFA': {'Male': [0.0, 10.8, 11.7, 16.7, 15.9, 19.2, 22.2, 26.3, 30.6, 34.5, 31.4, 28.7, 28.54, 26.8], 'Female': [0.0, 10.0, 10.8, 15.34, 15.0, 17.8, 21.1, 24.2, 28.2, 29.1, 25.1, 24.6, 24.2, 22.2]},
+    'Glucid': {'Male': [(80.0, 90.0), (90.0, 100.0), (100.0, 110.0), (140.0, 150.0), (190.0, 200.0), (210.0, 230.0), (250.0, 270.0), (290.0, 320.0), (300.0, 340.0), (400.0, 440.0), (370.0, 400.0), (330.0, 360.0), (320.0, 250.0), (300.0, 320.0)], 'Female': [(75.0, 80.0), (85.0, 95.0), (95.0, 105.0), (135.0, 145.0), (175.0, 190.0), (200.0, 220.0), (230.0, 250.0), (230.0, 260.0), (280.0, 300.0), (330.0, 370.0), (320.0, 360.0), (290.0, 320.0), (280.0, 310.0), (250.0, 280.0)]},
+    'Fiber': {'Male': [0, 0, 0, 19.0, (20.0, 21.0), (22.0, 23.0), (24.0, 26.0), (27.0, 28.0), (29.0, 31.0), 38.0, 38.0, 38.0, 30.0, 30.0], 'Female': [0, 0, 0, 19.0, (20.0, 21.0), (22.0, 23.0), (24.0, 25.0), 26.0, 26.0, 25.0, 25.0, 21.0, 21.0, 21.0]},
+    'Calcium': {'Male': [300.0, 400.0, 400.0, 500.0, 600.0, 650.0, 700.0, 1000.0, 1000.0, 1000.0, 800.0, 800.0, 800.0, 1000.0], 'Female': [300.0, 400.0, 400.0, 500.0, 600.0, 650.0, 700.0, 1000.0, 1000.0, 1000.0, 800.0, 800.0, 900.0, 1000.0]},
+    'Iron': {'Male': [0.93, 8.5, 9.4, 5.4, 5.5, 7.2, 8.9, 11.3, 15.3, 17.5, 11.9, 11.9, 11.9, 11.0], 'Female': [0.93, 7.9, 8.7, 5.1, 5.4, 7.1, 8.9, 10.5, 14.0, 29.7, 26.1, 26.1, 10.0, 9.4]},
+    'Zinc': {'Male': [2.8, 4.1, 4.1, 4.1, 4.8, 5.6, 6.0, 8.6, 9.0, 10.0, 10.0, 10.0, 10.0, 9.0], 'Female': [2.8, 4.1, 4.1, 4.1, 4.8, 5.6, 5.6, 7.2, 8.0, 8.0, 8.0, 8.0, 8.0, 7.0]},
+    'VitaminA': {'Male': [0, 0, 400.0, 500.0, 450.0, 500.0, 600.0, 800.0, 900.0, 850.0, 850.0, 900.0, 850.0, 800.0], 'Female': [0, 0, 350.0, 400.0, 500.0, 450.0, 500.0, 600.0, 800.0, 900.0, 850.0, 900.0, 850.0, 800.0]},
+    'VitaminC': {'Male': [0, 0, 0, 35.0, 40.0, 55.0, 60.0, 75.0, 95.0, 100.0, 100.0, 100.0, 100.0, 100.0], 'Female': [0, 0, 0, 35.0, 40.0, 55.0, 60.0, 75.0, 95.0, 100.0, 100.0, 100.0, 100.0, 100.0]},
+    'Magnesium': {'Male': [40.0, 50.0, 60.0, 70.0, 100.0, 130.0, 170.0, 210.0, 290.0, 350.0, 340.0, 370.0, 350.0, 320.0], 'Female': [40.0, 50.0, 60.0, 70.0, 100.0, 130.0, 160.0, 210.0, 280.0, 300.0, 270.0, 290.0, 290.0, 260.0]},
+    'Sodium': {'Male': [101.0, 601.0, 900.0, 1100.0, 1300.0, 1600.0, 1900.0, 2000.0, 2000.0, 2000.0, 2000.0, 2000.0, 2000.0, 2000.0], 'Female': [101.0, 601.0, 900.0, 1100.0, 1300.0, 1600.0, 1900.0, 2000.0, 2000.0, 2000.0, 2000.0, 2000.0, 2000.0, 2000.0]},
+    'Potassium': {'Male': [400.0, 700.0, 700.0, 900.0, 1100.0, 1300.0, 1600.0, 1900.0, 2400.0, 2800.0, 2500.0, 2500.0, 2500.0, 2500.0], 'Female': [400.0, 700.0, 700.0, 900.0, 1100.0, 1200.0, 1500.0, 1800.0, 2200.0, 2100.0, 2000.0, 2000.0, 2000.0, 2000.0]},
+    'Energy': {
+        'Male': {'Low': [0, 0, 0, 0, 0, 1360.0, 1600.0, 1880.0, 2200.0, 2500.0, 2200.0, 2010.0, 2000.0, 1870.0], 'Medium': [550.0, 650.0, 700.0, 1000.0, 1320.0, 1570.0, 1820.0, 2150.0, 2500.0, 2820.0, 2570.0, 2350.0, 2330.0, 2190.0], 'High': [0, 0, 0, 0, 0, 1770.0, 2050.0, 2400.0, 2790.0, 3140.0, 2940.0, 2680.0, 2660.0, 2520.0]},
+        'Female': {'Low': [0, 0, 0, 0, 0, 1270.0, 1510.0, 1740.0, 2040.0, 2110.0, 1760.0, 1730.0, 1700.0, 1500.0], 'Medium': [500.0, 600.0, 650.0, 930.0, 1230.0, 1460.0, 1730.0, 1980.0, 2310.0, 2380.0, 2050.0, 2010.0, 1980.0, 1820.0], 'High': [0, 0, 0, 0, 0, 1650.0, 1940.0, 2220.0, 2580.0, 2650.0, 2340.0, 2300.0, 2260.0, 2090.0]}
+    }
+}
+
+# Mốc tuổi (tháng) bắt đầu của nhóm tuổi 1..13; nhóm 0 là <= 5 tháng
+AGE_BAND_STARTS = [6, 9, 12, 36, 72, 96, 120, 144, 180, 240, 360, 600, 840]
+GENDERS = ['Male', 'Female']
+ACTIVITY_LEVELS = ['Low', 'Medium', 'High']
+# Thứ tự key của dict calc_nutrients() / cột của bảng NEEDS_TABLE
+NUTRIENT_KEYS = [
+    'Beta-carotene', 'Calcium', 'Carbohydrate', 'Energy', 'Fat', 'Fiber', 'Glucid', 'Iron', 'Lipid',
+    'MUFA+PUFA', 'Magnesium', 'Potassium', 'Protein', 'Sodium', 'Vitamin A', 'Vitamin C', 'Zinc'
+]
+_SIMPLE_KEYS = {
+    'Calcium': 'Calcium', 'Iron': 'Iron', 'Magnesium': 'Magnesium', 'Potassium': 'Potassium',
+    'Sodium': 'Sodium', 'Vitamin A': 'VitaminA', 'Vitamin C': 'VitaminC', 'Zinc': 'Zinc'
+}
+
+
+def _resolve_range(val):
+    if isinstance(val, tuple):
+        return (val[0] + val[1]) / 2
+    return val
+
+
+def _compile_needs_table():
+    """
+    Tính sẵn mọi giá trị không phụ thuộc cân nặng cho (nhóm tuổi, giới tính, mức vận động):
+    NEEDS_TABLE[band, gender, activity, key]. Protein (g/kg) để riêng trong PROTEIN_PER_KG.
+    """
+    n_bands = len(AGE_BAND_STARTS) + 1
+    table = np.zeros((n_bands, len(GENDERS), len(ACTIVITY_LEVELS), len(NUTRIENT_KEYS)), dtype=np.float64)
+    protein = np.zeros((n_bands, len(GENDERS)), dtype=np.float64)
+    col = {k: i for i, k in enumerate(NUTRIENT_KEYS)}
+
+    for band in range(n_bands):
+        for g, gender in enumerate(GENDERS):
+            def val(nutrient):
+                vals = REFERENCE_DATA[nutrient][gender]
+                return vals[min(band, len(vals) - 1)]
+
+            protein[band, g] = val('Protein')
+            energy_data = REFERENCE_DATA['Energy'][gender]
+            for a, act in enumerate(ACTIVITY_LEVELS):
+                energy_val = energy_data[act][band]
+                if energy_val == 0:
+                    energy_val = energy_data['Medium'][band]
+                lipid_g = (energy_val * _resolve_range(val('Lipid')) / 100) / 9
+                glucid_g = _resolve_range(val('Glucid'))
+
+                row = table[band, g, a]
+                row[col['Energy']] = energy_val
+                row[col['Fat']] = row[col['Lipid']] = lipid_g
+                row[col['Carbohydrate']] = row[col['Glucid']] = glucid_g
+                row[col['MUFA+PUFA']] = (energy_val * val('MUFA_PUFA') / 100) / 9
+                row[col['Fiber']] = _resolve_range(val('Fiber'))
+                for key, nutrient in _SIMPLE_KEYS.items():
+                    row[col[key]] = val(nutrient)
+    return table, protein
+
+
+NEEDS_TABLE, PROTEIN_PER_KG = _compile_needs_table()
+_PROTEIN_COL = NUTRIENT_KEYS.index('Protein')
+
+
+def age_band(age_months) -> int:
+    return bisect.bisect_right(AGE_BAND_STARTS, age_months)
+
+
+def calc_nutrients_batch(ages_months, genders, weights, activity_levels=None):
+    """
+    Bản vector hoá của HealthInfo.calc_nutrients cho nhiều người.
+    `genders` / `activity_levels` là chuỗi ('Male'/'Female', 'Low'/'Medium'/'High'); giá trị lạ về Male / Medium.
+    Trả về mảng [n, len(NUTRIENT_KEYS)] theo thứ tự NUTRIENT_KEYS.
+    """
+    bands = np.searchsorted(AGE_BAND_STARTS, np.asarray(ages_months, dtype=np.float64), side='right')
+    g = np.array([1 if x == 'Female' else 0 for x in genders], dtype=np.intp)
+    if activity_levels is None:
+        a = np.ones(len(g), dtype=np.intp)
+    else:
+        a = np.array([ACTIVITY_LEVELS.index(x) if x in ACTIVITY_LEVELS else 1 for x in activity_levels], dtype=np.intp)
+    needs = NEEDS_TABLE[bands, g, a].copy()
+    needs[:, _PROTEIN_COL] = PROTEIN_PER_KG[bands, g] * np.asarray(weights, dtype=np.float64)
+    return needs
+
+
 class HealthInfo:
     def __init__(self, age_months: int, gender: Literal['Male', 'Female'], weight: float, height: int, activity_level: Literal['Low', 'Medium', 'High']):
         self.age = age_months
@@ -15,43 +124,10 @@ class HealthInfo:
         self.weight = weight
         self.height = height
         self.activity_level = activity_level
-
-        # Data derived from uploaded CSVs (Reference data)
-        self.data = {
-            'Protein': {'Male': [1.86, 2.22, 2.22, 1.63, 1.55, 1.43, 1.43, 1.43, 1.37, 1.25, 1.13, 1.13, 1.13, 1.13], 'Female': [1.86, 2.22, 2.22, 1.63, 1.55, 1.43, 1.43, 1.39, 1.3, 1.17, 1.13, 1.13, 1.13, 1.13]},
-            'Lipid': {'Male': [(24.0, 37.0), (22.0, 29.0), (23.0, 31.0), (33.0, 44.0), (36.0, 51.0), (35.0, 52.0), (40.0, 61.0), (48.0, 72.0), (56.0, 83.0), (63.0, 94.0), (57.0, 71.0), (52.0, 65.0), (52.0, 65.0), (49.0, 61.0)], 'Female': [(22.0, 33.0), (20.0, 27.0), (22.0, 29.0), (31.0, 41.0), (34.0, 48.0), (32.0, 49.0), (38.0, 58.0), (44.0, 66.0), (51.0, 77.0), (53.0, 79.0), (46.0, 57.0), (45.0, 56.0), (44.0, 55.0), (40.0, 51.0)]},
-            'MUFA_PUFA': {'Male': [0.0, 10.8, 11.7, 16.7, 15.9, 19.2, 22.2, 26.3, 30.6, 34.5, 31.4, 28.7, 28.54, 26.8], 'Female': [0.0, 10.0, 10.8, 15.34, 15.0, 17.8, 21.1, 24.2, 28.2, 29.1, 25.1, 24.6, 24.2, 22.2]},
-            'Glucid': {'Male': [(80.0, 90.0), (90.0, 100.0), (100.0, 110.0), (140.0, 150.0), (190.0, 200.0), (210.0, 230.0), (250.0, 270.0), (290.0, 320.0), (300.0, 340.0), (400.0, 440.0), (370.0, 400.0), (330.0, 360.0), (320.0, 250.0), (300.0, 320.0)], 'Female': [(75.0, 80.0), (85.0, 95.0), (95.0, 105.0), (135.0, 145.0), (175.0, 190.0), (200.0, 220.0), (230.0, 250.0), (230.0, 260.0), (280.0, 300.0), (330.0, 370.0), (320.0, 360.0), (290.0, 320.0), (280.0, 310.0), (250.0, 280.0)]},
-            'Fiber': {'Male': [0, 0, 0, 19.0, (20.0, 21.0), (22.0, 23.0), (24.0, 26.0), (27.0, 28.0), (29.0, 31.0), 38.0, 38.0, 38.0, 30.0, 30.0], 'Female': [0, 0, 0, 19.0, (20.0, 21.0), (22.0, 23.0), (24.0, 25.0), 26.0, 26.0, 25.0, 25.0, 21.0, 21.0, 21.0]},
-            'Calcium': {'Male': [300.0, 400.0, 400.0, 500.0, 600.0, 650.0, 700.0, 1000.0, 1000.0, 1000.0, 800.0, 800.0, 800.0, 1000.0], 'Female': [300.0, 400.0, 400.0, 500.0, 600.0, 650.0, 700.0, 1000.0, 1000.0, 1000.0, 800.0, 800.0, 900.0, 1000.0]},
-            'Iron': {'Male': [0.93, 8.5, 9.4, 5.4, 5.5, 7.2, 8.9, 11.3, 15.3, 17.5, 11.9, 11.9, 11.9, 11.0], 'Female': [0.93, 7.9, 8.7, 5.1, 5.4, 7.1, 8.9, 10.5, 14.0, 29.7, 26.1, 26.1, 10.0, 9.4]},
-            'Zinc': {'Male': [2.8, 4.1, 4.1, 4.1, 4.8, 5.6, 6.0, 8.6, 9.0, 10.0, 10.0, 10.0, 10.0, 9.0], 'Female': [2.8, 4.1, 4.1, 4.1, 4.8, 5.6, 5.6, 7.2, 8.0, 8.0, 8.0, 8.0, 8.0, 7.0]},
-            'VitaminA': {'Male': [0, 0, 400.0, 500.0, 450.0, 500.0, 600.0, 800.0, 900.0, 850.0, 850.0, 900.0, 850.0, 800.0], 'Female': [0, 0, 350.0, 400.0, 500.0, 450.0, 500.0, 600.0, 800.0, 900.0, 850.0, 900.0, 850.0, 800.0]},
-            'VitaminC': {'Male': [0, 0, 0, 35.0, 40.0, 55.0, 60.0, 75.0, 95.0, 100.0, 100.0, 100.0, 100.0, 100.0], 'Female': [0, 0, 0, 35.0, 40.0, 55.0, 60.0, 75.0, 95.0, 100.0, 100.0, 100.0, 100.0, 100.0]},
-            'Magnesium': {'Male': [40.0, 50.0, 60.0, 70.0, 100.0, 130.0, 170.0, 210.0, 290.0, 350.0, 340.0, 370.0, 350.0, 320.0], 'Female': [40.0, 50.0, 60.0, 70.0, 100.0, 130.0, 160.0, 210.0, 280.0, 300.0, 270.0, 290.0, 290.0, 260.0]},
-            'Sodium': {'Male': [101.0, 601.0, 900.0, 1100.0, 1300.0, 1600.0, 1900.0, 2000.0, 2000.0, 2000.0, 2000.0, 2000.0, 2000.0, 2000.0], 'Female': [101.0, 601.0, 900.0, 1100.0, 1300.0, 1600.0, 1900.0, 2000.0, 2000.0, 2000.0, 2000.0, 2000.0, 2000.0, 2000.0]},
-            'Potassium': {'Male': [400.0, 700.0, 700.0, 900.0, 1100.0, 1300.0, 1600.0, 1900.0, 2400.0, 2800.0, 2500.0, 2500.0, 2500.0, 2500.0], 'Female': [400.0, 700.0, 700.0, 900.0, 1100.0, 1200.0, 1500.0, 1800.0, 2200.0, 2100.0, 2000.0, 2000.0, 2000.0, 2000.0]},
-            'Energy': {
-                'Male': {'Low': [0, 0, 0, 0, 0, 1360.0, 1600.0, 1880.0, 2200.0, 2500.0, 2200.0, 2010.0, 2000.0, 1870.0], 'Medium': [550.0, 650.0, 700.0, 1000.0, 1320.0, 1570.0, 1820.0, 2150.0, 2500.0, 2820.0, 2570.0, 2350.0, 2330.0, 2190.0], 'High': [0, 0, 0, 0, 0, 1770.0, 2050.0, 2400.0, 2790.0, 3140.0, 2940.0, 2680.0, 2660.0, 2520.0]},
-                'Female': {'Low': [0, 0, 0, 0, 0, 1270.0, 1510.0, 1740.0, 2040.0, 2110.0, 1760.0, 1730.0, 1700.0, 1500.0], 'Medium': [500.0, 600.0, 650.0, 930.0, 1230.0, 1460.0, 1730.0, 1980.0, 2310.0, 2380.0, 2050.0, 2010.0, 1980.0, 1820.0], 'High': [0, 0, 0, 0, 0, 1650.0, 1940.0, 2220.0, 2580.0, 2650.0, 2340.0, 2300.0, 2260.0, 2090.0]}
-            }
-        }
+        self.data = REFERENCE_DATA
 
     def _get_age_index(self) -> int:
-        if self.age <= 5: return 0
-        elif 6 <= self.age <= 8: return 1
-        elif 9 <= self.age < 12: return 2
-        elif 12 <= self.age < 36: return 3
-        elif 36 <= self.age < 72: return 4
-        elif 72 <= self.age < 96: return 5
-        elif 96 <= self.age < 120: return 6
-        elif 120 <= self.age < 144: return 7
-        elif 144 <= self.age < 180: return 8
-        elif 180 <= self.age < 240: return 9
-        elif 240 <= self.age < 360: return 10
-        elif 360 <= self.age < 600: return 11
-        elif 600 <= self.age < 840: return 12
-        return 13
+        return age_band(self.age)
             
     def _get_val(self, nutrient: str):
         vals = self.data[nutrient][self.gender]
@@ -60,73 +136,61 @@ class HealthInfo:
         return vals[idx]
 
     def _resolve_range(self, val):
-        if isinstance(val, tuple):
-            return (val[0] + val[1]) / 2
-        return val
+        return _resolve_range(val)
 
     def calc_nutrients(self):
-        idx = self._get_age_index()
-        energy_data = self.data['Energy'][self.gender]
-        
-        act = self.activity_level
-        if act not in energy_data:
-            act = 'Medium'
-            
-        energy_val = energy_data[act][idx]
-        if energy_val == 0:
-            energy_val = energy_data['Medium'][idx]
-        
-        protein_per_kg = self._get_val('Protein')
-        protein_g = protein_per_kg * self.weight
-        
-        lipid_pct = self._resolve_range(self._get_val('Lipid'))
-        lipid_g = (energy_val * lipid_pct / 100) / 9
-        
-        mufa_pct = self._get_val('MUFA_PUFA')
-        mufa_g = (energy_val * mufa_pct / 100) / 9
-        
-        glucid_g = self._resolve_range(self._get_val('Glucid'))
-        fiber_g = self._resolve_range(self._get_val('Fiber'))
-
-        res = {
-            'Beta-carotene': 0,
-            'Calcium': self._get_val('Calcium'),
-            'Carbohydrate': glucid_g,
-            'Energy': energy_val,
-            'Fat': lipid_g,
-            'Fiber': fiber_g,
-            'Glucid': glucid_g,
-            'Iron': self._get_val('Iron'),
-            'Lipid': lipid_g,
-            'MUFA+PUFA': mufa_g,
-            'Magnesium': self._get_val('Magnesium'),
-            'Potassium': self._get_val('Potassium'),
-            'Protein': protein_g,
-            'Sodium': self._get_val('Sodium'),
-            'Vitamin A': self._get_val('VitaminA'),
-            'Vitamin C': self._get_val('VitaminC'),
-            'Zinc': self._get_val('Zinc')
-        }
+        band = self._get_age_index()
+        g = GENDERS.index(self.gender)
+        act = self.activity_level if self.activity_level in ACTIVITY_LEVELS else 'Medium'
+        res = dict(zip(NUTRIENT_KEYS, NEEDS_TABLE[band, g, ACTIVITY_LEVELS.index(act)].tolist()))
+        # Chỉ Protein phụ thuộc cân nặng
+        res['Protein'] = PROTEIN_PER_KG[band, g] * self.weight
         return res
 
 
 # --- 2. CLASS GỢI Ý MÓN ĂN ---
+MATCH_FEATURES = ['Energy', 'Protein', 'Fat', 'Carbohydrate']
+# Giới hạn bộ nhớ tạm cho ma trận điểm (users x dishes) của get_recommendations_batch
+DEFAULT_BATCH_CHUNK_BYTES = 64 * 1024 * 1024
+# Từ số món này trở lên thì dựng MacroIndex (menu nhỏ hơn thì chấm điểm toàn bộ nhanh hơn)
+MACRO_INDEX_MIN_DISHES = 50_000
+# Thực đơn cả ngày: số món ứng viên (lọc trước theo mục tiêu từng bữa), độ rộng beam, thời gian tối đa
+PLAN_POOL_SIZE = 200
+PLAN_BEAM_WIDTH = 64
+PLAN_TIME_BUDGET_MS = 50
+MEAL_NAMES = ['Bữa sáng', 'Bữa trưa', 'Bữa tối']
+
 class NutritionRecommender:
-    def __init__(self, food_data_list):
-        self.df = pd.DataFrame(food_data_list)
-        
-        # --- FIX TRÙNG LẶP: Xóa các món có tên giống nhau ---
-        if not self.df.empty and 'name' in self.df.columns:
-            # Xóa khoảng trắng thừa ở tên
-            self.df['name'] = self.df['name'].astype(str).str.strip()
-            # Drop duplicates, giữ lại món đầu tiên
-            self.df = self.df.drop_duplicates(subset=['name'], keep='first')
-        
-        # Ép kiểu số an toàn
-        numeric_cols = ['Energy', 'Protein', 'Fat', 'Carbohydrate', 'Fiber']
-        for col in numeric_cols:
-            if col in self.df.columns:
-                self.df[col] = pd.to_numeric(self.df[col], errors='coerce').fillna(0)
+    def __init__(self, menu, index_min_dishes=MACRO_INDEX_MIN_DISHES):
+        # `menu`: MenuStore dùng chung với app (hoặc list dict như food_data.json)
+        self.menu = menu if isinstance(menu, MenuStore) else MenuStore(menu)
+
+        # --- FIX TRÙNG LẶP: các món trùng tên (đã strip) chỉ giữ món đầu tiên ---
+        _, first = np.unique(self.menu.names.codes, return_index=True)
+        if len(first) < len(self.menu):
+            self.rows = np.sort(first)
+            self.macros = np.ascontiguousarray(self.menu.macros[:, self.rows])
+        else:
+            # Không có món trùng: dùng thẳng view của MenuStore, không copy
+            self.rows = None
+            self.macros = self.menu.macros
+        self.size = self.macros.shape[1]
+        # Menu lớn: KD-tree trên macro để top_indices không phải chấm điểm toàn bộ menu
+        self.index = MacroIndex(self.macros) if index_min_dishes and self.size >= index_min_dishes else None
+
+    @classmethod
+    def from_parts(cls, menu, rows, index=None):
+        """Recommender dựng sẵn (từ snapshot menu): `rows` là các dòng giữ lại sau khi bỏ món trùng tên hoặc None."""
+        rec = cls.__new__(cls)
+        rec.menu, rec.rows = menu, rows
+        rec.macros = menu.macros if rows is None else np.ascontiguousarray(menu.macros[:, rows])
+        rec.size = rec.macros.shape[1]
+        rec.index = index
+        return rec
+
+    def record(self, i):
+        """Dict của món thứ i (theo chỉ số của self.macros), dựng từ MenuStore."""
+        return self.menu.record(int(i if self.rows is None else self.rows[i]))
 
     def calculate_match_score(self, row, target, weights):
         score = 0
@@ -139,24 +203,71 @@ class NutritionRecommender:
             score += error * weights.get(feature, 1.0)
         return score
 
-    def recommend(self, target_nutrition, top_n=5, weights=None):
-        if self.df.empty: return []
+    def query_params(self, target_nutrition, weights):
+        """(t, coef) float32 [4] sao cho điểm = sum_f coef_f * |val_f - t_f| (t <= 0 coi như 1)."""
+        t = np.array([target_nutrition.get(f, 0) for f in MATCH_FEATURES], dtype=np.float64)
+        t[t <= 0] = 1
+        w = np.array([weights.get(f, 1.0) for f in MATCH_FEATURES], dtype=np.float64)
+        return t.astype(np.float32), (w / t).astype(np.float32)
+
+    def score_all(self, target_nutrition, weights):
+        # Vector hoá calculate_match_score: sum_f w_f * |val_f - t_f| / t_f trên toàn bộ menu
+        # (cộng dồn từng cột vào buffer để không tạo mảng tạm [n, 4])
+        t, coef = self.query_params(target_nutrition, weights)
+        return score_block(self.macros, t, coef)
+
+    def energy_window(self, target_nutrition):
+        """Khoảng năng lượng (float32) món được phép: ±70% target khi target > 100 kcal, ngược lại None."""
+        energy = target_nutrition.get('Energy', 0)
+        if energy > 100:
+            return np.float32(energy * 0.3), np.float32(energy * 1.7)
+        return None
+
+    def energy_mask(self, target_nutrition):
+        window = self.energy_window(target_nutrition)
+        if window is not None:
+            col = self.macros[0]
+            return (col >= window[0]) & (col <= window[1])
+        return None
+
+    def top_indices(self, target_nutrition, top_n=5, weights=None):
+        """Trả về (chỉ số dòng, match_score) của top_n món, đã sắp xếp tăng dần theo điểm."""
         if weights is None:
             weights = {'Energy': 2.0, 'Protein': 1.0, 'Fat': 1.0, 'Carbohydrate': 1.0}
-            
-        work_df = self.df.copy()
-        work_df['match_score'] = work_df.apply(
-            lambda row: self.calculate_match_score(row, target_nutrition, weights), axis=1
-        )
-        
-        if target_nutrition.get('Energy', 0) > 100:
-            lower = target_nutrition['Energy'] * 0.3
-            upper = target_nutrition['Energy'] * 1.7
-            work_df = work_df[
-                (work_df['Energy'] >= lower) & (work_df['Energy'] <= upper)
-            ]
-            
-        results = work_df.sort_values('match_score').head(top_n)
+
+        if self.index is not None:
+            t, coef = self.query_params(target_nutrition, weights)
+            idx, scores, _ = self.index.query(t, coef, top_n, self.energy_window(target_nutrition))
+            return idx, scores
+
+        scores = self.score_all(target_nutrition, weights)
+        mask = self.energy_mask(target_nutrition)
+        candidates = np.flatnonzero(mask) if mask is not None else np.arange(len(scores))
+
+        cand_scores = scores[candidates]
+        if len(candidates) > top_n:
+            part = np.argpartition(cand_scores, top_n)[:top_n]
+            candidates, cand_scores = candidates[part], cand_scores[part]
+        # Đồng điểm thì giữ thứ tự trong menu
+        order = np.lexsort((candidates, cand_scores))
+        return candidates[order], cand_scores[order]
+
+    def recommend(self, target_nutrition, top_n=5, weights=None):
+        if self.size == 0: return []
+        idx, scores = self.top_indices(target_nutrition, top_n, weights)
+        results = pd.DataFrame([self.record(i) for i in idx])
+        results['match_score'] = scores
+        return results
+
+    def recommend_records(self, target_nutrition, top_n=5, weights=None):
+        # Như recommend() nhưng chỉ dựng dict cho top_n dòng, không qua DataFrame
+        if self.size == 0: return []
+        idx, scores = self.top_indices(target_nutrition, top_n, weights)
+        results = []
+        for i, score in zip(idx, scores):
+            item = self.record(i)
+            item['match_score'] = float(score)
+            results.append(item)
         return results
 
     # Helper ép kiểu an toàn
@@ -172,100 +283,301 @@ class NutritionRecommender:
             return int(float(value)) 
         except ValueError: return default
 
-    def get_recommendations(self, user_profile, eaten_today=None):
-        try:
-            # 1. Lấy thông tin & Validate
-            weight = self.safe_float(user_profile.get('weight'), 60.0)
-            height = self.safe_float(user_profile.get('height'), 170.0)
-            age_years = self.safe_int(user_profile.get('age'), 25)
-            age_months = age_years * 12 
-            
-            # Fix lỗi 'Prefer not to say' -> Default về Male
-            raw_gender = user_profile.get('gender', 'Male')
-            gender = raw_gender if raw_gender in ['Male', 'Female'] else 'Male'
-            
-            act_map = {
-                'Sedentary': 'Low', 'Light': 'Low', 
-                'Moderate': 'Medium', 'Active': 'High', 'Very Active': 'High',
-                'Low': 'Low', 'Medium': 'Medium', 'High': 'High'
+    def format_results(self, recommendations, target):
+        def get_reason(item):
+            diff = item['Energy'] - target['Energy']
+            if abs(diff) < 150: return "Lượng calo phù hợp"
+            if diff < 0: return "Món nhẹ bụng"
+            return "Giàu năng lượng"
+
+        # --- QUAN TRỌNG: MAP TÊN KEY CHO FRONTEND ---
+        for item in recommendations:
+            item['reason'] = get_reason(item)
+            item['calories'] = item.get('Energy', 0)
+            item['carbs'] = item.get('Carbohydrate', 0)
+            item['protein'] = item.get('Protein', 0)
+            item['fat'] = item.get('Fat', 0)
+            item['fiber'] = item.get('Fiber', 0)
+        return recommendations
+
+    ACTIVITY_MAP = {
+        'Sedentary': 'Low', 'Light': 'Low', 
+        'Moderate': 'Medium', 'Active': 'High', 'Very Active': 'High',
+        'Low': 'Low', 'Medium': 'Medium', 'High': 'High'
+    }
+    MEAL_WEIGHTS = {'Energy': 3.0, 'Protein': 1.5, 'Fat': 0.5, 'Carbohydrate': 0.5}
+
+    def parse_profile(self, user_profile):
+        # 1. Lấy thông tin & Validate
+        weight = self.safe_float(user_profile.get('weight'), 60.0)
+        height = self.safe_float(user_profile.get('height'), 170.0)
+        age_years = self.safe_int(user_profile.get('age'), 25)
+        age_months = age_years * 12 
+        
+        # Fix lỗi 'Prefer not to say' -> Default về Male
+        raw_gender = user_profile.get('gender', 'Male')
+        gender = raw_gender if raw_gender in ['Male', 'Female'] else 'Male'
+        
+        activity_input = user_profile.get('activityLevel', 'Medium')
+        activity_level = self.ACTIVITY_MAP.get(activity_input, 'Medium')
+        return age_months, gender, weight, height, activity_level
+
+    def meal_target(self, daily_needs, eaten_today=None, verbose=True):
+        """Mục tiêu cho bữa kế tiếp; None nếu hôm nay đã ăn đủ năng lượng."""
+        eaten_energy = 0
+        if eaten_today:
+            eaten_energy = self.safe_float(eaten_today.get('calories') or eaten_today.get('Energy'))
+        
+        if not eaten_today or eaten_energy == 0:
+            if verbose: print("🍽️ User chưa ăn -> Gợi ý bữa chuẩn.")
+            meal_ratio = 0.35 
+            return {
+                'Energy': daily_needs['Energy'] * meal_ratio,
+                'Protein': daily_needs['Protein'] * meal_ratio,
+                'Fat': daily_needs['Lipid'] * meal_ratio,
+                'Carbohydrate': daily_needs['Glucid'] * meal_ratio
             }
-            activity_input = user_profile.get('activityLevel', 'Medium')
-            activity_level = act_map.get(activity_input, 'Medium')
 
-            health_calc = HealthInfo(age_months, gender, weight, height, activity_level)
+        if verbose: print("🍽️ User đã ăn -> Tính bù trừ.")
+        eaten_protein = self.safe_float(eaten_today.get('protein') or eaten_today.get('Protein'))
+        eaten_fat = self.safe_float(eaten_today.get('fat') or eaten_today.get('Fat'))
+        eaten_carbs = self.safe_float(eaten_today.get('carbs') or eaten_today.get('Carbohydrate'))
+
+        remaining_energy = daily_needs['Energy'] - eaten_energy
+        if remaining_energy < 200:
+            return None
+
+        ratio = 0.4 if remaining_energy > 800 else 1.0
+        return {
+            'Energy': remaining_energy * ratio,
+            'Protein': max(0, (daily_needs['Protein'] - eaten_protein) * ratio),
+            'Fat': max(0, (daily_needs['Lipid'] - eaten_fat) * ratio),
+            'Carbohydrate': max(0, (daily_needs['Glucid'] - eaten_carbs) * ratio)
+        }
+
+    def full_day_result(self):
+        return [{
+            'name': 'Đã đủ năng lượng',
+            'Energy': 0, 'Protein': 0, 'Fat': 0, 'Carbohydrate': 0,
+            'calories': 0, 'protein': 0, 'fat': 0, 'carbs': 0, # Map cho frontend
+            'image': 'https://cdn-icons-png.flaticon.com/512/2738/2738805.png',
+            'reason': 'Hôm nay bạn đã ăn đủ rồi!',
+            'match_score': 0
+        }]
+
+    def get_recommendations(self, user_profile, eaten_today=None):
+        try:
+            health_calc = HealthInfo(*self.parse_profile(user_profile))
             daily_needs = health_calc.calc_nutrients()
             
             # 2. XÁC ĐỊNH MỤC TIÊU
-            target = {}
-            eaten_energy = 0
-            if eaten_today:
-                eaten_energy = self.safe_float(eaten_today.get('calories') or eaten_today.get('Energy'))
-            
-            if not eaten_today or eaten_energy == 0:
-                print("🍽️ User chưa ăn -> Gợi ý bữa chuẩn.")
-                meal_ratio = 0.35 
-                target = {
-                    'Energy': daily_needs['Energy'] * meal_ratio,
-                    'Protein': daily_needs['Protein'] * meal_ratio,
-                    'Fat': daily_needs['Lipid'] * meal_ratio,
-                    'Carbohydrate': daily_needs['Glucid'] * meal_ratio
-                }
-            else:
-                print("🍽️ User đã ăn -> Tính bù trừ.")
-                eaten_protein = self.safe_float(eaten_today.get('protein') or eaten_today.get('Protein'))
-                eaten_fat = self.safe_float(eaten_today.get('fat') or eaten_today.get('Fat'))
-                eaten_carbs = self.safe_float(eaten_today.get('carbs') or eaten_today.get('Carbohydrate'))
-
-                remaining_energy = daily_needs['Energy'] - eaten_energy
-
-                if remaining_energy < 200:
-                    return [{
-                        'name': 'Đã đủ năng lượng',
-                        'Energy': 0, 'Protein': 0, 'Fat': 0, 'Carbohydrate': 0,
-                        'calories': 0, 'protein': 0, 'fat': 0, 'carbs': 0, # Map cho frontend
-                        'image': 'https://cdn-icons-png.flaticon.com/512/2738/2738805.png',
-                        'reason': 'Hôm nay bạn đã ăn đủ rồi!',
-                        'match_score': 0
-                    }]
-
-                ratio = 0.4 if remaining_energy > 800 else 1.0
-                
-                target = {
-                    'Energy': remaining_energy * ratio,
-                    'Protein': max(0, (daily_needs['Protein'] - eaten_protein) * ratio),
-                    'Fat': max(0, (daily_needs['Lipid'] - eaten_fat) * ratio),
-                    'Carbohydrate': max(0, (daily_needs['Glucid'] - eaten_carbs) * ratio)
-                }
+            target = self.meal_target(daily_needs, eaten_today)
+            if target is None:
+                return self.full_day_result()
 
             print(f"🎯 Target: {target['Energy']:.0f} kcal")
             
-            weights = {'Energy': 3.0, 'Protein': 1.5, 'Fat': 0.5, 'Carbohydrate': 0.5}
-            recommendations = self.recommend(target, top_n=5, weights=weights)
-            
-            def get_reason(row):
-                diff = row['Energy'] - target['Energy']
-                if abs(diff) < 150: return "Lượng calo phù hợp"
-                if diff < 0: return "Món nhẹ bụng"
-                return "Giàu năng lượng"
-
-            if not recommendations.empty:
-                recommendations['reason'] = recommendations.apply(get_reason, axis=1)
-                
-                # --- QUAN TRỌNG: MAP TÊN KEY CHO FRONTEND ---
-                final_results = recommendations.to_dict('records')
-                for item in final_results:
-                    item['calories'] = item.get('Energy', 0)
-                    item['carbs'] = item.get('Carbohydrate', 0)
-                    item['protein'] = item.get('Protein', 0)
-                    item['fat'] = item.get('Fat', 0)
-                    item['fiber'] = item.get('Fiber', 0)
-                
-                return final_results
-            else:
-                return []
+            recommendations = self.recommend_records(target, top_n=5, weights=self.MEAL_WEIGHTS)
+            return self.format_results(recommendations, target)
 
         except Exception as e:
             print(f"❌ Lỗi tính toán dinh dưỡng: {e}")
             import traceback
             traceback.print_exc()
-            return []
\ No newline at end of file
+            return []
+
+    def daily_remaining(self, daily_needs, eaten_today=None):
+        """Macro còn thiếu của cả ngày; None nếu năng lượng còn lại < 200 kcal."""
+        eaten_today = eaten_today or {}
+        eaten = {
+            'Energy': self.safe_float(eaten_today.get('calories') or eaten_today.get('Energy')),
+            'Protein': self.safe_float(eaten_today.get('protein') or eaten_today.get('Protein')),
+            'Fat': self.safe_float(eaten_today.get('fat') or eaten_today.get('Fat')),
+            'Carbohydrate': self.safe_float(eaten_today.get('carbs') or eaten_today.get('Carbohydrate')),
+        }
+        needs = {'Energy': daily_needs['Energy'], 'Protein': daily_needs['Protein'],
+                 'Fat': daily_needs['Lipid'], 'Carbohydrate': daily_needs['Glucid']}
+        remaining = {f: float(max(0, needs[f] - eaten[f])) for f in MATCH_FEATURES}
+        if remaining['Energy'] < 200:
+            return None
+        return remaining
+
+    def plan_meals(self, target, meals=3, pool_size=PLAN_POOL_SIZE, beam_width=PLAN_BEAM_WIDTH,
+                   time_budget_ms=PLAN_TIME_BUDGET_MS, weights=None):
+        """
+        Chọn `meals` món có tổng macro gần `target` nhất (cùng công thức điểm với top_indices, áp lên tổng).
+        Ứng viên là top `pool_size` món theo mục tiêu một bữa (target / meals), rồi beam search trên pool.
+        Trả về (chỉ số dòng, điểm, complete) hoặc None; complete = False khi hết `time_budget_ms`
+        trước khi beam search xong (trả thực đơn tốt nhất đã tìm được). `time_budget_ms` None = không giới hạn,
+        0 = chỉ thực đơn tham lam.
+        """
+        if weights is None:
+            weights = self.MEAL_WEIGHTS
+        per_meal = {f: v / meals for f, v in target.items()}
+        idx, _ = self.top_indices(per_meal, pool_size, weights)
+        t, coef = self.query_params(target, weights)
+        pool = self.macros[:, idx].T.astype(np.float64)
+        budget_s = time_budget_ms / 1000.0 if time_budget_ms is not None else None
+        result = plan_meals(pool, t.astype(np.float64), coef.astype(np.float64), meals, beam_width, budget_s)
+        if result is None:
+            return None
+        chosen, score, complete = result
+        return idx[chosen], score, complete
+
+    def get_meal_plan(self, user_profile, eaten_today=None, meals=3, time_budget_ms=PLAN_TIME_BUDGET_MS):
+        """Thực đơn `meals` món cho phần dinh dưỡng còn thiếu của cả ngày."""
+        start = time.perf_counter()
+        daily_needs = HealthInfo(*self.parse_profile(user_profile)).calc_nutrients()
+        target = self.daily_remaining(daily_needs, eaten_today)
+        if target is None:
+            return {'dishes': self.full_day_result(), 'target': None, 'totals': None, 'match_score': 0, 'complete': True}
+
+        planned = self.plan_meals(target, meals, time_budget_ms=time_budget_ms) if self.size else None
+        if planned is None:
+            return {'dishes': [], 'target': target, 'totals': None, 'match_score': None, 'complete': True}
+        idx, score, complete = planned
+
+        if meals == len(MEAL_NAMES) and not eaten_today:
+            # Món nhẹ nhất cho bữa sáng, món nhiều năng lượng nhất cho bữa trưa
+            light, mid, heavy = idx[np.argsort(self.macros[0, idx], kind='stable')]
+            idx = [light, heavy, mid]
+        dishes = [self.record(i) for i in idx]
+        for i, item in enumerate(dishes):
+            item['match_score'] = score
+            if meals == len(MEAL_NAMES) and not eaten_today:
+                item['meal'] = MEAL_NAMES[i]
+        self.format_results(dishes, {f: v / meals for f, v in target.items()})
+        return {
+            'dishes': dishes,
+            'target': target,
+            'totals': {f: float(self.macros[j, idx].sum()) for j, f in enumerate(MATCH_FEATURES)},
+            'match_score': score,
+            'complete': complete,
+            'elapsed_ms': (time.perf_counter() - start) * 1000.0,
+        }
+
+    def top_indices_batch(self, targets, top_n=5, weights=None, max_chunk_bytes=DEFAULT_BATCH_CHUNK_BYTES):
+        """
+        Chấm điểm ma trận (users x dishes) cho nhiều target cùng lúc.
+        `targets`: mảng [n_users, 4] theo thứ tự MATCH_FEATURES. Trả về list (chỉ số, điểm) cho từng user.
+        Ma trận điểm được tính theo từng nhóm user để bộ nhớ tạm không vượt quá `max_chunk_bytes`.
+        """
+        if weights is None:
+            weights = {'Energy': 2.0, 'Protein': 1.0, 'Fat': 1.0, 'Carbohydrate': 1.0}
+        targets = np.asarray(targets, dtype=np.float64).reshape(-1, len(MATCH_FEATURES))
+        n = self.macros.shape[1]
+        if self.index is not None:
+            # Truy vấn index cho từng user thay vì dựng ma trận (users x dishes)
+            out = []
+            for row in targets:
+                target = dict(zip(MATCH_FEATURES, row))
+                out.append(self.top_indices(target, top_n, weights))
+            return out
+        if n == 0:
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in range(len(targets))]
+
+        t = targets.copy()
+        t[t <= 0] = 1
+        w = np.array([weights.get(f, 1.0) for f in MATCH_FEATURES], dtype=np.float64)
+        coef = (w / t).astype(np.float32)
+        t = t.astype(np.float32)
+        energy = targets[:, 0]
+
+        # Đỉnh bộ nhớ: 2 buffer float32 cho mỗi ô (user, món) khi chấm điểm; sau đó mask bool (1 byte) và chỉ số
+        # int64 của argpartition (theo khối nửa chunk, 4 byte/ô) chỉ dùng lại phần của buffer tạm đã giải phóng
+        chunk = max(1, int(max_chunk_bytes // (8 * n)))
+        part_rows = max(1, chunk // 2)
+        k = min(top_n, n)
+        dish_energy = self.macros[0][None, :]
+        results = []
+        for start in range(0, len(targets), chunk):
+            stop = min(start + chunk, len(targets))
+            scores = np.empty((stop - start, n), dtype=np.float32)
+            tmp = np.empty_like(scores)
+            for j in range(len(MATCH_FEATURES)):
+                out = scores if j == 0 else tmp
+                np.subtract(self.macros[j][None, :], t[start:stop, j, None], out=out)
+                np.abs(out, out=out)
+                out *= coef[start:stop, j, None]
+                if j > 0:
+                    scores += tmp
+            del tmp, out
+
+            # Cửa sổ năng lượng ±70% cho các user có target > 100 kcal (mask dựng tại chỗ, một buffer)
+            e = energy[start:stop, None]
+            windowed = e > 100
+            outside = np.empty(scores.shape, dtype=bool)
+            np.less(dish_energy, e * 0.3, out=outside)
+            outside &= windowed
+            np.copyto(scores, np.inf, where=outside)
+            np.greater(dish_energy, e * 1.7, out=outside)
+            outside &= windowed
+            np.copyto(scores, np.inf, where=outside)
+            del outside
+
+            if k < n:
+                part = np.empty((stop - start, k), dtype=np.int64)
+                for r in range(0, stop - start, part_rows):
+                    part[r:r + part_rows] = np.argpartition(scores[r:r + part_rows], k - 1, axis=1)[:, :k]
+            else:
+                part = np.broadcast_to(np.arange(n), (stop - start, n))
+            # Đồng điểm thì giữ thứ tự trong menu (giống top_indices)
+            part = np.sort(part, axis=1)
+            part_scores = np.take_along_axis(scores, part, axis=1)
+            # Giải phóng trước khi cấp phát chunk sau
+            del scores
+            order = np.argsort(part_scores, axis=1, kind='stable')
+            idx = np.take_along_axis(part, order, axis=1)
+            sc = np.take_along_axis(part_scores, order, axis=1)
+            for row_idx, row_sc in zip(idx, sc):
+                valid = np.isfinite(row_sc)
+                results.append((row_idx[valid], row_sc[valid]))
+        return results
+
+    def get_recommendations_batch(self, requests, top_n=5, max_chunk_bytes=DEFAULT_BATCH_CHUNK_BYTES):
+        """
+        `requests`: list các dict {'userProfile': ..., 'eatenToday': ...}.
+        Trả về list kết quả (cùng định dạng get_recommendations) theo đúng thứ tự đầu vào.
+        """
+        if top_n < 1:
+            raise ValueError("top_n must be >= 1")
+        results = [[] for _ in requests]
+        profiles, valid = [], []
+        for i, req in enumerate(requests):
+            try:
+                profiles.append(self.parse_profile((req or {}).get('userProfile') or {}))
+                valid.append(i)
+            except Exception as e:
+                print(f"❌ Lỗi tính toán dinh dưỡng (user {i}): {e}")
+
+        targets, positions = [], []
+        if profiles:
+            ages, genders, weights, _, activities = zip(*profiles)
+            needs = calc_nutrients_batch(ages, genders, weights, activities)
+            for i, row in zip(valid, needs):
+                # eatenToday sai kiểu chỉ làm hỏng kết quả của user đó (list rỗng), không làm hỏng cả batch
+                try:
+                    daily_needs = dict(zip(NUTRIENT_KEYS, row.tolist()))
+                    target = self.meal_target(daily_needs, (requests[i] or {}).get('eatenToday'), verbose=False)
+                except Exception as e:
+                    print(f"❌ Lỗi tính toán dinh dưỡng (user {i}): {e}")
+                    continue
+                if target is None:
+                    results[i] = self.full_day_result()
+                    continue
+                targets.append(target)
+                positions.append(i)
+
+        if not targets or self.size == 0:
+            return results
+
+        matrix = np.array([[tg[f] for f in MATCH_FEATURES] for tg in targets], dtype=np.float64)
+        ranked = self.top_indices_batch(matrix, top_n, self.MEAL_WEIGHTS, max_chunk_bytes)
+        for i, target, (idx, scores) in zip(positions, targets, ranked):
+            items = []
+            for row, score in zip(idx, scores):
+                item = self.record(row)
+                item['match_score'] = float(score)
+                items.append(item)
+            results[i] = self.format_results(items, target)
+        return results
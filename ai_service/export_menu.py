@@ -0,0 +1,48 @@
+"""
+Biên dịch menu JSON thành snapshot nhị phân (menu_snapshot.py) để app khởi động bằng mmap thay vì json.load
++ dựng lại MenuStore / index tên món / recommender. Chạy lại mỗi khi food_data.json đổi (app tự bỏ qua
+snapshot cũ và nạp từ JSON).
+
+    python export_menu.py
+    python export_menu.py --json food_data.json --out food_data.snapshot
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from menu_snapshot import build_snapshot, default_snapshot_path, load_fresh_snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the binary menu snapshot")
+    parser.add_argument('--json', default=os.environ.get('MENU_PATH', 'food_data.json'))
+    parser.add_argument('--out', default=None, help="File snapshot (mặc định: <json>.snapshot, như MENU_SNAPSHOT_PATH)")
+    parser.add_argument('--check-samples', type=int, default=1000, help="Số món so sánh giữa snapshot và JSON")
+    opts = parser.parse_args()
+    out_path = opts.out or default_snapshot_path(opts.json)
+
+    store, index, recommender, timings = build_snapshot(opts.json, out_path)
+    print(f"JSON:     {len(store)} dishes, parse {timings['parse_ms']:.0f} ms + build {timings['build_ms']:.0f} ms")
+
+    # Kiểm tra: nạp lại qua đường serving phải cho cùng món, cùng kết quả so khớp tên và gợi ý
+    start = time.perf_counter()
+    loaded = load_fresh_snapshot(out_path, opts.json)
+    load_ms = (time.perf_counter() - start) * 1000.0
+    if loaded is None:
+        sys.exit(f"Could not load {out_path}")
+    for row in np.random.default_rng(0).permutation(len(store))[:opts.check_samples].tolist():
+        name = store.names[row]
+        if loaded['store'].record(row) != store.record(row) or loaded['index'].match(name) != index.match(name):
+            sys.exit(f"Snapshot mismatch at dish {row} ({name!r})")
+    target = {'Energy': 600.0, 'Protein': 25.0, 'Fat': 20.0, 'Carbohydrate': 80.0}
+    if recommender.size and not np.array_equal(loaded['recommender'].top_indices(target), recommender.top_indices(target)):
+        sys.exit("Snapshot recommender mismatch")
+    print(f"Snapshot: {out_path} ({os.path.getsize(out_path) / 2**20:.1f} MiB), "
+          f"write {timings['write_ms']:.0f} ms, load {load_ms:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
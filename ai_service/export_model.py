@@ -0,0 +1,85 @@
+"""
+Xuất artifact serving đã fuse cho một model trong MODEL_CONFIGS và kiểm tra logits khớp checkpoint gốc.
+
+    python export_model.py --model-id lsnet_b
+    python export_model.py --model-id lsnet_b --weights path/to/ckpt.pth --out pretrained/lsnet_b.serving.pt
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault('WARMUP_ON_START', '0')
+
+import torch
+
+import app
+from model_config import MODEL_CONFIGS
+from quantization import quantize_for_cpu
+from serving_artifact import save_artifact, load_artifact
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a fused serving artifact")
+    parser.add_argument('--model-id', default=MODEL_CONFIGS[0]['id'])
+    parser.add_argument('--weights', default=None, help="Checkpoint (mặc định: weights_path trong MODEL_CONFIGS)")
+    parser.add_argument('--out', default=None, help="File artifact (mặc định: artifact_path trong MODEL_CONFIGS)")
+    parser.add_argument('--tolerance', type=float, default=1e-3, help="Sai số logits tương đối tối đa")
+    opts = parser.parse_args()
+
+    config = next((c for c in MODEL_CONFIGS if c['id'] == opts.model_id), None)
+    if config is None:
+        sys.exit(f"Unknown model ID: {opts.model_id}")
+    weights_path = opts.weights or config['weights_path']
+    out_path = opts.out or config['artifact_path']
+
+    app.download_file_if_missing(config.get('weights_url'), weights_path)
+    checkpoint = torch.load(weights_path, map_location='cpu', weights_only=False)
+    ckpt_args = app.extract_args_from_checkpoint(checkpoint)
+    original = app.load_model(weights_path)
+    if original is None:
+        sys.exit(f"Could not load {weights_path}")
+    original.to('cpu').eval()
+
+    classes = ["Unknown"]
+    if os.path.exists(config['classes_path']):
+        with open(config['classes_path'], "r", encoding="utf-8") as f:
+            classes = [line.strip() for line in f.readlines()]
+
+    fused = app.fuse_model(app.copy.deepcopy(original)).eval()
+    save_artifact(
+        fused, out_path,
+        arch=ckpt_args.model, num_classes=ckpt_args.nb_classes, classes=classes,
+        preprocess_cfg=app.PREPROCESS_CFG,
+        source={'weights_path': os.path.abspath(weights_path), 'weights_mtime': os.path.getmtime(weights_path)},
+    )
+
+    # Kiểm tra: artifact nạp lại qua đường serving phải cho logits khớp checkpoint gốc
+    start = time.perf_counter()
+    loaded, _ = load_artifact(out_path, 'cpu')
+    load_ms = (time.perf_counter() - start) * 1000.0
+    inputs = torch.randn(4, 3, 224, 224, generator=torch.Generator().manual_seed(0))
+    with torch.no_grad():
+        reference = original(inputs)
+        max_diff = (loaded(inputs) - reference).abs().max().item()
+    rel_diff = max_diff / max(reference.abs().max().item(), 1e-6)
+    size_mb = os.path.getsize(out_path) / 2**20
+    print(f"Artifact: {out_path} ({size_mb:.1f} MB), load {load_ms:.1f} ms, relative max |Δlogit| = {rel_diff:.2e}")
+    if rel_diff > opts.tolerance:
+        os.remove(out_path)
+        sys.exit(f"Artifact logits do not match the checkpoint (> {opts.tolerance:.0e}); artifact removed.")
+
+    # Kiểm tra: fuse lại artifact (như build_quantized_model khi bật 'quantize') không đổi logits và vẫn quantize được
+    refused = app.fuse_model(app.copy.deepcopy(loaded)).eval()
+    with torch.no_grad():
+        refuse_diff = (refused(inputs) - loaded(inputs)).abs().max().item()
+    if refuse_diff > 0:
+        sys.exit(f"Fusing the artifact again changed its logits (max |Δlogit| = {refuse_diff:.2e})")
+    try:
+        quantize_for_cpu(refused)
+    except ValueError as e:
+        sys.exit(f"Artifact cannot be quantized: {e}")
+
+
+if __name__ == '__main__':
+    main()
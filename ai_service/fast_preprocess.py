@@ -0,0 +1,75 @@
+import numpy as np
+import torch
+from PIL import Image
+
+# Ảnh JPEG được decode ở kích thước >= DRAFT_FACTOR lần kích thước sau resize rồi mới resize bicubic,
+# để sai khác so với resize từ ảnh gốc nằm trong các ngưỡng bên dưới
+DRAFT_FACTOR = 4
+# Sai khác (sau normalize) cho phép so với pipeline torchvision `preprocess`, kiểm tra bởi
+# benchmarks/bench_preprocess.py. 0.3 ~ 17/255 mức xám ở pixel xấu nhất (cạnh sắc bị alias).
+PREPROCESS_MAX_ABS_DIFF = 0.3
+PREPROCESS_MEAN_ABS_DIFF = 0.03
+
+_RESAMPLE = {
+    'bicubic': Image.BICUBIC,
+    'bilinear': Image.BILINEAR,
+    'nearest': Image.NEAREST,
+}
+
+
+class FastPreprocessor:
+    """
+    Tương đương Resize(resize) -> CenterCrop(crop) -> ToTensor -> Normalize của PREPROCESS_CFG nhưng:
+      - JPEG được decode bằng draft mode (thu nhỏ trong miền DCT) ở gần kích thước cần dùng,
+      - chỉ resize vùng ảnh nằm trong center crop (Image.resize với `box`),
+      - chia 255, trừ mean, chia std và HWC -> CHW gộp trong một phép addcmul vào tensor cấp sẵn.
+    """
+
+    def __init__(self, cfg, draft_factor=DRAFT_FACTOR):
+        self.resize = int(cfg['resize'])
+        self.crop = int(cfg['crop'])
+        self.resample = _RESAMPLE[cfg.get('interpolation', 'bicubic')]
+        self.draft_factor = draft_factor
+        mean = torch.tensor(cfg['mean'], dtype=torch.float32).view(3, 1, 1)
+        std = torch.tensor(cfg['std'], dtype=torch.float32).view(3, 1, 1)
+        # (x / 255 - mean) / std = x * scale + bias
+        self._scale = 1.0 / (255.0 * std)
+        self._bias = -mean / std
+
+    def _resized_size(self, width, height):
+        # Giống torchvision: cạnh ngắn = resize, cạnh dài = int(resize * dài / ngắn)
+        if width <= height:
+            return self.resize, int(self.resize * height / width)
+        return int(self.resize * width / height), self.resize
+
+    def decode(self, source):
+        """Mở ảnh (path / file-like), decode RGB ở kích thước draft; trả về (ảnh, kích thước gốc)."""
+        image = Image.open(source)
+        orig_size = image.size
+        new_w, new_h = self._resized_size(*orig_size)
+        if image.format == 'JPEG' and self.draft_factor:
+            image.draft('RGB', (new_w * self.draft_factor, new_h * self.draft_factor))
+        return image.convert('RGB'), orig_size
+
+    def crop_resize(self, image, orig_size):
+        """Ảnh crop x crop: vùng center crop trong toạ độ ảnh đã resize, quy đổi về toạ độ ảnh đang có (có thể đã draft)."""
+        new_w, new_h = self._resized_size(*orig_size)
+        top = int(round((new_h - self.crop) / 2.0))
+        left = int(round((new_w - self.crop) / 2.0))
+        sx = image.width / new_w
+        sy = image.height / new_h
+        box = (left * sx, top * sy, (left + self.crop) * sx, (top + self.crop) * sy)
+        return image.resize((self.crop, self.crop), self.resample, box=box)
+
+    def load(self, source):
+        return self.crop_resize(*self.decode(source))
+
+    def to_tensor(self, image, out=None):
+        """Tensor [3, crop, crop] float32; ghi vào `out` nếu được truyền (ví dụ một hàng của batch cấp sẵn)."""
+        pixels = torch.from_numpy(np.array(image)).permute(2, 0, 1)
+        if out is None:
+            out = torch.empty(3, self.crop, self.crop, dtype=torch.float32)
+        return torch.addcmul(self._bias, pixels, self._scale, out=out)
+
+    def __call__(self, source, out=None):
+        return self.to_tensor(self.load(source), out)
@@ -0,0 +1,142 @@
+import numpy as np
+
+DEFAULT_LEAF_SIZE = 256
+# Số leaf chấm điểm mỗi vòng (vector hoá) trước khi kiểm tra điều kiện dừng
+LEAVES_PER_STEP = 8
+
+
+def score_block(macros, t, coef):
+    """sum_f coef_f * |macros_f - t_f| với macros [4, m] float32; cùng thứ tự phép tính với score_all."""
+    m = macros.shape[1]
+    scores = np.empty(m, dtype=np.float32)
+    tmp = np.empty(m, dtype=np.float32)
+    for j in range(macros.shape[0]):
+        out = scores if j == 0 else tmp
+        np.subtract(macros[j], t[j], out=out)
+        np.abs(out, out=out)
+        out *= coef[j]
+        if j > 0:
+            scores += tmp
+    return scores
+
+
+class MacroIndex:
+    """
+    KD-tree theo bucket trên vector macro (Energy, Protein, Fat, Carbohydrate) của menu.
+
+    Cây được chia theo chiều có độ trải (đã chuẩn hoá theo trung vị của từng chiều) lớn nhất tới khi mỗi
+    leaf còn <= leaf_size món; các món được sắp lại để mỗi leaf là một đoạn liên tục, mỗi leaf giữ bounding box.
+
+    Điểm của món là sai số tương đối có trọng số sum_f w_f * |x_f - t_f| / t_f, tức khoảng cách L1 với
+    trọng số c_f = w_f / t_f phụ thuộc truy vấn, nên cận dưới của một leaf tính trực tiếp từ bounding box.
+    Truy vấn duyệt leaf theo cận dưới tăng dần (bỏ leaf nằm ngoài cửa sổ năng lượng), chấm điểm chính xác
+    các món trong leaf và dừng khi cận dưới của leaf kế tiếp lớn hơn điểm thứ k hiện có -> kết quả
+    giống hệt brute-force. `max_leaves` giới hạn số leaf được duyệt (chế độ gần đúng).
+    """
+
+    def __init__(self, macros, leaf_size=DEFAULT_LEAF_SIZE):
+        macros = np.ascontiguousarray(macros, dtype=np.float32)
+        dims, n = macros.shape
+        self.size = n
+        self.leaf_size = max(1, int(leaf_size))
+
+        scale = np.median(np.abs(macros), axis=1) if n else np.ones(dims)
+        scale = np.where(scale > 0, scale, 1.0)
+        normalized = macros / scale[:, None]
+
+        perm = np.arange(n, dtype=np.int64)
+        leaves = []
+        stack = [(0, n)]
+        while stack:
+            start, end = stack.pop()
+            if end - start <= self.leaf_size:
+                leaves.append((start, end))
+                continue
+            segment = perm[start:end]
+            pts = normalized[:, segment]
+            dim = int(np.argmax(pts.max(axis=1) - pts.min(axis=1)))
+            mid = (end - start) // 2
+            order = np.argpartition(pts[dim], mid)
+            perm[start:end] = segment[order]
+            stack.append((start + mid, end))
+            stack.append((start, start + mid))
+        leaves.sort()
+
+        self.perm = perm
+        self.macros = np.ascontiguousarray(macros[:, perm])
+        self.leaf_start = np.array([s for s, _ in leaves], dtype=np.int64)
+        self.leaf_end = np.array([e for _, e in leaves], dtype=np.int64)
+        self.leaf_lo = np.empty((len(leaves), dims), dtype=np.float64)
+        self.leaf_hi = np.empty((len(leaves), dims), dtype=np.float64)
+        for i, (s, e) in enumerate(leaves):
+            block = self.macros[:, s:e]
+            self.leaf_lo[i] = block.min(axis=1)
+            self.leaf_hi[i] = block.max(axis=1)
+
+    # Các mảng tạo nên cây (lưu trong snapshot menu, xem menu_snapshot.py)
+    ARRAYS = ('perm', 'macros', 'leaf_start', 'leaf_end', 'leaf_lo', 'leaf_hi')
+
+    def to_arrays(self):
+        return {name: getattr(self, name) for name in self.ARRAYS}
+
+    @classmethod
+    def from_arrays(cls, arrays, leaf_size=DEFAULT_LEAF_SIZE):
+        index = cls.__new__(cls)
+        for name in cls.ARRAYS:
+            setattr(index, name, arrays[name])
+        index.size = len(index.perm)
+        index.leaf_size = leaf_size
+        return index
+
+    @property
+    def n_leaves(self):
+        return len(self.leaf_start)
+
+    def query(self, t, coef, top_n=5, energy_window=None, max_leaves=None):
+        """
+        (chỉ số món theo thứ tự menu gốc, điểm) của top_n món có điểm nhỏ nhất, sắp tăng dần
+        (đồng điểm thì món đứng trước trong menu thắng). `t`, `coef`: mảng float32 [4].
+        `energy_window`: (min, max) kcal hoặc None. Trả thêm số leaf đã duyệt.
+        """
+        if self.size == 0 or top_n <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), 0
+        t64, c64 = t.astype(np.float64), coef.astype(np.float64)
+        gap = np.maximum(self.leaf_lo - t64, 0) + np.maximum(t64 - self.leaf_hi, 0)
+        bounds = gap @ c64
+        if energy_window is not None:
+            lo, hi = energy_window
+            outside = (self.leaf_hi[:, 0] < lo) | (self.leaf_lo[:, 0] > hi)
+            bounds[outside] = np.inf
+        order = np.argsort(bounds, kind='stable')
+        if max_leaves is not None:
+            order = order[:max(1, int(max_leaves))]
+
+        best_idx = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        kth = np.inf
+        visited = 0
+        for step in range(0, len(order), LEAVES_PER_STEP):
+            leaves = order[step:step + LEAVES_PER_STEP]
+            # Điều kiện dừng: leaf tốt nhất còn lại không thể có món tốt hơn (hoặc bằng) món thứ k
+            if not bounds[leaves[0]] <= kth:
+                break
+            leaves = leaves[bounds[leaves] <= kth]
+            visited += len(leaves)
+            positions = np.concatenate([np.arange(self.leaf_start[l], self.leaf_end[l]) for l in leaves])
+            block = self.macros[:, positions]
+            scores = score_block(block, t, coef)
+            if energy_window is not None:
+                keep = (block[0] >= lo) & (block[0] <= hi)
+                positions, scores = positions[keep], scores[keep]
+
+            best_idx = np.concatenate([best_idx, self.perm[positions]])
+            best_scores = np.concatenate([best_scores, scores])
+            if len(best_idx) > top_n:
+                # Giữ top_n (đồng điểm theo thứ tự menu) để điểm thứ k chính xác
+                keep = np.lexsort((best_idx, best_scores))[:top_n]
+                best_idx, best_scores = best_idx[keep], best_scores[keep]
+            if len(best_idx) == top_n:
+                kth = float(best_scores.max())
+
+        order = np.lexsort((best_idx, best_scores))
+        return best_idx[order], best_scores[order], visited
@@ -0,0 +1,130 @@
+import itertools
+import math
+import time
+
+import numpy as np
+
+
+def plan_scores(sums, t, coef):
+    """Điểm của (các) thực đơn có tổng macro `sums` [..., 4]: sum_f coef_f * |S_f - t_f|."""
+    return (np.abs(sums - t) * coef).sum(axis=-1)
+
+
+def beam_search(pool, t, coef, k, beam_width, deadline=None):
+    """
+    Chọn k món khác nhau trong `pool` ([P, 4] macro) sao cho tổng macro gần `t` nhất.
+
+    Mỗi bước thêm một món vào mọi thực đơn dở dang trong beam (chỉ thêm món có chỉ số lớn hơn món cuối,
+    nên mỗi tổ hợp xuất hiện một lần) và giữ `beam_width` thực đơn tốt nhất, chấm theo mục tiêu tỉ lệ
+    t * m / k khi đã chọn m món. Trả về (chỉ số trong pool, điểm) hoặc None nếu quá `deadline`
+    (time.perf_counter) trước khi chọn đủ k món.
+    """
+    n = len(pool)
+    if k <= 0 or n < k:
+        return None
+    positions = np.arange(n)
+    combos = np.empty((1, 0), dtype=np.int64)
+    sums = np.zeros((1, pool.shape[1]))
+    for level in range(k):
+        m = level + 1
+        cand_sums = sums[:, None, :] + pool[None, :, :]
+        scores = plan_scores(cand_sums, t * m / k, coef)
+        last = combos[:, -1] if level else np.full(len(combos), -1)
+        # Món kế tiếp phải đứng sau món cuối và còn đủ món phía sau cho các slot còn lại
+        valid = (positions[None, :] > last[:, None]) & (positions[None, :] <= n - 1 - (k - m))
+        scores[~valid] = np.inf
+
+        flat = scores.ravel()
+        width = min(beam_width, int(np.count_nonzero(valid)))
+        keep = np.argpartition(flat, width - 1)[:width] if width < len(flat) else np.arange(len(flat))
+        keep = keep[np.argsort(flat[keep], kind='stable')]
+        rows, cols = np.divmod(keep, n)
+        combos = np.column_stack([combos[rows], cols])
+        sums = cand_sums[rows, cols]
+        if deadline is not None and m < k and time.perf_counter() > deadline:
+            return None
+    return combos[0], float(plan_scores(sums[0], t, coef))
+
+
+def improve(pool, chosen, t, coef, deadline=None):
+    """
+    Tìm kiếm cục bộ trên thực đơn `chosen`: thử thay một món bằng mọi món khác trong pool, rồi thay
+    từng cặp món bằng mọi cặp trong pool; nhận thay đổi làm giảm điểm nhiều nhất, lặp tới khi không cải
+    thiện được (hoặc quá `deadline`).
+    """
+    chosen = np.array(chosen, dtype=np.int64)
+    n, k = len(pool), len(chosen)
+    total = pool[chosen].sum(axis=0)
+    score = float(plan_scores(total, t, coef))
+    pair_sums = pair_ok = None
+    while deadline is None or time.perf_counter() <= deadline:
+        # [k, P]: điểm khi thay món thứ i bằng món p
+        swapped = (total - pool[chosen])[:, None, :] + pool[None, :, :]
+        scores = plan_scores(swapped, t, coef)
+        scores[:, chosen] = np.inf
+        i, p = np.unravel_index(np.argmin(scores), scores.shape)
+        if scores[i, p] < score - 1e-12:
+            total, score = swapped[i, p], float(scores[i, p])
+            chosen[i] = p
+            continue
+        if k < 2:
+            break
+
+        if pair_sums is None:
+            pair_sums = pool[:, None, :] + pool[None, :, :]
+            pair_ok = np.triu(np.ones((n, n), dtype=bool), 1)
+        ok = pair_ok.copy()
+        ok[chosen, :] = False
+        ok[:, chosen] = False
+        best = (score - 1e-12, None)
+        for a, b in itertools.combinations(range(k), 2):
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            # [P, P]: điểm khi thay cặp món (a, b) bằng cặp (p, q)
+            pair_scores = plan_scores(total - pool[chosen[a]] - pool[chosen[b]] + pair_sums, t, coef)
+            pair_scores[~ok] = np.inf
+            p, q = np.unravel_index(np.argmin(pair_scores), pair_scores.shape)
+            if pair_scores[p, q] < best[0]:
+                best = (float(pair_scores[p, q]), (a, b, p, q))
+        if best[1] is None:
+            break
+        a, b, p, q = best[1]
+        chosen[a], chosen[b] = p, q
+        total, score = pool[chosen].sum(axis=0), best[0]
+    return np.sort(chosen), score
+
+
+def plan_meals(pool, t, coef, k, beam_width, time_budget_s=None):
+    """
+    Thực đơn k món cho mục tiêu cả ngày `t`, tìm kiếm kiểu anytime: trước hết tham lam (beam rộng 1, luôn
+    xong), sau đó beam search + tìm kiếm cục bộ với beam rộng `beam_width`, rồi gấp 4 độ rộng mỗi vòng
+    cho tới khi beam giữ được mọi tổ hợp k-1 món (kết quả tối ưu trên pool) hoặc hết `time_budget_s`
+    (không bắt đầu vòng mới nếu ước lượng, gấp 4 vòng trước, vượt thời gian còn lại).
+    Trả về (chỉ số trong pool, điểm, complete) hoặc None nếu pool không đủ k món; complete = False khi
+    dừng vì hết giờ (thực đơn tốt nhất đã tìm được). `time_budget_s` None = không giới hạn, <= 0 = chỉ tham lam.
+    """
+    deadline = time.perf_counter() + time_budget_s if time_budget_s is not None else None
+    best = beam_search(pool, t, coef, k, 1)
+    if best is None:
+        return None
+    if time_budget_s is not None and time_budget_s <= 0:
+        return best[0], best[1], False
+    exhaustive_width = math.comb(len(pool), k - 1)
+    width = max(1, beam_width)
+    while width > 1:
+        round_start = time.perf_counter()
+        result = beam_search(pool, t, coef, k, width, deadline)
+        if result is None:
+            return best[0], best[1], False
+        result = improve(pool, result[0], t, coef, deadline)
+        if result[1] < best[1] - 1e-12:
+            best = result
+        elif width > beam_width:
+            break  # beam rộng hơn không tìm được thực đơn tốt hơn: coi như đã hội tụ
+        if width >= exhaustive_width:
+            break
+        now = time.perf_counter()
+        if deadline is not None and now + 4 * (now - round_start) > deadline:
+            return best[0], best[1], False
+        width *= 4
+    return best[0], best[1], True
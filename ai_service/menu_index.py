@@ -0,0 +1,250 @@
+import math
+import re
+import unicodedata
+
+import numpy as np
+
+from menu_store import MenuStore, StringColumn
+
+# Ngưỡng mặc định (hệ số Dice trên trigram) để chấp nhận một kết quả khớp gần đúng; ngoài ra mọi từ của
+# truy vấn phải có trong tên món (xem MenuIndex.match)
+DEFAULT_MATCH_THRESHOLD = 0.7
+
+_PAREN_RE = re.compile(r'\(.*?\)')
+_NON_ALNUM_RE = re.compile(r'[^a-z0-9]+')
+
+
+def remove_accents(input_str):
+    nfkd_form = unicodedata.normalize('NFKD', input_str)
+    return "".join([c for c in nfkd_form if not unicodedata.combining(c)])
+
+
+def fuzzy_key(name):
+    """
+    Chuẩn hoá tên cho so khớp gần đúng: bỏ dấu, đ -> d, bỏ phần trong ngoặc, bỏ token toàn số
+    ("Phở Bò 56"), coi i/y như nhau ("mỳ" ~ "mì") và tách '-'/'_' của nhãn class thành khoảng trắng.
+    """
+    s = remove_accents(str(name).lower()).replace('đ', 'd')
+    s = _PAREN_RE.sub(' ', s)
+    s = _NON_ALNUM_RE.sub(' ', s)
+    return ' '.join(tok.replace('y', 'i') for tok in s.split() if not tok.isdigit())
+
+
+def trigrams(key):
+    # Trigram theo từng từ (có pad khoảng trắng) nên không phụ thuộc thứ tự từ
+    grams = set()
+    for tok in key.split():
+        padded = f" {tok} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+class TrigramIndex:
+    """
+    Inverted index trigram -> danh sách tài liệu, truy vấn theo hệ số Dice có trọng số IDF:
+    2 * W(A∩B) / (W(A) + W(B)), nên trigram hiếm (phần đặc trưng của tên món) nặng hơn "banh", "bun"...
+    Dùng prefix filtering (chỉ lấy ứng viên từ các trigram nặng nhất của truy vấn) và lọc theo
+    tổng trọng số, rồi chấm điểm các ứng viên còn lại bằng NumPy thay vì so từng cặp.
+    """
+
+    def __init__(self, keys):
+        postings = {}
+        self._size = 0
+        for doc, key in enumerate(keys):
+            for g in trigrams(key):
+                postings.setdefault(g, []).append(doc)
+            self._size += 1
+        # Posting list là mảng int32 đã sắp xếp để kiểm tra thành viên bằng searchsorted
+        self._postings = {g: np.asarray(docs, dtype=np.int32) for g, docs in postings.items()}
+
+        n = max(1, self._size)
+        self._idf = {g: math.log(1.0 + n / len(docs)) for g, docs in self._postings.items()}
+        # Trigram không có trong menu có trọng số lớn nhất (df = 1)
+        self._unseen_idf = math.log(1.0 + n)
+        doc_weight = np.zeros(self._size, dtype=np.float64)
+        for g, docs in self._postings.items():
+            doc_weight[docs] += self._idf[g]
+        self._doc_weight = doc_weight
+
+    def query(self, key, threshold=DEFAULT_MATCH_THRESHOLD, accept=None):
+        """
+        Trả về (doc, score) tốt nhất với score >= threshold, hoặc (None, 0.0).
+        `accept(doc)`: chỉ nhận doc thoả điều kiện (xét theo điểm giảm dần).
+        """
+        grams = trigrams(key)
+        if not grams or self._size == 0:
+            return None, 0.0
+        threshold = min(max(threshold, 1e-6), 1.0)
+        weights = {g: self._idf.get(g, self._unseen_idf) for g in grams}
+        w_a = sum(weights.values())
+
+        # score >= t  =>  W(A∩B) >= t * W(A) / (2 - t)  và  t * W(A) / (2 - t) <= W(B) <= (2 - t) * W(A) / t
+        min_overlap = threshold * w_a / (2 - threshold) - 1e-9
+        max_len = (2 - threshold) * w_a / threshold + 1e-9
+
+        # Ứng viên phải chứa ít nhất một trigram trong prefix (theo trọng số giảm dần) đủ để
+        # phần còn lại không thể đạt min_overlap.
+        ordered = sorted(grams, key=weights.get, reverse=True)
+        remaining = w_a
+        split = len(ordered)
+        prefix_docs, prefix_w = [], []
+        for i, g in enumerate(ordered):
+            if remaining < min_overlap:
+                split = i
+                break
+            docs = self._postings.get(g)
+            if docs is not None:
+                prefix_docs.append(docs)
+                prefix_w.append(np.full(docs.size, weights[g]))
+            remaining -= weights[g]
+        if not prefix_docs:
+            return None, 0.0
+        cand, inverse = np.unique(np.concatenate(prefix_docs), return_inverse=True)
+        overlap = np.bincount(inverse, weights=np.concatenate(prefix_w), minlength=cand.size)
+
+        # Lọc theo tổng trọng số và cận trên của overlap, rồi cộng phần trigram còn lại
+        w_b = self._doc_weight[cand]
+        keep = (w_b >= min_overlap) & (w_b <= max_len) & (overlap + remaining >= min_overlap)
+        cand, w_b, overlap = cand[keep], w_b[keep], overlap[keep]
+        for g in ordered[split:]:
+            if cand.size == 0:
+                break
+            docs = self._postings.get(g)
+            remaining -= weights[g]
+            if docs is not None:
+                pos = np.searchsorted(docs, cand)
+                np.minimum(pos, docs.size - 1, out=pos)
+                overlap = overlap + weights[g] * (docs[pos] == cand)
+            keep = overlap + remaining >= min_overlap
+            if not keep.all():
+                cand, w_b, overlap = cand[keep], w_b[keep], overlap[keep]
+        if cand.size == 0:
+            return None, 0.0
+
+        scores = 2.0 * overlap / (w_a + w_b)
+        if accept is None:
+            best = int(np.argmax(scores))  # cand đã sắp xếp -> đồng điểm thì món đứng trước thắng
+            if scores[best] < threshold - 1e-9:
+                return None, 0.0
+            return int(cand[best]), float(scores[best])
+        for j in np.lexsort((cand, -scores)).tolist():
+            if scores[j] < threshold - 1e-9:
+                break
+            if accept(int(cand[j])):
+                return int(cand[j]), float(scores[j])
+        return None, 0.0
+
+
+class MenuIndex:
+    """
+    Index tên món dựng một lần khi nạp menu: key chữ thường và key bỏ dấu -> dòng trong MenuStore.
+    Không sửa đổi sau khi tạo; khi menu đổi thì dựng index mới và gán lại biến toàn cục
+    (phép gán là nguyên tử nên request đang chạy vẫn dùng index cũ một cách nhất quán).
+    """
+
+    def __init__(self, menu, previous=None, source=None):
+        """
+        `previous`, `source` (khi nạp lại menu, xem MenuStore.updated): món i có source[i] >= 0 không đổi so
+        với dòng source[i] của menu cũ, nên dùng lại key đã chuẩn hoá của `previous` thay vì tính lại.
+        """
+        self.menu = menu if isinstance(menu, MenuStore) else MenuStore(menu)
+        self._exact = {}
+        self._plain = {}
+        # Key bỏ dấu / fuzzy của từng dòng, để lần nạp lại menu sau dùng lại cho các món không đổi
+        self._row_plain = []
+        self._row_fuzzy = []
+        reuse = source.tolist() if previous is not None and source is not None else None
+        if reuse is not None:
+            # Index nạp từ snapshot giữ key theo dòng dạng StringColumn
+            prev_plain, prev_fuzzy = list(previous._row_plain), list(previous._row_fuzzy)
+        # Mỗi fuzzy key chỉ giữ món đầu tiên trong menu
+        fuzzy_docs = {}
+        interned = {}
+        for i, name in enumerate(self.menu.names):
+            name_lower = name.lower()
+            row = reuse[i] if reuse is not None else -1
+            if row >= 0:
+                plain, fuzzy = prev_plain[row], prev_fuzzy[row]
+            else:
+                plain, fuzzy = remove_accents(name_lower), fuzzy_key(name)
+            self._exact.setdefault(name_lower, i)
+            self._plain.setdefault(plain, i)
+            fuzzy = interned.setdefault(fuzzy, fuzzy)
+            fuzzy_docs.setdefault(fuzzy, i)
+            self._row_plain.append(plain)
+            self._row_fuzzy.append(fuzzy)
+        self._fuzzy_keys = list(fuzzy_docs.keys())
+        self._fuzzy_foods = list(fuzzy_docs.values())
+        self._fuzzy = TrigramIndex(self._fuzzy_keys)
+        self._label_cache = {}
+
+    def to_tables(self):
+        """
+        Các bảng tra của index dạng cột (StringColumn key + mảng dòng), để lưu snapshot menu;
+        from_tables() dựng lại index mà không phải chuẩn hoá lại tên món.
+        """
+        def keyed(lookup):
+            return StringColumn(lookup), np.fromiter(lookup.values(), dtype=np.int64, count=len(lookup))
+
+        exact, exact_rows = keyed(self._exact)
+        plain, plain_rows = keyed(self._plain)
+        return {
+            'exact': exact, 'exact_rows': exact_rows,
+            'plain': plain, 'plain_rows': plain_rows,
+            'fuzzy': StringColumn(self._fuzzy_keys), 'fuzzy_rows': np.asarray(self._fuzzy_foods, dtype=np.int64),
+            'row_plain': StringColumn(self._row_plain), 'row_fuzzy': StringColumn(self._row_fuzzy),
+        }
+
+    @classmethod
+    def from_tables(cls, menu, tables):
+        index = cls.__new__(cls)
+        index.menu = menu
+        index._exact = dict(zip(tables['exact'], tables['exact_rows'].tolist()))
+        index._plain = dict(zip(tables['plain'], tables['plain_rows'].tolist()))
+        # Chỉ dùng khi nạp lại menu tăng dần nên giữ nguyên dạng StringColumn
+        index._row_plain, index._row_fuzzy = tables['row_plain'], tables['row_fuzzy']
+        index._fuzzy_keys = list(tables['fuzzy'])
+        index._fuzzy_foods = tables['fuzzy_rows'].tolist()
+        index._fuzzy = TrigramIndex(index._fuzzy_keys)
+        index._label_cache = {}
+        return index
+
+    def __len__(self):
+        return len(self.menu)
+
+    def match(self, pred_name, threshold=DEFAULT_MATCH_THRESHOLD):
+        """Trả về (món, score): 1.0 nếu khớp tên (có/không dấu), ngược lại điểm gần đúng >= threshold."""
+        pred_lower = pred_name.lower().strip()
+        exact = self._exact.get(pred_lower)
+        plain = self._plain.get(remove_accents(pred_lower))
+        # Giữ đúng thứ tự ưu tiên của bản quét tuần tự: món xuất hiện trước trong menu thắng
+        hits = [i for i in (exact, plain) if i is not None]
+        if hits:
+            return self.menu.record(min(hits)), 1.0
+        if threshold is None or threshold > 1.0:
+            return None, 0.0
+
+        # Tên món có thể dài hơn truy vấn ("pho" ~ "Phở bò") nhưng không được thiếu từ nào của truy vấn:
+        # "bun-cha-ca" không được khớp "Bún chả", "banh-da-lon" không được khớp "Bánh đa"
+        key = fuzzy_key(pred_name)
+        tokens = set(key.split())
+        doc, score = self._fuzzy.query(key, threshold, accept=lambda d: tokens <= set(self._fuzzy_keys[d].split()))
+        if doc is None:
+            return None, 0.0
+        return self.menu.record(self._fuzzy_foods[doc]), score
+
+    def find(self, pred_name, threshold=DEFAULT_MATCH_THRESHOLD):
+        return self.match(pred_name, threshold)[0]
+
+    def records_for_labels(self, classes, threshold=DEFAULT_MATCH_THRESHOLD):
+        """
+        Danh sách (món hoặc None, score) theo đúng thứ tự class của model, tính một lần cho mỗi bộ class.
+        Chỉ gọi với ngưỡng cố định của server: cache giữ một mục cho mỗi (bộ class, ngưỡng).
+        """
+        key = (tuple(classes), threshold)
+        records = self._label_cache.get(key)
+        if records is None:
+            records = [self.match(label, threshold) for label in classes]
+            self._label_cache[key] = records
+        return records
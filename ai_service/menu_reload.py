@@ -0,0 +1,131 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+def file_signature(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def content_version(raw):
+    """Phiên bản menu: hash nội dung file JSON (cùng giá trị với MENU_VERSION của app)."""
+    return hashlib.blake2b(raw, digest_size=8).hexdigest()
+
+
+class MenuReloader:
+    """
+    Nạp (lại) menu từ file JSON `path` trên một thread nền riêng: khi file đổi (poll mtime/size mỗi
+    `interval_s` giây, 0 = không theo dõi) hoặc khi được gọi reload() (admin API).
+
+    `apply(food_list, version, full)` dựng menu mới rồi gán đè (app.set_menu), trả về diff của lần nạp
+    tăng dần hoặc None. Mọi lần nạp chạy tuần tự trên cùng một thread; request đang chạy vẫn dùng menu cũ
+    tới khi xong. Nội dung file không đổi (cùng hash) thì bỏ qua. Nên ghi file mới bằng rename để
+    watcher không đọc phải file đang ghi dở.
+    """
+
+    def __init__(self, path, apply, interval_s=0):
+        self.path = path
+        self.apply = apply
+        self.interval_s = max(0.0, float(interval_s))
+        self.version = None
+        self._signature = None
+        self._stats = {'reloads': 0, 'unchanged': 0, 'errors': 0, 'last': None}
+        self._init_runtime()
+
+    def _init_runtime(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='menu-reload')
+        self._stop = threading.Event()
+        self._watcher = None
+
+    def load(self, full=True):
+        """Nạp đồng bộ trên thread hiện tại (lúc khởi động)."""
+        return self._reload(full)
+
+    def mark_loaded(self, version, signature):
+        """Menu hiện tại đã được nạp từ nguồn khác (snapshot) ứng với file có `version` / `signature`."""
+        self.version, self._signature = version, signature
+
+    def reload(self, full=False):
+        """Future kết quả nạp; các yêu cầu tới khi lần nạp trước còn đang chờ chạy dùng chung Future đó."""
+        with self._lock:
+            fut = self._pending.get(full)
+            if fut is None or fut.running() or fut.done():
+                fut = self._pending[full] = self._executor.submit(self._reload, full)
+            return fut
+
+    def _reload(self, full):
+        start = time.perf_counter()
+        try:
+            signature = file_signature(self.path)
+            with open(self.path, 'rb') as f:
+                raw = f.read()
+            version = content_version(raw)
+            if version == self.version and not full:
+                self._signature = signature
+                self._stats['unchanged'] += 1
+                return {'status': 'unchanged', 'version': version}
+
+            food_list = json.loads(raw)
+            del raw
+            parse_ms = (time.perf_counter() - start) * 1000.0
+            diff = self.apply(food_list, version, full)
+            self.version, self._signature = version, signature
+            result = {
+                'status': 'reloaded',
+                'mode': 'incremental' if diff is not None else 'full',
+                'version': version,
+                'dishes': len(food_list),
+                'diff': diff,
+                'parse_ms': parse_ms,
+                'total_ms': (time.perf_counter() - start) * 1000.0,
+            }
+            self._stats['reloads'] += 1
+            logger.info(f"Menu reloaded ({result['mode']}): {len(food_list)} dishes, diff {diff}, "
+                        f"{result['total_ms']:.0f} ms (parse {parse_ms:.0f} ms)")
+        except Exception as e:
+            self._stats['errors'] += 1
+            logger.error(f"Lỗi nạp menu từ {self.path}: {e}")
+            result = {'status': 'error', 'error': str(e)}
+        self._stats['last'] = result
+        return result
+
+    def _watch(self):
+        while not self._stop.wait(self.interval_s):
+            try:
+                signature = file_signature(self.path)
+            except OSError:
+                continue
+            if signature != self._signature:
+                # Ghi nhận trước khi nạp để các lần poll sau không xếp hàng nạp trùng
+                self._signature = signature
+                self.reload()
+
+    def start(self):
+        if self.interval_s > 0 and self._watcher is None:
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, name='menu-watch', daemon=True)
+            self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+    def after_fork(self):
+        # Thread không sống sót qua fork: tạo lại executor và watcher cho worker
+        self._init_runtime()
+        self.start()
+
+    def stats(self):
+        return {'path': self.path, 'version': self.version, 'watching': self._watcher is not None,
+                'interval_s': self.interval_s, **self._stats}
@@ -0,0 +1,196 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+from calc_nutrients import NutritionRecommender, MACRO_INDEX_MIN_DISHES
+from macro_index import MacroIndex
+from menu_index import MenuIndex
+from menu_reload import content_version, file_signature
+from menu_store import MenuStore, StringColumn
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b'NSMENU\x00\x00'
+# Tăng khi đổi layout hoặc cách chuẩn hoá tên món (remove_accents / fuzzy_key) để snapshot cũ bị bỏ qua
+SNAPSHOT_VERSION = 1
+_HEADER = struct.Struct('<8sQ')
+_ALIGN = 64
+
+
+def default_snapshot_path(json_path):
+    return f"{os.path.splitext(json_path)[0]}.snapshot"
+
+
+def _aligned(n):
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _put_column(arrays, prefix, col):
+    arrays[f'{prefix}.codes'] = col.codes
+    arrays[f'{prefix}.offsets'] = col.offsets
+    arrays[f'{prefix}.buffer'] = np.frombuffer(col.buffer, dtype=np.uint8)
+
+
+def _get_column(arrays, prefix):
+    return StringColumn.from_parts(arrays[f'{prefix}.codes'], arrays[f'{prefix}.offsets'],
+                                   memoryview(arrays[f'{prefix}.buffer']))
+
+
+def save_snapshot(path, store, index, recommender, source):
+    """
+    Ghi snapshot của menu đã dựng: các mảng của MenuStore, bảng tra tên món của MenuIndex (key đã chuẩn hoá)
+    và recommender (dòng sau khi bỏ món trùng tên + KD-tree). `source`: mtime_ns / size / version của file JSON.
+
+    Layout: magic + độ dài header, header JSON (metadata + dtype/shape/offset từng mảng), rồi dữ liệu thô
+    của các mảng (căn 64 byte) để load_snapshot() map thẳng bằng np.frombuffer. Ghi ra file tạm rồi os.replace.
+    """
+    arrays = {'nutrients': store.nutrients}
+    for j, col in enumerate(store.strings.values()):
+        _put_column(arrays, f'strings.{j}', col)
+    for name, value in index.to_tables().items():
+        if isinstance(value, StringColumn):
+            _put_column(arrays, f'index.{name}', value)
+        else:
+            arrays[f'index.{name}'] = value
+    if recommender.rows is not None:
+        arrays['recommender.rows'] = recommender.rows
+    if recommender.index is not None:
+        for name, value in recommender.index.to_arrays().items():
+            arrays[f'macro_index.{name}'] = value
+
+    table, offset = {}, 0
+    for name, value in arrays.items():
+        value = arrays[name] = np.ascontiguousarray(value)
+        table[name] = {'dtype': value.dtype.str, 'shape': list(value.shape), 'offset': offset}
+        offset = _aligned(offset + value.nbytes)
+    header = json.dumps({
+        'version': SNAPSHOT_VERSION,
+        'created': time.time(),
+        'source': source,
+        'dishes': len(store),
+        'columns': store.columns,
+        'strings': list(store.strings),
+        'macro_index': {'leaf_size': recommender.index.leaf_size} if recommender.index is not None else None,
+        'arrays': table,
+    }, ensure_ascii=False).encode('utf-8')
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, len(header)))
+        f.write(header)
+        base = _aligned(_HEADER.size + len(header))
+        for name, value in arrays.items():
+            f.seek(base + table[name]['offset'])
+            f.write(memoryview(value).cast('B') if value.size else b'')
+        f.truncate(base + offset)
+    os.replace(tmp_path, path)
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        magic, size = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"Not a menu snapshot: {path}")
+        header = json.loads(f.read(size))
+    if header.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported menu snapshot version {header.get('version')}: {path}")
+    header['_data_offset'] = _aligned(_HEADER.size + size)
+    return header
+
+
+def is_fresh(header, json_path):
+    """
+    (snapshot còn khớp json_path?, signature của json_path lúc kiểm tra hoặc None nếu không có file JSON).
+    Cùng mtime/size thì không đọc file; khác mtime nhưng cùng size (copy, touch...) thì so hash nội dung.
+    """
+    try:
+        signature = file_signature(json_path)
+    except FileNotFoundError:
+        # Chỉ triển khai snapshot: snapshot là nguồn duy nhất
+        return True, None
+    source = header['source']
+    if signature == (source['mtime_ns'], source['size']):
+        return True, signature
+    if signature[1] != source['size']:
+        return False, signature
+    with open(json_path, 'rb') as f:
+        return content_version(f.read()) == source['version'], signature
+
+
+def load_snapshot(path, header=None):
+    """
+    Map snapshot vào bộ nhớ (chỉ đọc) và dựng (store, index, recommender) trên các mảng đó, không parse JSON
+    và không chuẩn hoá lại tên món. Các worker fork từ cùng master / cùng host dùng chung page cache.
+    """
+    header = header or read_header(path)
+    with open(path, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    base = header['_data_offset']
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape'], dtype=np.int64))
+        arrays[name] = np.frombuffer(buf, dtype=dtype, count=count, offset=base + spec['offset']).reshape(spec['shape'])
+
+    strings = {key: _get_column(arrays, f'strings.{j}') for j, key in enumerate(header['strings'])}
+    store = MenuStore.from_parts(header['columns'], arrays['nutrients'], strings)
+    tables = {}
+    for name in ('exact', 'plain', 'fuzzy', 'row_plain', 'row_fuzzy'):
+        tables[name] = _get_column(arrays, f'index.{name}')
+    for name in ('exact_rows', 'plain_rows', 'fuzzy_rows'):
+        tables[name] = arrays[f'index.{name}']
+    index = MenuIndex.from_tables(store, tables)
+    macro_index = None
+    if header['macro_index'] is not None:
+        macro_index = MacroIndex.from_arrays({name: arrays[f'macro_index.{name}'] for name in MacroIndex.ARRAYS},
+                                             header['macro_index']['leaf_size'])
+    recommender = NutritionRecommender.from_parts(store, arrays.get('recommender.rows'), macro_index)
+    return store, index, recommender
+
+
+def load_fresh_snapshot(path, json_path):
+    """
+    Nạp snapshot nếu có và còn khớp json_path: dict store / index / recommender / version / signature
+    (signature của json_path để MenuReloader không nạp lại ngay). None nếu không có, cũ hoặc hỏng (ghi log lý do).
+    """
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        header = read_header(path)
+        fresh, signature = is_fresh(header, json_path)
+        if not fresh:
+            logger.warning(f"Snapshot {path} cũ hơn {json_path}, nạp từ JSON. Chạy export_menu.py để dựng lại.")
+            return None
+        store, index, recommender = load_snapshot(path, header)
+    except (OSError, ValueError, KeyError, struct.error) as e:
+        logger.error(f"Lỗi đọc snapshot menu {path}: {e}")
+        return None
+    return {'store': store, 'index': index, 'recommender': recommender,
+            'version': header['source']['version'], 'signature': signature}
+
+
+def build_snapshot(json_path, path, index_min_dishes=MACRO_INDEX_MIN_DISHES):
+    """Đọc json_path, dựng menu như app.set_menu rồi ghi snapshot. Trả về (store, index, recommender, timings)."""
+    start = time.perf_counter()
+    signature = file_signature(json_path)
+    with open(json_path, 'rb') as f:
+        raw = f.read()
+    version = content_version(raw)
+    food_list = json.loads(raw)
+    del raw
+    parsed = time.perf_counter()
+    store = MenuStore(food_list)
+    del food_list
+    index = MenuIndex(store)
+    recommender = NutritionRecommender(store, index_min_dishes)
+    built = time.perf_counter()
+    source = {'path': os.path.basename(json_path), 'mtime_ns': signature[0], 'size': signature[1], 'version': version}
+    save_snapshot(path, store, index, recommender, source)
+    timings = {'parse_ms': (parsed - start) * 1000.0, 'build_ms': (built - parsed) * 1000.0,
+               'write_ms': (time.perf_counter() - built) * 1000.0}
+    return store, index, recommender, timings
@@ -0,0 +1,264 @@
+import numpy as np
+
+# Các cột số của menu (float32); 4 cột đầu là macro dùng để chấm điểm (MATCH_FEATURES)
+NUMERIC_COLUMNS = ['Energy', 'Protein', 'Fat', 'Carbohydrate', 'Fiber']
+
+
+def _to_float(value):
+    # Như pd.to_numeric(errors='coerce').fillna(0)
+    try:
+        out = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if out != out else out
+
+
+def fingerprint(food):
+    """Hash của một món (trong process) để phát hiện món đổi khi nạp lại menu."""
+    try:
+        return hash(tuple(food.items()))
+    except TypeError:  # giá trị không hash được (list, dict...)
+        return hash(repr(food))
+
+
+def _py_float(value):
+    # float32 -> float Python theo biểu diễn ngắn nhất (825.6 thay vì 825.5999755859375)
+    return float(str(value))
+
+
+def _string_values(key, food_list):
+    values = (f.get(key) for f in food_list)
+    if key == 'name':
+        return (str(v).strip() for v in values)
+    return ('' if v is None else str(v) for v in values)
+
+
+class StringColumn:
+    """
+    Cột chuỗi dạng categorical: mỗi giá trị khác nhau lưu một lần trong buffer UTF-8 liền (kèm offsets),
+    mỗi dòng chỉ giữ mã int32. Không có object str nào cho từng dòng.
+    `buffer` là bytes hoặc memoryview chỉ đọc (vùng nhớ map từ snapshot, xem menu_snapshot.py).
+    """
+
+    def __init__(self, values):
+        lookup = {}
+        self.codes = np.fromiter((lookup.setdefault(v, len(lookup)) for v in values), dtype=np.int32)
+        encoded = [v.encode('utf-8') for v in lookup]
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=self.offsets[1:])
+        self.buffer = b''.join(encoded)
+
+    @classmethod
+    def from_parts(cls, codes, offsets, buffer):
+        col = cls.__new__(cls)
+        col.codes, col.offsets, col.buffer = codes, offsets, buffer
+        return col
+
+    def entries(self):
+        """Các giá trị (bytes UTF-8) của từ điển theo mã."""
+        offsets = self.offsets.tolist()
+        return [bytes(self.buffer[a:b]) for a, b in zip(offsets[:-1], offsets[1:])]
+
+    def gather(self, source, fresh_rows, fresh_values, dedupe=True):
+        """
+        Cột mới: dòng i lấy giá trị dòng source[i] của cột này (source >= 0), các dòng `fresh_rows` nhận
+        `fresh_values`. Giá trị mới được nối vào cuối từ điển, không mã hoá lại các giá trị cũ.
+        `dedupe=False`: chỉ gộp trùng giữa các giá trị mới với nhau (không dựng lookup cho cả từ điển cũ),
+        dùng cho cột gần như duy nhất theo dòng như 'id'.
+        """
+        codes = np.empty(len(source), dtype=np.int32)
+        kept = source >= 0
+        codes[kept] = self.codes[source[kept]]
+        if not len(fresh_rows):
+            return StringColumn.from_parts(codes, self.offsets, self.buffer)
+        lookup = {value: c for c, value in enumerate(self.entries())} if dedupe else {}
+        appended = []
+        for row, value in zip(fresh_rows, fresh_values):
+            encoded = value.encode('utf-8')
+            code = lookup.get(encoded)
+            if code is None:
+                code = lookup[encoded] = self.n_unique + len(appended)
+                appended.append(encoded)
+            codes[row] = code
+        extra = np.fromiter(map(len, appended), dtype=np.int64, count=len(appended))
+        offsets = np.concatenate([self.offsets, self.offsets[-1] + np.cumsum(extra)])
+        return StringColumn.from_parts(codes, offsets, b''.join([self.buffer, *appended]))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, row):
+        return self.value(self.codes[row])
+
+    def __iter__(self):
+        # bytes: cắt + decode nhanh hơn nhiều so với trên memoryview (buffer map từ snapshot)
+        offsets, buffer = self.offsets.tolist(), bytes(self.buffer)
+        for code in self.codes.tolist():
+            yield buffer[offsets[code]:offsets[code + 1]].decode('utf-8')
+
+    @property
+    def n_unique(self):
+        return len(self.offsets) - 1
+
+    def value(self, code):
+        return str(self.buffer[self.offsets[code]:self.offsets[code + 1]], 'utf-8')
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.offsets.nbytes + len(self.buffer)
+
+
+class MenuStore:
+    """
+    Menu dạng cột, dùng chung cho so khớp tên món (/predict) và NutritionRecommender:
+    - `nutrients`: float32 [len(NUMERIC_COLUMNS), n]; `macros` là view 4 dòng đầu
+    - các cột còn lại (id, name, image, ...) là StringColumn; tên món đã bỏ khoảng trắng thừa
+    Chỉ số dòng là id nội bộ (int) của món; dict chỉ được dựng cho các dòng cần trả về (record()).
+    `fingerprints` là None với store nạp từ snapshot (hash() của Python khác nhau giữa các process).
+    """
+
+    def __init__(self, food_list):
+        food_list = list(food_list)
+        n = len(food_list)
+        keys = {}
+        for food in food_list:
+            for key in food:
+                keys.setdefault(key, None)
+        self.columns = list(keys)
+        self.fingerprints = np.fromiter(map(fingerprint, food_list), dtype=np.int64, count=n)
+
+        self.nutrients = np.zeros((len(NUMERIC_COLUMNS), n), dtype=np.float32)
+        for j, col in enumerate(NUMERIC_COLUMNS):
+            if col in keys:
+                self.nutrients[j] = np.fromiter((_to_float(f.get(col)) for f in food_list), dtype=np.float32, count=n)
+
+        self.strings = {}
+        for key in self.columns:
+            if key not in NUMERIC_COLUMNS:
+                self.strings[key] = StringColumn(_string_values(key, food_list))
+        if 'name' not in self.strings:
+            self.strings['name'] = StringColumn('' for _ in range(n))
+        self._numeric_pos = {col: j for j, col in enumerate(NUMERIC_COLUMNS)}
+
+    @classmethod
+    def from_parts(cls, columns, nutrients, strings, fingerprints=None):
+        store = cls.__new__(cls)
+        store.columns, store.nutrients, store.strings = list(columns), nutrients, dict(strings)
+        store.fingerprints = fingerprints
+        store._numeric_pos = {col: j for j, col in enumerate(NUMERIC_COLUMNS)}
+        return store
+
+    def _old_rows(self, food_list):
+        # Dòng cũ có cùng 'id' với từng món của food_list (-1 nếu không có); id trùng trong menu cũ: dòng đầu thắng
+        old_ids = self.strings.get('id')
+        if old_ids is None:
+            return np.full(len(food_list), -1, dtype=np.int64)
+        entries = old_ids.entries()
+        keys = [entries[c] for c in old_ids.codes.tolist()]
+        row_of_id = dict(zip(reversed(keys), range(len(keys) - 1, -1, -1)))
+        del entries, keys
+        return np.fromiter(
+            (row_of_id.pop(str(f['id']).encode('utf-8'), -1) if f.get('id') is not None else -1 for f in food_list),
+            dtype=np.int64, count=len(food_list))
+
+    def updated(self, food_list):
+        """
+        MenuStore cho `food_list` (cùng thứ tự), dùng lại dữ liệu đã mã hoá của các món không đổi
+        (cùng 'id' và cùng fingerprint) thay vì parse lại; chỉ món thêm/đổi được đọc từ dict.
+        Trả về (store mới, source, diff): source[i] = dòng cũ của món i hoặc -1.
+        """
+        food_list = list(food_list)
+        if self.fingerprints is None:
+            return self._updated_by_content(food_list)
+        n = len(food_list)
+        fingerprints = np.fromiter(map(fingerprint, food_list), dtype=np.int64, count=n)
+        source = np.full(n, -1, dtype=np.int64)
+        rows = self._old_rows(food_list)
+        found = rows >= 0
+        matched = int(found.sum())
+        same = found & (self.fingerprints[np.where(found, rows, 0)] == fingerprints)
+        source[same] = rows[same]
+        fresh = np.flatnonzero(source < 0)
+        fresh_foods = [food_list[i] for i in fresh]
+        kept = source >= 0
+
+        out = MenuStore.__new__(MenuStore)
+        keys = dict.fromkeys(self.columns)
+        for food in fresh_foods:
+            for key in food:
+                keys.setdefault(key, None)
+        out.columns = list(keys)
+        out.fingerprints = fingerprints
+        out.nutrients = np.zeros((len(NUMERIC_COLUMNS), n), dtype=np.float32)
+        out.nutrients[:, kept] = self.nutrients[:, source[kept]]
+        for j, col in enumerate(NUMERIC_COLUMNS):
+            out.nutrients[j, fresh] = np.fromiter((_to_float(f.get(col)) for f in fresh_foods), dtype=np.float32, count=len(fresh))
+        out.strings = {}
+        for key in out.columns + ([] if 'name' in keys else ['name']):
+            if key in NUMERIC_COLUMNS:
+                continue
+            if key in self.strings:
+                col, col_source = self.strings[key], source
+            else:
+                # Cột chỉ có ở món mới: các món giữ lại nhận ''
+                col, col_source = StringColumn(['']), np.where(kept, 0, -1)
+            # 'name' phải gộp trùng chính xác (recommender bỏ món trùng tên theo mã)
+            dedupe = key == 'name' or 4 * col.n_unique <= len(col)
+            out.strings[key] = col.gather(col_source, fresh, list(_string_values(key, fresh_foods)), dedupe)
+        out._numeric_pos = self._numeric_pos
+
+        return out, source, self._diff(source, matched)
+
+    def _updated_by_content(self, food_list):
+        """
+        updated() khi store cũ không có fingerprint: mã hoá lại toàn bộ food_list, rồi coi món cùng 'id' là
+        không đổi nếu mọi cột đã mã hoá bằng nhau. Store mới có fingerprint nên các lần sau đi đường nhanh.
+        """
+        out = MenuStore(food_list)
+        rows = self._old_rows(food_list)
+        matched = np.flatnonzero(rows >= 0)
+        old_rows = rows[matched]
+        same = (self.nutrients[:, old_rows] == out.nutrients[:, matched]).all(axis=0)
+        for key in dict.fromkeys(self.columns + out.columns + ['name']):
+            if key in NUMERIC_COLUMNS:
+                continue
+            old, new = self.strings.get(key), out.strings.get(key)
+            # Cột thiếu ở một phía tương đương toàn ''
+            old_entries = old.entries() if old is not None else [b'']
+            new_entries = new.entries() if new is not None else [b'']
+            lookup = {value: c for c, value in enumerate(old_entries)}
+            to_old = np.fromiter((lookup.get(v, -1) for v in new_entries), dtype=np.int64, count=len(new_entries))
+            new_codes = to_old[new.codes[matched]] if new is not None else to_old[0]
+            same &= new_codes == (old.codes[old_rows] if old is not None else 0)
+        source = np.full(len(out), -1, dtype=np.int64)
+        source[matched[same]] = old_rows[same]
+        return out, source, self._diff(source, len(matched))
+
+    def _diff(self, source, matched):
+        kept = int((source >= 0).sum())
+        changed = matched - kept
+        return {'unchanged': kept, 'changed': changed, 'added': len(source) - kept - changed,
+                'removed': len(self) - matched}
+
+    def __len__(self):
+        return self.nutrients.shape[1]
+
+    @property
+    def macros(self):
+        return self.nutrients[:4]
+
+    @property
+    def names(self):
+        return self.strings['name']
+
+    def record(self, row):
+        """Dict của một món (cùng các key như trong food_data.json)."""
+        out = {}
+        for key in self.columns:
+            j = self._numeric_pos.get(key)
+            out[key] = _py_float(self.nutrients[j, row]) if j is not None else self.strings[key][row]
+        return out
+
+    @property
+    def nbytes(self):
+        return self.nutrients.nbytes + sum(col.nbytes for col in self.strings.values())
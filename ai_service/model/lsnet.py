@@ -1,5 +1,4 @@
 import torch
-import itertools
 import torch.nn as nn
 
 from timm.models.vision_transformer import trunc_normal_
@@ -84,6 +83,16 @@ class FFN(torch.nn.Module):
         x = self.pw2(self.act(self.pw1(x)))
         return x
 
+def attention_bias_idxs(resolution):
+    # Offset (|dy|, |dx|) giữa hai điểm trên lưới resolution x resolution -> index dy * resolution + dx
+    # (trùng thứ tự đánh số của bản itertools.product cũ, nên checkpoint cũ vẫn dùng được)
+    coords = torch.arange(resolution)
+    ys = coords.repeat_interleave(resolution)
+    xs = coords.repeat(resolution)
+    dy = (ys[:, None] - ys[None, :]).abs()
+    dx = (xs[:, None] - xs[None, :]).abs()
+    return dy * resolution + dx
+
 class Attention(torch.nn.Module):
     def __init__(self, dim, key_dim, num_heads=8,
                  attn_ratio=4,
@@ -101,28 +110,21 @@ class Attention(torch.nn.Module):
         self.proj = torch.nn.Sequential(torch.nn.ReLU(), Conv2d_BN(
             self.dh, dim, bn_weight_init=0))
         self.dw = Conv2d_BN(nh_kd, nh_kd, 3, 1, 1, groups=nh_kd)
-        points = list(itertools.product(range(resolution), range(resolution)))
-        N = len(points)
-        attention_offsets = {}
-        idxs = []
-        for p1 in points:
-            for p2 in points:
-                offset = (abs(p1[0] - p2[0]), abs(p1[1] - p2[1]))
-                if offset not in attention_offsets:
-                    attention_offsets[offset] = len(attention_offsets)
-                idxs.append(attention_offsets[offset])
         self.attention_biases = torch.nn.Parameter(
-            torch.zeros(num_heads, len(attention_offsets)))
+            torch.zeros(num_heads, resolution * resolution))
         self.register_buffer('attention_bias_idxs',
-                             torch.LongTensor(idxs).view(N, N))
+                             attention_bias_idxs(resolution))
+        # Bảng bias đã gather sẵn cho eval; là buffer nên đi theo .to(device/dtype) của model
+        self.register_buffer('ab', None, persistent=False)
 
     @torch.no_grad()
     def train(self, mode=True):
         super().train(mode)
-        if mode and hasattr(self, 'ab'):
-            del self.ab
+        if mode:
+            self.ab = None
         else:
             self.ab = self.attention_biases[:, self.attention_bias_idxs]
+        return self
 
     def forward(self, x):
         B, _, H, W = x.shape
@@ -131,12 +133,10 @@ class Attention(torch.nn.Module):
         q, k, v = qkv.view(B, -1, H, W).split([self.nh_kd, self.nh_kd, self.dh], dim=1)
         q = self.dw(q)
         q, k, v = q.view(B, self.num_heads, -1, N), k.view(B, self.num_heads, -1, N), v.view(B, self.num_heads, -1, N)
-        attn = (
-            (q.transpose(-2, -1) @ k) * self.scale
-            +
-            (self.attention_biases[:, self.attention_bias_idxs]
-             if self.training else self.ab)
-        )
+        ab = self.ab
+        if ab is None:
+            ab = self.attention_biases[:, self.attention_bias_idxs]
+        attn = (q.transpose(-2, -1) @ k) * self.scale + ab
         attn = attn.softmax(dim=-1)
         x = (v @ attn.transpose(-2, -1)).reshape(B, -1, H, W)
         x = self.proj(x)
@@ -194,6 +194,18 @@ class LKP(nn.Module):
         w = w.view(b, self.dim // self.groups, self.sks ** 2, h, width)
         return w
 
+class ChannelAffine(nn.Module):
+    # BatchNorm ở eval mode sau khi đã tính sẵn scale/shift (scale=None: chỉ cộng bias)
+    def __init__(self, scale, shift):
+        super().__init__()
+        self.register_buffer('scale', None if scale is None else scale.view(1, -1, 1, 1).clone())
+        self.register_buffer('shift', shift.view(1, -1, 1, 1).clone())
+
+    def forward(self, x):
+        if self.scale is None:
+            return x + self.shift
+        return torch.addcmul(self.shift, x, self.scale)
+
 class LSConv(nn.Module):
     def __init__(self, dim):
         super(LSConv, self).__init__()
@@ -204,6 +216,30 @@ class LSConv(nn.Module):
     def forward(self, x):
         return self.bn(self.ska(x, self.lkp(x))) + x
 
+    @torch.no_grad()
+    def fuse(self):
+        # Đã fuse (bn là ChannelAffine, vd. artifact serving): giữ nguyên, fuse_model gọi lại được nhiều lần
+        if not isinstance(self.bn, nn.BatchNorm2d):
+            return self
+        bn = self.bn
+        scale = bn.weight / (bn.running_var + bn.eps)**0.5
+        shift = bn.bias - bn.running_mean * scale
+
+        # SKA dùng chung kênh w[j] cho các channel j, j + C/groups, ... nên scale của BN
+        # chỉ gộp được vào GroupNorm của LKP khi các channel đó có cùng scale.
+        cw = self.lkp.dim // self.lkp.groups
+        per_w = scale.view(-1, cw)
+        if torch.allclose(per_w, per_w[:1].expand_as(per_w), rtol=1e-6, atol=1e-8):
+            norm_scale = per_w[0].repeat_interleave(self.lkp.sks ** 2)
+            self.lkp.norm.weight.mul_(norm_scale)
+            self.lkp.norm.bias.mul_(norm_scale)
+            self.bn = ChannelAffine(None, shift)
+        else:
+            self.bn = ChannelAffine(scale, shift)
+
+        fuse_model(self.lkp)
+        return self
+
 class Block(torch.nn.Module):    
     def __init__(self,
                  ed, kd, nh=8,
@@ -296,6 +332,16 @@ class LSNet(torch.nn.Module):
             x = self.head(x)
         return x
 
+@torch.no_grad()
+def fuse_model(module):
+    """Thay (đệ quy, in-place) mọi module có fuse() bằng bản đã gộp BN/nhánh, dùng cho inference."""
+    for name, child in module.named_children():
+        if hasattr(child, 'fuse'):
+            setattr(module, name, child.fuse())
+        else:
+            fuse_model(child)
+    return module
+
 def _cfg(url='', **kwargs):
     return {
         'url': url,
@@ -3,37 +3,78 @@ import torch.nn as nn
 import torch.nn.functional as F
 import math
 
+
+def _prepare(x: torch.Tensor, w: torch.Tensor):
+    B, C, H, W = x.shape
+    # Xử lý w nếu chưa có chiều không gian (ít gặp trong LSNet nhưng cứ để cho chắc)
+    if w.dim() == 3:
+        w = w.view(B, C, -1, 1, 1)
+    ks = int(math.sqrt(w.shape[2]))
+    return w, ks
+
+
+def ska_unfold(x: torch.Tensor, w: torch.Tensor) -> torch.Tensor:
+    B, C, H, W = x.shape
+    w, ks = _prepare(x, w)
+    pad = (ks - 1) // 2
+
+    # 1. Unfold x (Cắt ảnh thành các ô)
+    # x_unfold shape: [B, C, K*K, H, W]
+    x_unfold = F.unfold(x, kernel_size=ks, padding=pad, stride=1)
+    x_unfold = x_unfold.view(B, C, ks * ks, H, W)
+
+    # --- ĐOẠN CODE FIX LỖI 128 vs 16 ---
+    # Kiểm tra nếu số channel của x và w không khớp (do group convolution)
+    # x: [B, 128, ...] vs w: [B, 16, ...]
+    if x_unfold.shape[1] != w.shape[1]:
+        # Tính tỉ lệ group (ví dụ 128 / 16 = 8)
+        groups = x_unfold.shape[1] // w.shape[1]
+        # Lặp lại w để khớp với x (Tương đương logic % trong Triton)
+        # w.repeat(1, groups, 1, 1, 1) sẽ nhân bản channel lên 8 lần
+        w = w.repeat(1, groups, 1, 1, 1)
+    # -----------------------------------
+
+    # 2. Nhân và cộng
+    out = x_unfold * w
+    out = torch.sum(out, dim=2)
+
+    return out
+
+
+def ska_shift(x: torch.Tensor, w: torch.Tensor) -> torch.Tensor:
+    """
+    Cùng kết quả với ska_unfold nhưng không tạo tensor [B, C, K*K, H, W] và không repeat w:
+    cộng dồn K*K view dịch chuyển của x (đã pad) và broadcast w qua view theo group.
+    """
+    B, C, H, W = x.shape
+    w, ks = _prepare(x, w)
+    pad = (ks - 1) // 2
+    cw = w.shape[1]
+    groups = C // cw
+
+    # Channel c = g * cw + j dùng w[:, j] (giống w.repeat(1, groups, ...))
+    x_pad = F.pad(x, (pad, pad, pad, pad)).view(B, groups, cw, H + 2 * pad, W + 2 * pad)
+    w = w.view(B, 1, cw, ks * ks, w.shape[-2], w.shape[-1])
+
+    out = None
+    for k in range(ks * ks):
+        i, j = divmod(k, ks)
+        view = x_pad[..., i:i + H, j:j + W]
+        if out is None:
+            out = view * w[:, :, :, k]
+        else:
+            out.addcmul_(view, w[:, :, :, k])
+    return out.view(B, C, H, W)
+
+
 class SKA(nn.Module):
+    # 'auto': dùng ska_shift trên CPU (ít bộ nhớ/băng thông hơn), ska_unfold trên GPU
+    impl = 'auto'
+
     def forward(self, x: torch.Tensor, w: torch.Tensor) -> torch.Tensor:
-        B, C, H, W = x.shape
-        
-        # 1. Xử lý w nếu chưa có chiều không gian (ít gặp trong LSNet nhưng cứ để cho chắc)
-        if w.dim() == 3:
-            w = w.view(B, C, -1, 1, 1)
-
-        # Lấy kernel size
-        ks_sq = w.shape[2]
-        ks = int(math.sqrt(ks_sq))
-        pad = (ks - 1) // 2
-
-        # 2. Unfold x (Cắt ảnh thành các ô)
-        # x_unfold shape: [B, C, K*K, H, W]
-        x_unfold = F.unfold(x, kernel_size=ks, padding=pad, stride=1)
-        x_unfold = x_unfold.view(B, C, ks * ks, H, W)
-
-        # --- ĐOẠN CODE FIX LỖI 128 vs 16 ---
-        # Kiểm tra nếu số channel của x và w không khớp (do group convolution)
-        # x: [B, 128, ...] vs w: [B, 16, ...]
-        if x_unfold.shape[1] != w.shape[1]:
-            # Tính tỉ lệ group (ví dụ 128 / 16 = 8)
-            groups = x_unfold.shape[1] // w.shape[1]
-            # Lặp lại w để khớp với x (Tương đương logic % trong Triton)
-            # w.repeat(1, groups, 1, 1, 1) sẽ nhân bản channel lên 8 lần
-            w = w.repeat(1, groups, 1, 1, 1)
-        # -----------------------------------
-
-        # 3. Nhân và cộng
-        out = x_unfold * w
-        out = torch.sum(out, dim=2)
-        
-        return out
\ No newline at end of file
+        impl = self.impl
+        if impl == 'auto':
+            impl = 'shift' if x.device.type == 'cpu' else 'unfold'
+        if impl == 'shift':
+            return ska_shift(x, w)
+        return ska_unfold(x, w)
@@ -25,12 +25,31 @@ MODEL_CONFIGS = [
         # Paths to your copied files
         "weights_path": os.path.join(current_dir, "pretrained", "lsnet_b_finetuned.pth"),
         "classes_path": os.path.join(current_dir, "pretrained", "vietnamese_food_classes_103.txt"),
+        # Fused serving artifact (python export_model.py --model-id lsnet_b)
+        "artifact_path": os.path.join(current_dir, "pretrained", "lsnet_b.serving.pt"),
         
         # Backup URLs (Auto-download if files are missing)
         "weights_url": "https://huggingface.co/giahuy4205/lsnet-finetuned/resolve/main/lsnet_b_finetuned.pth?download=true",
         # "classes_url": "https://huggingface.co/MatchaMacchiato/LSNet_VietnameseFood/resolve/main/vietnamese_food_classes.txt?download=true",
         
+        # INT8 CPU serving (opt-in), ví dụ:
+        # {"mode": "dynamic", "eval_dir": os.path.join(current_dir, "heldout"),
+        #  "min_top1_agreement": 0.98, "min_top3_agreement": 0.995}
+        "quantize": None,
+
         "num_classes": 103, # Change to 103 if using the larger dataset
-        "arch_fn": lsnet_b
-    }
+        "arch_fn": lsnet_b,
+
+        # Nhóm client dùng model này (hiển thị ở /models); False ở "preload" để chỉ nạp khi có request
+        "tier": "standard",
+        "preload": True,
+    },
+    # Thêm model nhỏ làm fast path cho máy yếu, client chọn bằng ?model=lsnet_t, ví dụ:
+    # {
+    #     "id": "lsnet_t", "type": "classification", "name": "LSNet Tiny (Vietnamese Food)",
+    #     "weights_path": os.path.join(current_dir, "pretrained", "lsnet_t_finetuned.pth"),
+    #     "classes_path": os.path.join(current_dir, "pretrained", "vietnamese_food_classes_103.txt"),
+    #     "artifact_path": os.path.join(current_dir, "pretrained", "lsnet_t.serving.pt"),
+    #     "quantize": None, "num_classes": 103, "tier": "low-end", "preload": False,
+    # },
 ]
@@ -0,0 +1,142 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class UnknownModel(ValueError):
+    pass
+
+
+class ModelRegistry:
+    """
+    Các model đang nạp, theo thứ tự dùng gần nhất (LRU), giới hạn tổng bộ nhớ `memory_budget` byte.
+
+    - `loader(model_id)` trả về dict entry ({'model', 'classes', ...}) và chạy trên pool nạp nền, nên
+      nạp một model không chặn request của model khác; các request cùng model chờ chung một Future.
+    - Sau mỗi lần nạp, model ít dùng gần nhất bị bỏ cho tới khi tổng bộ nhớ <= budget (model vừa nạp
+      luôn được giữ). `on_evict(model_id, entry)` để dọn tài nguyên đi kèm (micro-batcher...).
+    """
+
+    def __init__(self, loader, memory_budget=0, size_fn=None, on_evict=None, load_workers=2):
+        self.loader = loader
+        self.memory_budget = max(0, int(memory_budget))
+        self.size_fn = size_fn or (lambda entry: 0)
+        self.on_evict = on_evict
+        self.models = OrderedDict()
+        self._load_workers = load_workers
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._stats = {}
+        self._pool = ThreadPoolExecutor(max_workers=load_workers, thread_name_prefix='model-load')
+
+    def _model_stats(self, model_id):
+        return self._stats.setdefault(model_id, {
+            'loads': 0, 'evictions': 0, 'load_ms': None, 'bytes': 0, 'requests': 0, 'cached': 0,
+            'last_used': None, 'latencies': deque(maxlen=2048),
+        })
+
+    def get(self, model_id):
+        """Entry của model; nạp (nền) nếu chưa có và chờ tới khi nạp xong."""
+        with self._lock:
+            entry = self.models.get(model_id)
+            if entry is not None:
+                self.models.move_to_end(model_id)
+                self._model_stats(model_id)['last_used'] = time.time()
+                return entry
+        return self.load_async(model_id).result()
+
+    def peek(self, model_id):
+        """Entry nếu model đang nạp sẵn, ngược lại None; không nạp và không đổi thứ tự LRU."""
+        with self._lock:
+            return self.models.get(model_id)
+
+    def load_async(self, model_id):
+        """Future của entry; không nạp trùng khi nhiều request cùng yêu cầu một model."""
+        with self._lock:
+            if model_id in self.models:
+                fut = Future()
+                fut.set_result(self.models[model_id])
+                return fut
+            fut = self._loading.get(model_id)
+            if fut is None:
+                fut = self._pool.submit(self._load, model_id)
+                self._loading[model_id] = fut
+            return fut
+
+    def _load(self, model_id):
+        start = time.perf_counter()
+        try:
+            entry = self.loader(model_id)
+            size = self.size_fn(entry)
+        except BaseException:
+            with self._lock:
+                self._loading.pop(model_id, None)
+            raise
+        evicted = []
+        with self._lock:
+            self.models[model_id] = entry
+            self._loading.pop(model_id, None)
+            stats = self._model_stats(model_id)
+            stats['loads'] += 1
+            stats['load_ms'] = (time.perf_counter() - start) * 1000.0
+            stats['bytes'] = size
+            stats['last_used'] = time.time()
+            if self.memory_budget:
+                while self._used_bytes() > self.memory_budget and len(self.models) > 1:
+                    old_id, old_entry = self.models.popitem(last=False)
+                    self._model_stats(old_id)['evictions'] += 1
+                    evicted.append((old_id, old_entry))
+        for old_id, old_entry in evicted:
+            logger.info(f"Evicted model {old_id} (memory budget {self.memory_budget / 2**20:.0f} MiB)")
+            if self.on_evict:
+                self.on_evict(old_id, old_entry)
+        return entry
+
+    def _used_bytes(self):
+        return sum(self._stats[m]['bytes'] for m in self.models)
+
+    def record(self, model_id, latency_ms, cached=False):
+        """
+        Ghi latency end-to-end của một request dùng model (để so sánh các model theo tier).
+        `cached`: trả từ prediction cache / ảnh gần trùng, chỉ đếm riêng, không tính vào latency của model.
+        """
+        with self._lock:
+            stats = self._model_stats(model_id)
+            stats['requests'] += 1
+            if cached:
+                stats['cached'] += 1
+            else:
+                stats['latencies'].append(latency_ms)
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._pool = ThreadPoolExecutor(max_workers=self._load_workers, thread_name_prefix='model-load')
+
+    def stats(self):
+        with self._lock:
+            out = {'memory_budget': self.memory_budget, 'used_bytes': self._used_bytes(), 'models': {}}
+            for model_id, stats in self._stats.items():
+                lat = sorted(stats['latencies'])
+
+                def pct(p):
+                    return lat[min(len(lat) - 1, int(p / 100.0 * len(lat)))] if lat else 0.0
+
+                out['models'][model_id] = {
+                    'status': 'loaded' if model_id in self.models else ('loading' if model_id in self._loading else 'unloaded'),
+                    'bytes': stats['bytes'],
+                    'loads': stats['loads'],
+                    'evictions': stats['evictions'],
+                    'load_ms': stats['load_ms'],
+                    'requests': stats['requests'],
+                    'cached': stats['cached'],
+                    'last_used': stats['last_used'],
+                    'latency_ms': {'avg': (sum(lat) / len(lat)) if lat else 0.0, 'p50': pct(50), 'p99': pct(99)},
+                }
+            for model_id in self._loading:
+                out['models'].setdefault(model_id, {'status': 'loading'})
+            return out
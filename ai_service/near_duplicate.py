@@ -0,0 +1,138 @@
+import threading
+from collections import deque
+
+from PIL import Image
+
+HASH_SIZE = 8
+
+
+def dhash(image, hash_size=HASH_SIZE):
+    """
+    Difference hash 64-bit: thu ảnh về (hash_size + 1) x hash_size mức xám và so sánh từng cặp pixel
+    kề nhau theo chiều ngang. Bền với nén lại, đổi kích thước và chỉnh sáng nhẹ.
+    """
+    thumb = image.resize((hash_size + 1, hash_size), Image.BOX).convert('L')
+    pixels = thumb.tobytes()
+    value = 0
+    for row in range(hash_size):
+        base = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[base + col] > pixels[base + col + 1])
+    return value
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """BK-tree theo khoảng cách Hamming: mỗi node giữ (hash, value) và con theo khoảng cách tới node."""
+
+    def __init__(self):
+        self._root = None
+        self.size = 0
+
+    def add(self, h, value):
+        node = [h, value, {}]
+        self.size += 1
+        if self._root is None:
+            self._root = node
+            return
+        cur = self._root
+        while True:
+            d = hamming(h, cur[0])
+            if d == 0:
+                # Trùng hash: giữ kết quả mới nhất
+                cur[1] = value
+                self.size -= 1
+                return
+            child = cur[2].get(d)
+            if child is None:
+                cur[2][d] = node
+                return
+            cur = child
+
+    def nearest(self, h, radius):
+        """(khoảng cách, value) gần nhất trong bán kính `radius`, hoặc None."""
+        if self._root is None:
+            return None
+        best = None
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= radius and (best is None or d < best[0]):
+                best = (d, node[1])
+                if d == 0:
+                    break
+            limit = radius if best is None else min(radius, best[0])
+            # Bất đẳng thức tam giác: chỉ con có khoảng cách trong [d - limit, d + limit] mới có thể khớp
+            for child_d, child in node[2].items():
+                if d - limit <= child_d <= d + limit:
+                    stack.append(child)
+        return best
+
+
+class NearDuplicateIndex:
+    """
+    Tái dùng predictions cho ảnh gần trùng (cùng đĩa chụp lại, nén lại qua app nhắn tin, crop nhẹ):
+    dHash của ảnh -> BK-tree riêng cho mỗi namespace (model, phiên bản, menu, ngưỡng).
+    Giới hạn `max_entries` bằng cách dựng lại cây từ nửa số ảnh mới nhất khi vượt ngưỡng.
+    """
+
+    def __init__(self, radius=3, max_entries=50_000):
+        self.radius = int(radius)
+        self.max_entries = max(1, int(max_entries))
+        self._lock = threading.Lock()
+        self._trees = {}
+        self._recent = deque()
+        self._lookups = self._hits = self._rebuilds = 0
+
+    @property
+    def enabled(self):
+        return self.radius >= 0
+
+    def lookup(self, namespace, h):
+        """(predictions, khoảng cách) nếu có ảnh đã biết trong bán kính, ngược lại None."""
+        with self._lock:
+            self._lookups += 1
+            tree = self._trees.get(namespace)
+            found = tree.nearest(h, self.radius) if tree is not None else None
+            if found is None:
+                return None
+            self._hits += 1
+            return found[1], found[0]
+
+    def add(self, namespace, h, predictions):
+        with self._lock:
+            self._trees.setdefault(namespace, BKTree()).add(h, predictions)
+            self._recent.append((namespace, h, predictions))
+            if len(self._recent) > self.max_entries:
+                self._rebuild(self.max_entries // 2)
+
+    def _rebuild(self, keep):
+        while len(self._recent) > keep:
+            self._recent.popleft()
+        self._trees = {}
+        for namespace, h, predictions in self._recent:
+            self._trees.setdefault(namespace, BKTree()).add(h, predictions)
+        self._rebuilds += 1
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self._trees = {}
+            self._recent.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'radius': self.radius,
+                'entries': sum(t.size for t in self._trees.values()),
+                'lookups': self._lookups,
+                'forwards_avoided': self._hits,
+                'hit_rate': (self._hits / self._lookups) if self._lookups else 0.0,
+                'rebuilds': self._rebuilds,
+            }
@@ -0,0 +1,223 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def image_digest(source):
+    """blake2b-128 của bytes ảnh gốc (bytes hoặc file-like seekable); con trỏ file được đưa về đầu."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return hashlib.blake2b(source, digest_size=16).hexdigest()
+    digest = hashlib.file_digest(source, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
+    source.seek(0)
+    return digest
+
+
+def file_version(path, extra=None):
+    """Phiên bản của file trọng số/artifact theo (path, size, mtime) và cấu hình đi kèm (vd. quantize)."""
+    st = os.stat(path)
+    raw = f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}:{json.dumps(extra, sort_keys=True, default=str)}"
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def menu_version(food_list):
+    raw = json.dumps(food_list, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=8).hexdigest()
+
+
+class PredictionCache:
+    """
+    Cache kết quả /predict theo nội dung ảnh: key = (model id, phiên bản model, phiên bản menu, ngưỡng
+    so khớp, hash bytes ảnh), value = danh sách predictions (JSON) kèm dinh dưỡng.
+
+    Tầng 1 là LRU trong process giới hạn theo tổng số byte của value. Tầng 2 (tuỳ chọn) là SQLite để
+    giữ kết quả qua các lần khởi động lại; cũng bị giới hạn byte, bỏ các dòng lâu không dùng nhất.
+    Dung lượng tầng 2 được trigger ghi ngay trong DB (bảng predictions_size), nên đúng cả khi nhiều worker
+    (serve.py) dùng chung một file.
+    """
+
+    def __init__(self, max_bytes=64 * 2**20, db_path=None, db_max_bytes=512 * 2**20):
+        self.max_bytes = max(0, int(max_bytes))
+        self.db_max_bytes = max(0, int(db_max_bytes))
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._hits = self._misses = self._evictions = 0
+        self._disk_hits = self._disk_evictions = self._disk_errors = 0
+
+        self.db_path = db_path
+        self._db = None
+        self._connect()
+
+    def _connect(self):
+        if not self.db_path:
+            return
+        try:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS predictions_accessed ON predictions(accessed)")
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS predictions_size (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)"
+                )
+                self._db.execute(
+                    "INSERT OR IGNORE INTO predictions_size VALUES (0, (SELECT COALESCE(SUM(size), 0) FROM predictions))"
+                )
+                for name, event, delta in (('insert', 'INSERT', 'NEW.size'), ('delete', 'DELETE', '-OLD.size'),
+                                           ('update', 'UPDATE OF size', 'NEW.size - OLD.size')):
+                    self._db.execute(
+                        f"CREATE TRIGGER IF NOT EXISTS predictions_size_{name} AFTER {event} ON predictions "
+                        f"BEGIN UPDATE predictions_size SET bytes = bytes + {delta} WHERE id = 0; END"
+                    )
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                self._db.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logger.error(f"Prediction cache DB disabled ({self.db_path}): {e}")
+            self._db = None
+
+    def after_fork(self):
+        """Gọi trong process con sau fork: kết nối SQLite không được dùng chung giữa các process."""
+        self._lock = threading.Lock()
+        # Giữ tham chiếu tới kết nối của process cha thay vì close (close trong process con có thể đụng tới lock của cha)
+        self._inherited_db = self._db
+        self._connect()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0 or self._db is not None
+
+    @staticmethod
+    def make_key(model_id, model_version, menu_ver, threshold, digest):
+        return f"{model_id}:{model_version}:{menu_ver}:{threshold}:{digest}"
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return json.loads(value)
+            if self._db is not None:
+                # DB bị khoá / hỏng: coi như miss, request vẫn chạy forward bình thường
+                try:
+                    row = self._db.execute("SELECT value FROM predictions WHERE key = ?", (key,)).fetchone()
+                    if row is not None:
+                        self._db.execute("UPDATE predictions SET accessed = ? WHERE key = ?", (time.time(), key))
+                except sqlite3.Error as e:
+                    self._disk_error('read', e)
+                    row = None
+                if row is not None:
+                    self._hits += 1
+                    self._disk_hits += 1
+                    self._put_memory(key, bytes(row[0]))
+                    return json.loads(row[0])
+            self._misses += 1
+            return None
+
+    def put(self, key, predictions):
+        value = json.dumps(predictions, ensure_ascii=False).encode('utf-8')
+        with self._lock:
+            self._put_memory(key, value)
+            if self._db is not None and len(value) <= self.db_max_bytes:
+                # Một transaction cho ghi + trim: worker khác không trim đồng thời trên cùng dung lượng.
+                # Lỗi DB (khoá, đầy...) chỉ bỏ qua lần ghi: kết quả đã tính xong vẫn được trả về
+                try:
+                    self._db.execute("BEGIN IMMEDIATE")
+                except sqlite3.Error as e:
+                    self._disk_error('write', e)
+                    return
+                try:
+                    # Upsert (không dùng REPLACE) để trigger UPDATE cập nhật dung lượng
+                    self._db.execute(
+                        "INSERT INTO predictions (key, value, size, accessed) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+                        "accessed = excluded.accessed",
+                        (key, value, len(value), time.time()),
+                    )
+                    self._trim_disk()
+                    self._db.execute("COMMIT")
+                except sqlite3.Error as e:
+                    self._disk_error('write', e)
+                    try:
+                        self._db.execute("ROLLBACK")
+                    except sqlite3.Error:
+                        pass
+
+    def _disk_error(self, op, e):
+        self._disk_errors += 1
+        logger.warning(f"Prediction cache DB {op} failed ({self.db_path}): {e}")
+
+    def _put_memory(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        self._entries[key] = value
+        self._bytes += len(value)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self._evictions += 1
+
+    def _disk_bytes(self):
+        return self._db.execute("SELECT bytes FROM predictions_size WHERE id = 0").fetchone()[0]
+
+    def _trim_disk(self):
+        excess = self._disk_bytes() - self.db_max_bytes
+        while excess > 0:
+            rows = self._db.execute(
+                "SELECT key, size FROM predictions ORDER BY accessed LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._db.execute("DELETE FROM predictions WHERE key = ?", (key,))
+                excess -= size
+                self._disk_evictions += 1
+                if excess <= 0:
+                    break
+
+    def invalidate(self):
+        """Xoá toàn bộ cache (cả tầng SQLite), gọi khi menu hoặc model thay đổi."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM predictions")
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            out = {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': (self._hits / lookups) if lookups else 0.0,
+                'evictions': self._evictions,
+            }
+            if self._db is not None:
+                out['disk'] = {
+                    'bytes': self._disk_bytes(),
+                    'max_bytes': self.db_max_bytes,
+                    'hits': self._disk_hits,
+                    'evictions': self._disk_evictions,
+                    'errors': self._disk_errors,
+                }
+            return out
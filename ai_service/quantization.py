@@ -0,0 +1,154 @@
+import os
+import re
+import copy
+import time
+import logging
+import warnings
+
+import torch
+import torch.nn as nn
+from PIL import Image
+
+from model.lsnet import fuse_model
+
+logger = logging.getLogger(__name__)
+
+# Các Conv 1x1 (đã fuse) được đổi sang Linear để quantize: FFN pw1/pw2, Attention qkv/proj
+DEFAULT_TARGETS = r'(\.pw1|\.pw2|\.qkv|\.proj\.1)$'
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+
+
+class QuantizationAgreementError(RuntimeError):
+    pass
+
+
+class PointwiseLinear(nn.Module):
+    # Conv 1x1 (groups=1, stride=1) viết lại thành Linear trên chiều channel để dùng dynamic INT8
+    def __init__(self, conv: nn.Conv2d):
+        super().__init__()
+        self.linear = nn.Linear(conv.in_channels, conv.out_channels, bias=conv.bias is not None)
+        with torch.no_grad():
+            self.linear.weight.copy_(conv.weight.view(conv.out_channels, conv.in_channels))
+            if conv.bias is not None:
+                self.linear.bias.copy_(conv.bias)
+
+    def forward(self, x):
+        return self.linear(x.permute(0, 2, 3, 1)).permute(0, 3, 1, 2)
+
+
+def _is_pointwise(m):
+    return (isinstance(m, nn.Conv2d) and m.kernel_size == (1, 1) and m.stride == (1, 1)
+            and m.groups == 1 and m.padding == (0, 0) and m.dilation == (1, 1))
+
+
+def quantize_for_cpu(model, targets=DEFAULT_TARGETS):
+    """
+    Bản INT8 (dynamic quantization) của model đã fuse: các Conv 1x1 khớp `targets` và head Linear.
+    Dynamic quantization tính scale của activation lúc chạy nên không cần dữ liệu calibration.
+    Raise ValueError nếu không có Conv 1x1 nào khớp `targets` (model chưa fuse hoặc regex sai), thay vì
+    chỉ quantize mỗi head.
+    """
+    qmodel = copy.deepcopy(model).cpu().eval()
+    pattern = re.compile(targets)
+    rewritten = 0
+    for name, module in list(qmodel.named_modules()):
+        if _is_pointwise(module) and pattern.search(name):
+            parent_name, _, child = name.rpartition('.')
+            parent = qmodel.get_submodule(parent_name) if parent_name else qmodel
+            setattr(parent, child, PointwiseLinear(module))
+            rewritten += 1
+    if not rewritten:
+        raise ValueError(f"No pointwise Conv2d matched quantization targets {targets!r}")
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        qmodel = torch.ao.quantization.quantize_dynamic(qmodel, {nn.Linear}, dtype=torch.qint8)
+    return qmodel
+
+
+def load_image_folder(path, preprocess, limit=256):
+    """Tensor [N, 3, H, W] từ ảnh trong thư mục (đệ quy), tối đa `limit` ảnh."""
+    files = []
+    for root, _, names in os.walk(path):
+        files.extend(os.path.join(root, n) for n in sorted(names) if n.lower().endswith(IMAGE_EXTS))
+    files = sorted(files)[:limit]
+    tensors = []
+    for f in files:
+        try:
+            tensors.append(preprocess(Image.open(f).convert('RGB')))
+        except Exception as e:
+            logger.warning(f"Skipping {f}: {e}")
+    if not tensors:
+        return None
+    return torch.stack(tensors)
+
+
+@torch.no_grad()
+def agreement_report(reference, candidate, images, batch_size=16):
+    """Tỉ lệ top-1 trùng nhau và tỉ lệ top-1 của reference nằm trong top-3 của candidate."""
+    top1 = top3 = 0
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size]
+        ref_top1 = reference(batch).argmax(dim=1)
+        cand_logits = candidate(batch)
+        k = min(3, cand_logits.shape[1])
+        cand_top3 = cand_logits.topk(k, dim=1).indices
+        top1 += (cand_top3[:, 0] == ref_top1).sum().item()
+        top3 += (cand_top3 == ref_top1[:, None]).any(dim=1).sum().item()
+    n = len(images)
+    return {'images': n, 'top1_agreement': top1 / n, 'top3_agreement': top3 / n}
+
+
+def _latency_ms(model, x, runs=5):
+    with torch.no_grad():
+        model(x)
+        start = time.perf_counter()
+        for _ in range(runs):
+            model(x)
+    return (time.perf_counter() - start) * 1000.0 / runs
+
+
+def model_bytes(model):
+    total = 0
+    for t in list(model.state_dict().values()):
+        if isinstance(t, torch.Tensor):
+            total += t.numel() * t.element_size()
+        elif isinstance(t, tuple):
+            # packed params của Linear dynamic quantized: (weight, bias)
+            total += sum(x.numel() * x.element_size() for x in t if isinstance(x, torch.Tensor))
+    return total
+
+
+def build_quantized_model(model, quant_cfg, preprocess):
+    """
+    Quantize theo cấu hình trong MODEL_CONFIGS['quantize'] và kiểm tra độ khớp với fp32 trên thư mục ảnh
+    held-out. Raise QuantizationAgreementError nếu không đạt ngưỡng (service không được khởi động).
+    Model được fuse (trên bản sao) trước khi quantize, kể cả khi FUSE_MODEL=0; fuse_model gọi lại trên model
+    đã fuse (FUSE_MODEL=1, artifact serving) là no-op.
+    """
+    fused = fuse_model(copy.deepcopy(model).cpu().eval())
+    qmodel = quantize_for_cpu(fused, quant_cfg.get('targets', DEFAULT_TARGETS))
+    eval_dir = quant_cfg.get('eval_dir')
+    min_top1 = float(quant_cfg.get('min_top1_agreement', 0.0))
+    min_top3 = float(quant_cfg.get('min_top3_agreement', 0.0))
+
+    images = load_image_folder(eval_dir, preprocess, quant_cfg.get('eval_limit', 256)) if eval_dir and os.path.isdir(eval_dir) else None
+    if images is None:
+        if min_top1 > 0 or min_top3 > 0:
+            raise QuantizationAgreementError(f"No held-out images found in {eval_dir!r} to validate INT8 model")
+        report = {'images': 0}
+    else:
+        report = agreement_report(model.cpu().eval(), qmodel, images)
+        if report['top1_agreement'] < min_top1 or report['top3_agreement'] < min_top3:
+            raise QuantizationAgreementError(
+                f"INT8 agreement too low: top-1 {report['top1_agreement']:.3f} (min {min_top1}), "
+                f"top-3 {report['top3_agreement']:.3f} (min {min_top3})"
+            )
+
+    x = images[:8] if images is not None else torch.randn(8, 3, 224, 224)
+    report['fp32_ms_per_batch8'] = _latency_ms(model, x)
+    report['int8_ms_per_batch8'] = _latency_ms(qmodel, x)
+    report['fp32_mb'] = model_bytes(model) / 2**20
+    report['int8_mb'] = model_bytes(qmodel) / 2**20
+    logger.info(f"INT8 model report: {report}")
+    return qmodel, report
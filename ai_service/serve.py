@@ -0,0 +1,87 @@
+"""
+Entry point production: nạp model + menu một lần trong process master rồi fork N worker gunicorn
+(preload_app), nên trọng số, MenuStore và các index được chia sẻ copy-on-write (menu nạp từ snapshot
+export_menu.py thì các mảng được map thẳng từ file, dùng chung page cache).
+
+    python serve.py --workers 4 --threads 8 --torch-threads 1
+
+Mỗi worker có torch.set_num_threads(--torch-threads) (mặc định số core / số worker) để các worker
+không tranh nhau core. Trong mỗi worker, --threads thread gthread phục vụ request đồng thời, và
+micro-batcher gom chúng lại thành batch như khi chạy app.py.
+"""
+import argparse
+import gc
+import logging
+import os
+import sys
+
+import torch
+
+# Warm-up chạy đồng bộ trong master trước khi fork thay vì thread nền lúc import app
+os.environ['WARMUP_ON_START'] = '0'
+
+from gunicorn.app.base import BaseApplication  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+class PreforkServer(BaseApplication):
+    def __init__(self, options, torch_threads):
+        self.options = options
+        self.torch_threads = torch_threads
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+        self.cfg.set('post_fork', self.post_fork)
+
+    def load(self):
+        # libgomp không an toàn với fork khi master đã chạy op đa luồng: master chỉ dùng 1 thread
+        torch.set_num_threads(1)
+        import app as service
+        service.run_warmup()
+        if service.WARMUP_STATE['status'] != 'ready':
+            logger.critical(f"Warm-up failed, not starting workers: {service.WARMUP_STATE}")
+            sys.exit(1)
+        # Worker tự theo dõi file menu (after_fork); master không nạp lại menu
+        service.MENU_RELOADER.stop()
+        # Đưa các object đã nạp vào vùng "permanent" của GC để GC của worker không ghi lên các trang nhớ chung
+        gc.collect()
+        gc.freeze()
+        self.service = service
+        return service.app
+
+    def post_fork(self, server, worker):
+        self.service.after_fork(self.torch_threads)
+        logger.info(f"Worker {worker.pid} ready (torch threads: {self.torch_threads})")
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Multi-process NutriScan AI server")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_WORKERS', cpus)))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('WEB_THREADS', 8)),
+                        help="Số thread phục vụ request trong mỗi worker")
+    parser.add_argument('--torch-threads', type=int, default=int(os.environ.get('TORCH_THREADS', 0)),
+                        help="torch.set_num_threads cho mỗi worker (0 = số core / số worker)")
+    parser.add_argument('--timeout', type=int, default=120)
+    args = parser.parse_args()
+
+    workers = max(1, args.workers)
+    torch_threads = args.torch_threads or max(1, cpus // workers)
+    options = {
+        'bind': f"{args.host}:{args.port}",
+        'workers': workers,
+        'worker_class': 'gthread',
+        'threads': max(1, args.threads),
+        'preload_app': True,
+        'timeout': args.timeout,
+    }
+    PreforkServer(options, torch_threads).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+import os
+import time
+import logging
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_FORMAT = 'nutriscan-serving'
+ARTIFACT_VERSION = 1
+
+
+def save_artifact(fused_model, path, arch, num_classes, classes, preprocess_cfg, source=None):
+    """
+    Ghi artifact serving: module đã fuse (eval, CPU) + danh sách class + cấu hình preprocess.
+    Ghi ra file tạm rồi os.replace để worker đang đọc không thấy file dở dang.
+    """
+    fused_model = fused_model.to('cpu').eval()
+    artifact = {
+        'format': ARTIFACT_FORMAT,
+        'version': ARTIFACT_VERSION,
+        'arch': arch,
+        'num_classes': int(num_classes),
+        'classes': list(classes),
+        'preprocess': dict(preprocess_cfg),
+        'source': source or {},
+        'model': fused_model,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    torch.save(artifact, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_artifact(path, device='cpu'):
+    """
+    Nạp artifact với mmap=True: không dựng lại model qua timm, không copy state_dict; tensor trọng số
+    trỏ thẳng vào file nên các worker trên cùng host dùng chung page cache.
+    Trả về (model, artifact_metadata). Artifact là pickle -> chỉ nạp file do chính mình export.
+    """
+    start = time.perf_counter()
+    artifact = torch.load(path, map_location='cpu', weights_only=False, mmap=True)
+    if artifact.get('format') != ARTIFACT_FORMAT or artifact.get('version') != ARTIFACT_VERSION:
+        raise ValueError(f"Unsupported serving artifact: {path}")
+    model = artifact.pop('model')
+    if torch.device(device).type != 'cpu':
+        model.to(device)
+    model.eval()
+    logger.info(f"Loaded serving artifact {path} in {(time.perf_counter() - start) * 1000.0:.1f} ms")
+    return model, artifact
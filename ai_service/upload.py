@@ -0,0 +1,92 @@
+import io
+import threading
+
+# Buffer đọc body được giữ lại theo từng thread xử lý request để không cấp phát lại mỗi lần
+_buffers = threading.local()
+INITIAL_BUFFER_BYTES = 1 << 20
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class BufferReader(io.RawIOBase):
+    """File-like chỉ đọc trên một memoryview: PIL đọc thẳng từ buffer mà không copy cả ảnh ra bytes."""
+
+    def __init__(self, view):
+        self._view = view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = max(0, min(len(b), len(self._view) - self._pos))
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = len(self._view) + offset
+        else:
+            raise ValueError(f"Invalid whence {whence}")
+        self._pos = max(0, self._pos)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def getbuffer(self):
+        return self._view
+
+    def close(self):
+        self._view.release()
+        super().close()
+
+
+def _thread_buffer(min_size):
+    buf = getattr(_buffers, 'buf', None)
+    if buf is None or len(buf) < min_size:
+        buf = bytearray(max(min_size, INITIAL_BUFFER_BYTES))
+        _buffers.buf = buf
+    return buf
+
+
+def read_body(stream, content_length=None, max_bytes=32 * 2**20):
+    """
+    Đọc body request (application/octet-stream, image/*) vào buffer dùng lại của thread hiện tại
+    và trả về BufferReader trên phần đã đọc. Reader chỉ hợp lệ tới lần gọi read_body kế tiếp
+    trong cùng thread, nên ảnh phải được decode xong trước khi xử lý request khác.
+    """
+    if content_length is not None and content_length > max_bytes:
+        raise UploadTooLarge(f"Upload too large ({content_length} bytes, max {max_bytes})")
+    buf = _thread_buffer(content_length or 0)
+    n = 0
+    while not content_length or n < content_length:
+        if n == len(buf):
+            if n >= max_bytes:
+                raise UploadTooLarge(f"Upload too large (max {max_bytes} bytes)")
+            # Không biết trước Content-Length (chunked): cấp buffer gấp đôi (không resize tại chỗ
+            # vì reader của request trước có thể vẫn đang giữ memoryview)
+            grown = bytearray(min(2 * len(buf), max_bytes))
+            grown[:n] = buf
+            buf = _buffers.buf = grown
+        with memoryview(buf) as view:
+            if hasattr(stream, 'readinto'):
+                read = stream.readinto(view[n:])
+            else:
+                chunk = stream.read(len(buf) - n)
+                read = len(chunk)
+                view[n:n + read] = chunk
+        if not read:
+            break
+        n += read
+    return BufferReader(memoryview(buf)[:n])
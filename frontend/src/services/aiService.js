@@ -4,29 +4,18 @@ import { doc, getDoc, setDoc } from 'firebase/firestore';
 // Lấy URL API từ biến môi trường
 const API_URL = import.meta.env.VITE_AI_API_URL || "http://localhost:5000";
 
-/**
- * Helper: Chuyển file ảnh sang Base64
- */
-const toBase64 = file => new Promise((resolve, reject) => {
-    const reader = new FileReader();
-    reader.readAsDataURL(file);
-    reader.onload = () => resolve(reader.result);
-    reader.onerror = error => reject(error);
-});
-
 /**
  * 1. CHỨC NĂNG QUÉT ẢNH (AI SCAN)
  * Gửi ảnh lên Backend Python để nhận diện món ăn (/predict)
  */
 export const analyzeImage = async (imageFile) => {
     try {
-        const base64Image = await toBase64(imageFile);
-
         console.log("Đang gửi ảnh lên AI Server...");
+        // Gửi thẳng file nhị phân (không base64/JSON): nhỏ hơn ~33% và server đọc trực tiếp từ stream
         const response = await fetch(`${API_URL}/predict`, {
             method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ image: base64Image })
+            headers: { 'Content-Type': imageFile.type || 'application/octet-stream' },
+            body: imageFile
         });
 
         const data = await response.json();